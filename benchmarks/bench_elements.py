@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+'''Benchmarks for the construction cost of individual elements.
+
+The benchmark runner also reports the peak memory, which divided by the
+element count gives the memory per element.
+
+    python benchmarks/run.py --filter elements'''
+
+import os
+import sys
+
+sys.path.insert (0, os.path.join (os.path.dirname (__file__), '..'))
+
+from luna import *
+
+_COUNT = 100000
+
+def BenchLines ():
+    return [Line ((i, 0), (i, 1)) for i in range (_COUNT)]
+
+def BenchCircles ():
+    return [Circle ((i, 0), 1) for i in range (_COUNT)]
+
+def BenchRectangles ():
+    return [Rectangle ((i, 0), (1, 1)) for i in range (_COUNT)]
+
+def BenchGroups ():
+    return [Group ((i, 0)) for i in range (_COUNT)]
+
+def BenchInstances ():
+    source = Circle ((0, 0), 1)
+    return [Instance (source, (i, 0)) for i in range (_COUNT)]
+
+def BenchLabels ():
+    # Labels repeat, as on the axes of a chart, so most are measured only once
+    d = Drawing ()
+    for i in range (_COUNT):
+        d.Add (Text (str (i % 1000), (i, 0)))
+    d.GetBounds ()
+    return d
+
+def BenchDrawing ():
+    d = Drawing ()
+    for i in range (_COUNT):
+        d.Add (Line ((i, 0), (i, 1)))
+    return d
+
+BENCHMARKS = [
+    BenchLines,
+    BenchCircles,
+    BenchRectangles,
+    BenchGroups,
+    BenchInstances,
+    BenchLabels,
+    BenchDrawing
+]
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+'''Micro-benchmarks for luna.geo and bounds-heavy scenes.
+
+Run from the repository root:
+
+    python benchmarks/bench_geo.py'''
+
+import os
+import sys
+import timeit
+
+sys.path.insert (0, os.path.join (os.path.dirname (__file__), '..'))
+
+from luna import *
+from luna.geo import Vector2, BoundingBox
+
+def BenchVectorArithmetic ():
+    a = Vector2 (1, 2)
+    b = Vector2 (3, 4)
+    for _ in range (10000):
+        c = (a + b) * 0.5
+        c -= a
+
+def BenchBoundingBoxMerge ():
+    b = BoundingBox ()
+    other = BoundingBox ((0, 0), (1, 1))
+    for i in range (10000):
+        b.Merge (other)
+        b.Merge ((i, i))
+
+def _CreateBoundsScene ():
+    d = Drawing ()
+    for y in range (20):
+        g = Group ((0, y * 10))
+        for x in range (50):
+            g.Add (Circle ((x * 10, 0), 4))
+            g.Add (Rectangle ((x * 10, 0), (5, 5)))
+        d.Add (g)
+
+    d.Add (Array (Cross ((0, 0), 2), 40, 40, offset=(0, 250)))
+    return d
+
+_scene = _CreateBoundsScene ()
+_leaf = _scene.GetChildren () [0].GetChildren () [0]
+
+def BenchSceneBounds ():
+    _scene.GetBounds ()
+
+def BenchSceneBoundsAfterChange ():
+    _leaf.InvalidateBounds ()
+    _scene.GetBounds ()
+
+def BenchSceneSize ():
+    _scene.GetSize ()
+
+def BenchArrayConstruction ():
+    Array (Circle ((0, 0), 1), 50, 50)
+
+BENCHMARKS = [
+    BenchVectorArithmetic,
+    BenchBoundingBoxMerge,
+    BenchSceneBounds,
+    BenchSceneBoundsAfterChange,
+    BenchSceneSize,
+    BenchArrayConstruction
+]
+
+if __name__ == '__main__':
+    for bench in BENCHMARKS:
+        t = min (timeit.repeat (bench, number=5, repeat=5)) / 5
+        print ('{:<28}{:>10.2f} ms'.format (bench.__name__, t * 1000))
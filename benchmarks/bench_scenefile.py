@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+'''Benchmarks for saving and loading scene files, compared to building the
+scenes from scratch.
+
+Run through the benchmark runner:
+
+    python benchmarks/run.py --filter scenefile'''
+
+import functools
+import os
+import sys
+import tempfile
+
+sys.path.insert (0, os.path.dirname (__file__))
+
+from common import Benchmark
+from scenes import SCENES
+from luna import scene
+
+_directory = tempfile.TemporaryDirectory ()
+
+def _GetFilename (sceneName, count):
+    return os.path.join (_directory.name, '{}-{}.luna'.format (sceneName, count))
+
+def _Rebuild (create, count):
+    create (count)
+
+def _Save (sceneName, count, drawing):
+    drawing.SaveScene (_GetFilename (sceneName, count))
+
+def _SetupLoad (create, sceneName, count):
+    filename = _GetFilename (sceneName, count)
+    if not os.path.exists (filename):
+        create (count).SaveScene (filename)
+    return filename
+
+def _Load (filename):
+    scene.Load (filename)
+
+def CreateBenchmarks (sizes):
+    '''Create the benchmarks for all scenes with the given element counts.'''
+    result = []
+    for sceneName, create in SCENES.items ():
+        for count in sizes:
+            name = '{}/{}'.format (sceneName, count)
+
+            result.append (Benchmark ('rebuild/' + name,
+                functools.partial (_Rebuild, create, count)))
+            result.append (Benchmark ('save/' + name,
+                functools.partial (_Save, sceneName, count),
+                functools.partial (create, count)))
+            result.append (Benchmark ('load/' + name, _Load,
+                functools.partial (_SetupLoad, create, sceneName, count)))
+
+    return result
+
+BENCHMARKS = CreateBenchmarks ([1000, 10000, 100000])
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+'''Benchmarks for constructing, measuring, copying and exporting synthetic
+scenes.
+
+Run through the benchmark runner:
+
+    python benchmarks/run.py --filter scenes'''
+
+import functools
+import os
+import sys
+
+sys.path.insert (0, os.path.dirname (__file__))
+
+from common import Benchmark
+from scenes import SCENES
+from luna import *
+
+try:
+    import luna.backends.cairo
+    _hasCairo = True
+except (ImportError, OSError):
+    _hasCairo = False
+
+def _Construct (create, count):
+    create (count)
+
+def _Bounds (scene):
+    scene.GetBounds ()
+
+def _SetupChanged (create, count):
+    scene = create (count)
+    scene.GetSize ()
+    scene.Add (Line ((0, 0), (1, 1)))
+    return scene
+
+def _Size (scene):
+    # Only the drawing itself has to be updated after adding an element
+    scene.GetSize ()
+
+def _Copy (scene):
+    scene.Copy ()
+
+def _Svg (scene):
+    scene.RenderSvg ()
+
+def _Png (scene):
+    scene.RenderPng ()
+
+def _Pdf (scene):
+    scene.RenderPdf ()
+
+def CreateBenchmarks (sizes):
+    '''Create the benchmarks for all scenes with the given element counts.'''
+    result = []
+    for sceneName, create in SCENES.items ():
+        for count in sizes:
+            name = '{}/{}'.format (sceneName, count)
+            setup = functools.partial (create, count)
+
+            result.append (Benchmark ('construct/' + name,
+                functools.partial (_Construct, create, count)))
+            result.append (Benchmark ('bounds/' + name, _Bounds, setup))
+            result.append (Benchmark ('size/' + name, _Size,
+                functools.partial (_SetupChanged, create, count)))
+            result.append (Benchmark ('copy/' + name, _Copy, setup))
+            result.append (Benchmark ('svg/' + name, _Svg, setup))
+
+            if _hasCairo:
+                result.append (Benchmark ('png/' + name, _Png, setup))
+                result.append (Benchmark ('pdf/' + name, _Pdf, setup))
+
+    return result
+
+BENCHMARKS = CreateBenchmarks ([1000, 10000, 100000])
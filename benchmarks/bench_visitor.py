@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+'''Benchmarks for the Visitor traversal overhead.
+
+Run from the repository root:
+
+    python benchmarks/bench_visitor.py'''
+
+import os
+import sys
+import timeit
+
+sys.path.insert (0, os.path.join (os.path.dirname (__file__), '..'))
+
+from luna import *
+
+class _CountingVisitor (Visitor):
+    def __init__ (self):
+        super (_CountingVisitor, self).__init__ ()
+        self.count = 0
+
+    def VisitElement (self, element, ctx=None):
+        self.count += 1
+        for child in element.GetChildren ():
+            self.VisitGeneric (child, ctx)
+
+    def VisitGroup (self, group, ctx=None):
+        self.VisitElement (group, ctx)
+
+    def VisitLine (self, line, ctx=None):
+        self.count += 1
+
+    def VisitCircle (self, circle, ctx=None):
+        self.count += 1
+
+def _CreateScene ():
+    d = Drawing ()
+    for y in range (100):
+        g = Group ((0, y))
+        for x in range (500):
+            g.Add (Line ((x, 0), (x, 1)))
+            g.Add (Circle ((x, 0), 1))
+        d.Add (g)
+    return d
+
+_scene = _CreateScene ()
+
+def BenchTraversal ():
+    _CountingVisitor ().VisitGeneric (_scene)
+
+BENCHMARKS = [
+    BenchTraversal
+]
+
+if __name__ == '__main__':
+    for bench in BENCHMARKS:
+        t = min (timeit.repeat (bench, number=3, repeat=3)) / 3
+        print ('{:<28}{:>10.2f} ms'.format (bench.__name__, t * 1000))
@@ -0,0 +1,22 @@
+'''Shared definitions for the benchmark modules.'''
+
+class Benchmark:
+    '''A benchmark with an optional setup step.
+
+    setup is called before each measurement and its result is passed to run,
+    so only run is measured. Plain functions in the BENCHMARKS list of a
+    benchmark module are wrapped into a Benchmark without setup.'''
+    def __init__ (self, name, run, setup=None):
+        self.name = name
+        self.run = run
+        self.setup = setup
+
+    def Setup (self):
+        if self.setup is None:
+            return None
+        return self.setup ()
+
+    def Run (self, data):
+        if self.setup is None:
+            return self.run ()
+        return self.run (data)
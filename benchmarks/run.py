@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+'''Run the benchmarks and compare them against a stored baseline.
+
+Benchmarks are collected from the BENCHMARKS list of every bench_*.py module
+in this directory. For each benchmark, the minimum time over several runs and
+the peak of the memory allocated through Python during a separate run are
+reported. Memory allocated by Cairo itself is not included.
+
+Examples, run from the repository root:
+
+    python benchmarks/run.py
+    python benchmarks/run.py --filter svg/ --sizes 1000,1000000
+    python benchmarks/run.py --save before
+    python benchmarks/run.py --compare before
+
+Baselines are stored in benchmarks/baselines/<name>.json. They are only
+comparable when taken on the same machine. To check a change for
+regressions, record a baseline of the revision without the change first:
+
+    git stash
+    python benchmarks/run.py --save before
+    git stash pop
+    python benchmarks/run.py --compare before
+
+benchmarks/baselines/reference.json is a baseline of all benchmarks with the
+default sizes, which is kept in the repository. It shows the expected order of
+magnitude of each benchmark, and can be compared against directly on a
+similar machine; its machine and Python version are stored with the
+results.'''
+
+import argparse
+import datetime
+import fnmatch
+import gc
+import glob
+import importlib
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+_directory = os.path.dirname (os.path.abspath (__file__))
+sys.path.insert (0, _directory)
+sys.path.insert (0, os.path.join (_directory, '..'))
+
+from common import Benchmark
+
+def _LoadBenchmarks (sizes):
+    result = []
+    for filename in sorted (glob.glob (os.path.join (_directory, 'bench_*.py'))):
+        moduleName = os.path.splitext (os.path.basename (filename)) [0]
+        module = importlib.import_module (moduleName)
+        prefix = moduleName [len ('bench_'):] + '/'
+
+        if sizes is not None and hasattr (module, 'CreateBenchmarks'):
+            benchmarks = module.CreateBenchmarks (sizes)
+        else:
+            benchmarks = module.BENCHMARKS
+
+        for benchmark in benchmarks:
+            if not isinstance (benchmark, Benchmark):
+                benchmark = Benchmark (benchmark.__name__, benchmark)
+            benchmark.name = prefix + benchmark.name
+            result.append (benchmark)
+
+    return result
+
+def _Matches (name, patterns):
+    if not patterns:
+        return True
+    for pattern in patterns:
+        if any (c in pattern for c in '*?[') and fnmatch.fnmatch (name, pattern):
+            return True
+        if pattern in name:
+            return True
+    return False
+
+def _MeasureTime (benchmark, repeat, minTime):
+    '''Get the minimum time of at least repeat runs, continuing until the runs
+    took minTime seconds in total.'''
+    times = []
+    while len (times) < repeat or (sum (times) < minTime and len (times) < 100):
+        data = benchmark.Setup ()
+        gc.collect ()
+
+        start = time.perf_counter ()
+        benchmark.Run (data)
+        times.append (time.perf_counter () - start)
+
+        del data
+
+    return min (times)
+
+def _MeasureMemory (benchmark):
+    data = benchmark.Setup ()
+    gc.collect ()
+
+    tracemalloc.start ()
+    try:
+        benchmark.Run (data)
+        return tracemalloc.get_traced_memory () [1]
+    finally:
+        tracemalloc.stop ()
+
+def _LoadBaseline (name):
+    with open (os.path.join (_directory, 'baselines', name + '.json')) as f:
+        return json.load (f)
+
+def _SaveBaseline (name, results):
+    os.makedirs (os.path.join (_directory, 'baselines'), exist_ok=True)
+    baseline = {
+        'date'      : datetime.datetime.now ().isoformat (timespec='seconds'),
+        'machine'   : platform.platform (),
+        'python'    : platform.python_version (),
+        'results'   : results
+    }
+
+    with open (os.path.join (_directory, 'baselines', name + '.json'), 'w') as f:
+        json.dump (baseline, f, indent=1, sort_keys=True)
+
+def _FormatResult (name, result, baseline, threshold):
+    line = '{:<40}{:>12.3f} ms'.format (name, result ['time'] * 1000)
+    if 'peak' in result:
+        line += '{:>10.2f} MiB'.format (result ['peak'] / (1 << 20))
+
+    if baseline is not None and name in baseline:
+        ratio = result ['time'] / baseline [name] ['time']
+        line += '{:>8.2f}x'.format (ratio)
+        if ratio > 1 + threshold:
+            line += '  slower'
+        elif ratio < 1 - threshold:
+            line += '  faster'
+
+    return line
+
+def Main ():
+    parser = argparse.ArgumentParser (description='Run the luna benchmarks.',
+        epilog='To track regressions, save a baseline of the revision before '
+        'a change with --save before, and run with --compare before after the '
+        'change. benchmarks/baselines/reference.json is a committed baseline '
+        'of the default sizes, which can be compared against with --compare '
+        'reference.')
+    parser.add_argument ('-f', '--filter', action='append',
+        help='Only run benchmarks whose name contains this string or matches '
+        'this pattern. Can be given several times.')
+    parser.add_argument ('--sizes',
+        help='Comma-separated element counts for the scene benchmarks')
+    parser.add_argument ('--full', action='store_true',
+        help='Run the scene benchmarks with up to 1M elements')
+    parser.add_argument ('--repeat', type=int, default=3,
+        help='Minimum number of timed runs per benchmark')
+    parser.add_argument ('--min-time', type=float, default=0.2,
+        help='Minimum total time in seconds of the timed runs per benchmark')
+    parser.add_argument ('--no-memory', action='store_true',
+        help='Do not measure the peak memory usage')
+    parser.add_argument ('--save', metavar='NAME',
+        help='Store the results as baseline NAME')
+    parser.add_argument ('--compare', metavar='NAME',
+        help='Compare the results against baseline NAME')
+    parser.add_argument ('--threshold', type=float, default=0.1,
+        help='Relative change which is reported as slower or faster')
+    args = parser.parse_args ()
+
+    sizes = None
+    if args.sizes:
+        sizes = [int (s) for s in args.sizes.split (',')]
+    elif args.full:
+        sizes = [1000, 10000, 100000, 1000000]
+
+    baseline = None
+    if args.compare:
+        try:
+            stored = _LoadBaseline (args.compare)
+        except FileNotFoundError:
+            parser.error ('no baseline named {}; create it with --save {}'.format (
+                args.compare, args.compare))
+
+        baseline = stored ['results']
+        if stored ['machine'] != platform.platform () or \
+            stored ['python'] != platform.python_version ():
+            print ('Baseline {} was taken on {} with Python {}; times may not '
+                'be comparable'.format (args.compare, stored ['machine'],
+                stored ['python']), flush=True)
+
+    results = {}
+    for benchmark in _LoadBenchmarks (sizes):
+        if not _Matches (benchmark.name, args.filter):
+            continue
+
+        result = {'time' : _MeasureTime (benchmark, args.repeat, args.min_time)}
+        if not args.no_memory:
+            result ['peak'] = _MeasureMemory (benchmark)
+
+        results [benchmark.name] = result
+        print (_FormatResult (benchmark.name, result, baseline, args.threshold),
+            flush=True)
+
+    if args.save:
+        _SaveBaseline (args.save, results)
+
+if __name__ == '__main__':
+    Main ()
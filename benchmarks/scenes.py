@@ -0,0 +1,165 @@
+'''Synthetic scenes for benchmarking.
+
+Each scene function takes the approximate number of elements and returns a
+new Drawing. All scenes are deterministic.'''
+
+from array import array
+import math
+import os
+import sys
+
+sys.path.insert (0, os.path.join (os.path.dirname (__file__), '..'))
+
+from luna import *
+
+def _Side (count):
+    return max (1, int (math.sqrt (count)))
+
+def CreatePaths (count):
+    '''Paths with 8 points each.'''
+    d = Drawing ()
+    side = _Side (count)
+    for i in range (count):
+        x = (i % side) * 10
+        y = (i // side) * 10
+        d.Add (Path ([(x + j, y + (j * 7) % 5) for j in range (8)]))
+    return d
+
+def CreatePolygons (count):
+    '''Filled triangles.'''
+    d = Drawing ()
+    side = _Side (count)
+    fill = Fill (Color (0, 0, 255), opacity=0.5)
+    for i in range (count):
+        x = (i % side) * 10
+        y = (i // side) * 10
+        d.Add (Polygon ([(x, y), (x + 8, y), (x + 4, y + 7)], fill=fill))
+    return d
+
+def CreateCircles (count):
+    '''Circles with a few different radii.'''
+    d = Drawing ()
+    side = _Side (count)
+    fill = Fill (Color (255, 0, 0))
+    for i in range (count):
+        d.Add (Circle (((i % side) * 10, (i // side) * 10), 1 + i % 4, fill=fill))
+    return d
+
+def CreateNestedGroups (count, fanOut=4):
+    '''Rectangles in a tree of translated groups.
+
+    The children of each group are placed in a square grid, so the drawing
+    stays small enough to be rasterized.'''
+    d = Drawing ()
+    depth = max (1, int (math.ceil (math.log (max (count, 2), fanOut))))
+    columns = int (math.ceil (math.sqrt (fanOut)))
+    remaining = [count]
+
+    def AddChildren (group, level):
+        for i in range (fanOut):
+            if remaining [0] <= 0:
+                return
+            x, y = i % columns, i // columns
+            if level == depth:
+                group.Add (Rectangle ((x * 4, y * 4), (3, 3)))
+                remaining [0] -= 1
+            else:
+                size = 4 * columns ** (depth - level)
+                child = Group ((x * size, y * size))
+                AddChildren (child, level + 1)
+                group.Add (child)
+
+    AddChildren (d, 1)
+    return d
+
+def CreateArray (count):
+    '''An Array with count cells of a shared group.'''
+    d = Drawing ()
+    cell = Group ()
+    cell.Add (Rectangle ((0, 0), (6, 6), fill=Fill (Color (0, 128, 0))))
+    cell.Add (Line ((0, 0), (6, 6)))
+    side = _Side (count)
+    d.Add (Array (d.AddShared (cell), side, max (1, count // side), spacing=(8, 8)))
+    return d
+
+def CreateGrid (count):
+    '''A Grid with count cells.'''
+    d = Drawing ()
+    side = _Side (count)
+    d.Add (Grid ((0, 0), (side, max (1, count // side)), 4))
+    return d
+
+def CreateLineSoup (count):
+    '''Individual Lines forming the contours of a scalar field, as produced by
+    marching squares.'''
+    d = Drawing ()
+    # Roughly one in three cells contains a contour segment
+    side = _Side (3 * count)
+
+    def Field (x, y):
+        return math.sin (x * 0.9) + math.cos (y * 0.7) + math.sin ((x + y) * 0.2)
+
+    values = [[Field (x, y) for x in range (side + 1)] for y in range (side + 1)]
+
+    def Crossing (x0, y0, v0, x1, y1, v1):
+        t = v0 / (v0 - v1)
+        return (x0 + t * (x1 - x0), y0 + t * (y1 - y0))
+
+    lines = 0
+    for y in range (side):
+        for x in range (side):
+            a = values [y] [x]
+            b = values [y] [x + 1]
+            c = values [y + 1] [x + 1]
+            e = values [y + 1] [x]
+
+            points = []
+            if (a < 0) != (b < 0):
+                points.append (Crossing (x, y, a, x + 1, y, b))
+            if (b < 0) != (c < 0):
+                points.append (Crossing (x + 1, y, b, x + 1, y + 1, c))
+            if (c < 0) != (e < 0):
+                points.append (Crossing (x + 1, y + 1, c, x, y + 1, e))
+            if (e < 0) != (a < 0):
+                points.append (Crossing (x, y + 1, e, x, y, a))
+
+            for i in range (0, len (points) - 1, 2):
+                d.Add (Line (points [i], points [i + 1]))
+                lines += 1
+                if lines >= count:
+                    return d
+
+    return d
+
+def CreateSets (count):
+    '''A LineSet, a CircleSet and a PointCloud with count items in total.'''
+    d = Drawing ()
+    side = _Side (count)
+    n = max (1, count // 3)
+
+    segments = array ('d')
+    centers = array ('d')
+    points = array ('d')
+    for i in range (n):
+        x = (i % side) * 10
+        y = (i // side) * 10
+        segments.extend ((x, y, x + 8, y + (i * 7) % 5))
+        centers.extend ((x + 5, y + 5))
+        points.extend ((x + 2, y + 8))
+
+    d.Add (LineSet (segments))
+    d.Add (CircleSet (centers, [1 + i % 4 for i in range (n)],
+        fill=Fill (Color (255, 0, 0))))
+    d.Add (PointCloud (points, 2))
+    return d
+
+SCENES = {
+    'paths'     : CreatePaths,
+    'polygons'  : CreatePolygons,
+    'circles'   : CreateCircles,
+    'nested'    : CreateNestedGroups,
+    'array'     : CreateArray,
+    'grid'      : CreateGrid,
+    'lines'     : CreateLineSoup,
+    'sets'      : CreateSets
+}
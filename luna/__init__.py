@@ -1,7 +1,13 @@
+from array import array
 from enum import Enum, unique
-import copy
+from itertools import chain
+from numbers import Number
+import io
+import operator
+import time
+import weakref
 
-from . import geo
+from . import geo, profile
 
 __version__ = '0.1.5'
 
@@ -38,16 +44,82 @@ def _DashPatternToArray (p):
 
     return m [p]
 
-class Color:
-    def __init__ (self, r, g = None, b = None):
+class _Style:
+    '''Base class of the style objects Color, Stroke, Fill and Font.
+
+    Styles are immutable, compare and hash by value, and are interned:
+    constructing a style equal to a recently created one usually returns the
+    same object. This makes it cheap to share styles between elements, and
+    allows backends to cache per style.'''
+    __slots__ = ('_hash',)
+
+    # Interning is only an optimization, as styles compare by value. To bound
+    # the memory used, the table of a class is cleared when it reaches this size
+    _MAX_INSTANCES = 1 << 16
+
+    def __init_subclass__ (cls, **kwargs):
+        super ().__init_subclass__ (**kwargs)
+        cls._instances = {}
+
+    @classmethod
+    def _Create (cls, key, **values):
+        '''Create and intern a new style with the slot values.'''
+        style = object.__new__ (cls)
+        for name, value in values.items ():
+            object.__setattr__ (style, name, value)
+        object.__setattr__ (style, '_hash', hash (key))
+
+        instances = cls._instances
+        if len (instances) >= _Style._MAX_INSTANCES:
+            instances.clear ()
+        # setdefault, in case another thread created the same style meanwhile
+        return instances.setdefault (key, style)
+
+    def _GetKey (self):
+        return self.__reduce__ () [1]
+
+    def __setattr__ (self, name, value):
+        raise AttributeError ('{} is immutable'.format (type (self).__name__))
+
+    def __delattr__ (self, name):
+        raise AttributeError ('{} is immutable'.format (type (self).__name__))
+
+    def __eq__ (self, other):
+        if self is other:
+            return True
+        if type (other) is not type (self):
+            return NotImplemented
+        return self._hash == other._hash and self._GetKey () == other._GetKey ()
+
+    def __ne__ (self, other):
+        result = self.__eq__ (other)
+        return result if result is NotImplemented else not result
+
+    def __hash__ (self):
+        return self._hash
+
+    def __copy__ (self):
+        return self
+
+    def __deepcopy__ (self, memo):
+        return self
+
+class Color (_Style):
+    __slots__ = ('_r', '_g', '_b')
+
+    def __new__ (cls, r, g = None, b = None):
         if g is None and b is None:
-            self._r = r
-            self._g = r
-            self._b = r
-        else:
-            self._r = r
-            self._g = g
-            self._b = b
+            g = r
+            b = r
+
+        key = (r, g, b)
+        color = cls._instances.get (key)
+        if color is None:
+            color = cls._Create (key, _r=r, _g=g, _b=b)
+        return color
+
+    def __reduce__ (self):
+        return (self.__class__, (self._r, self._g, self._b))
 
     def R (self):
         return self._r
@@ -58,25 +130,33 @@ class Color:
     def B (self):
         return self._b
 
-class Stroke:
-    def __init__ (self, color=Color(0), width=1, linecap=LineCap.Round,
+class Stroke (_Style):
+    __slots__ = ('_color', '_width', '_linecap', '_linejoin', '_dashPattern',
+        '_opacity', '_rgba')
+
+    def __new__ (cls, color=Color(0), width=1, linecap=LineCap.Round,
         linejoin=LineJoin.Round, dashPattern=None,opacity=1):
         '''Specify a stroke style.
 
         A stroke style is used for stroking lines.
 
         dashPattern must be an array of numbers or alternatively a known pattern.'''
-        self._color = color
-        self._width = width
-        self._linecap = linecap
-        self._linejoin = linejoin
-
-        self._opacity = opacity
-
         if isinstance (dashPattern, DashPattern):
-            self._dashPattern = _DashPatternToArray (dashPattern)
-        else:
-            self._dashPattern = dashPattern
+            dashPattern = _DashPatternToArray (dashPattern)
+        if dashPattern is not None:
+            dashPattern = tuple ([float (v) for v in dashPattern])
+
+        key = (color, width, linecap, linejoin, dashPattern, opacity)
+        stroke = cls._instances.get (key)
+        if stroke is None:
+            stroke = cls._Create (key, _color=color, _width=width,
+                _linecap=linecap, _linejoin=linejoin, _dashPattern=dashPattern,
+                _opacity=opacity, _rgba=_GetRGBA (color, opacity))
+        return stroke
+
+    def __reduce__ (self):
+        return (self.__class__, (self._color, self._width, self._linecap,
+            self._linejoin, self._dashPattern, self._opacity))
 
     def GetWidth (self):
         return self._width
@@ -91,6 +171,7 @@ class Stroke:
         return self._linejoin
 
     def GetDashPattern (self):
+        '''Get the dash pattern as a tuple of floats, or None.'''
         return self._dashPattern
 
     def GetDashOffset (self):
@@ -99,10 +180,23 @@ class Stroke:
     def GetOpacity (self):
         return self._opacity
 
-class Fill:
-    def __init__ (self, color=Color (0), opacity=1):
-        self._color = color
-        self._opacity = opacity
+    def GetRGBA (self):
+        '''Get the color and opacity as (r, g, b, a) in the range [0, 1].'''
+        return self._rgba
+
+class Fill (_Style):
+    __slots__ = ('_color', '_opacity', '_rgba')
+
+    def __new__ (cls, color=Color (0), opacity=1):
+        key = (color, opacity)
+        fill = cls._instances.get (key)
+        if fill is None:
+            fill = cls._Create (key, _color=color, _opacity=opacity,
+                _rgba=_GetRGBA (color, opacity))
+        return fill
+
+    def __reduce__ (self):
+        return (self.__class__, (self._color, self._opacity))
 
     def GetColor (self):
         return self._color
@@ -110,39 +204,250 @@ class Fill:
     def GetOpacity (self):
         return self._opacity
 
+    def GetRGBA (self):
+        '''Get the color and opacity as (r, g, b, a) in the range [0, 1].'''
+        return self._rgba
+
+def _GetRGBA (color, opacity):
+    return (color.R () / 255, color.G () / 255, color.B () / 255, opacity)
+
+_slotNames = {}
+
+def _GetSlotNames (cls):
+    '''Get the names of the slots of cls and all its base classes.'''
+    names = _slotNames.get (cls)
+    if names is None:
+        names = []
+        for c in cls.__mro__:
+            slots = c.__dict__.get ('__slots__', ())
+            if isinstance (slots, str):
+                slots = (slots,)
+            names.extend (n for n in slots if n not in ('__dict__', '__weakref__'))
+        names = _slotNames [cls] = tuple (names)
+    return names
+
 class Element:
+    # Drawings can easily contain millions of elements, so all elements use
+    # slots. Subclasses without __slots__ still work, but get a __dict__.
+    __slots__ = ('_scale', '_children', '_shared', '_bounds', '_dependents',
+        '_id', '__weakref__')
+
     def __init__(self, identifier=None):
         self._scale = (1, 1)
-        self._children = []
-        self._shared = []
-        if identifier is None:
-            self._id = self.__class__.__name__ + '_' + str(id(self))
-            self._references = 0
-        else:
-            self._id = identifier
-            # We assume this element is referenced from the "outside", as the
-            # user has specified a name for it
-            self._references = 1
+        # Most elements never get children or shared elements, so they share
+        # the empty tuple until the first one is added, see _AddChild
+        self._children = ()
+        self._shared = ()
+        self._bounds = None
+        # Weak references to the elements whose bounds depend on this one, see
+        # InvalidateBounds. They are weak so temporary Instances and Arrays
+        # do not stay alive as long as their source.
+        self._dependents = ()
+        self._id = identifier
+
+    def __getstate__ (self):
+        # Dependents are not part of the state, otherwise copying or pickling
+        # a single element would drag along everything that references it.
+        # They are re-established in __setstate__.
+        state = {}
+        for name in _GetSlotNames (self.__class__):
+            if name != '_dependents' and hasattr (self, name):
+                state [name] = getattr (self, name)
+        if hasattr (self, '__dict__'):
+            state.update (self.__dict__)
+        return state
+
+    def __setstate__ (self, state):
+        for name, value in state.items ():
+            setattr (self, name, value)
+        self._dependents = ()
+        for element in self._GetDependencies ():
+            element._AddDependent (self)
 
     def Copy (self):
-        return copy.deepcopy (self)
+        '''Create a copy of this element and all its children.
+
+        Each element of the subtree is cloned, but the data is shared where
+        possible: styles are immutable, and point buffers are only copied once
+        either the original or the copy is asked for them with GetData. Buffers
+        which were passed in by the caller are copied right away, so the copy
+        does not change if the caller modifies them. Elements
+        outside of the subtree are not copied, so Instances and Arrays keep
+        referencing the same elements, for instance the shared elements of a
+        Drawing.'''
+        clones = {}
+        result = self._Clone (clones)
+        for clone in clones.values ():
+            clone._Link (clones)
+        return result
+
+    def _Clone (self, clones):
+        '''Clone this element and its children.
+
+        clones maps the id of each element cloned so far to its clone. The
+        clones must be linked with _Link afterwards.'''
+        clone = clones.get (id (self))
+        if clone is not None:
+            return clone
+
+        cls = self.__class__
+        clone = cls.__new__ (cls)
+        copied = False
+        for name in _GetSlotNames (cls):
+            try:
+                value = getattr (self, name)
+            except AttributeError:
+                continue
+
+            if type (value) is geo.Vector2:
+                value = value.Copy ()
+            elif type (value) is geo.PointArray:
+                copied = copied or value._external
+                value = value._Share ()
+            elif _IsBuffer (value):
+                # Value buffers are not wrapped, so they may be owned by the
+                # caller as well
+                value = value [:] if isinstance (value, array) else value.copy ()
+                copied = True
+            setattr (clone, name, value)
+
+        # The bounds are only valid for the copied buffers if the caller did
+        # not modify them without invalidating the bounds
+        if copied:
+            clone._bounds = None
+
+        if hasattr (self, '__dict__'):
+            clone.__dict__.update (self.__dict__)
+
+        clone._dependents = ()
+        clones [id (self)] = clone
+
+        if self._children:
+            clone._children = [child._Clone (clones) for child in self._children]
+        if self._shared:
+            clone._shared = list (self._shared)
+
+        return clone
+
+    def _Link (self, replacements):
+        '''Point the references of this element to the replacements of their
+        targets, if any, and register it with the elements it depends on.
+
+        replacements maps the id of an element to its replacement. This is used
+        to set up elements which have been created without their constructor,
+        for instance clones.'''
+        for element in self._GetDependencies ():
+            element._AddDependent (self)
 
     def GetBounds (self):
+        '''Get the bounds of this element.
+
+        The bounds are computed once and cached until InvalidateBounds is
+        called. The returned bounding box is a copy and may be modified.'''
+        return self._GetBounds ().Copy ()
+
+    def _GetBounds (self):
+        bounds = self._bounds
+        if bounds is None:
+            bounds = self._bounds = self._ComputeBounds ()
+        return bounds
+
+    def _ComputeBounds (self):
+        '''Compute the bounds of this element.
+
+        Subclasses with geometry override this instead of GetBounds.'''
         bounds = geo.BoundingBox ()
 
         for element in self._children:
-            bounds.Merge (element.GetBounds ())
+            bounds.MergeBox (element._GetBounds ())
 
         return bounds
 
+    def InvalidateBounds (self):
+        '''Discard the cached bounds of this element and all elements
+        depending on it.
+
+        This has to be called after modifying geometry in place, for instance
+        when changing the point buffer of a Path.'''
+        pending = [self]
+        while pending:
+            element = pending.pop ()
+            # If the bounds are not cached, no dependent can have them cached
+            # either, as computing those would have cached ours.
+            if element._bounds is None:
+                continue
+            element._bounds = None
+            dead = False
+            for ref in element._dependents:
+                dependent = ref ()
+                if dependent is None:
+                    dead = True
+                else:
+                    pending.append (dependent)
+            if dead:
+                element._dependents = [ref for ref in element._dependents
+                    if ref () is not None]
+
+    def _GetDependencies (self):
+        '''Get the elements the bounds of this element depend on.'''
+        return self._children
+
+    def _AddDependent (self, element):
+        dependents = self._dependents
+        if not dependents:
+            dependents = self._dependents = []
+        # Drop the references to dead elements whenever the size doubles, so
+        # the list does not grow with every element which ever depended on
+        # this one
+        count = len (dependents)
+        if count >= 8 and count & (count - 1) == 0:
+            dependents [:] = [ref for ref in dependents if ref () is not None]
+        dependents.append (weakref.ref (element))
+
+    def _AddChild (self, item):
+        if not self._children:
+            self._children = []
+        self._children.append (item)
+        item._AddDependent (self)
+        self.InvalidateBounds ()
+
     def GetId (self):
+        if self._id is None:
+            return self.__class__.__name__ + '_' + str(id(self))
         return self._id
 
-    def _AddReference (self):
-        self._references += 1
+    def HasIdentifier (self):
+        '''Check if the id of this element has been set by the user.'''
+        return self._id is not None
+
+    def _GetReferencesTo (self, element):
+        '''Get how often this element references element, for instance as the
+        source of an Instance.'''
+        return 0
 
     def IsReferenced (self):
-        return self._references > 0
+        # We assume this element is referenced from the "outside" if the user
+        # has specified a name for it
+        if self._id is not None:
+            return True
+        for ref in self._dependents:
+            dependent = ref ()
+            if dependent is not None and dependent._GetReferencesTo (self) > 0:
+                return True
+        return False
+
+    def GetReferenceCount (self):
+        '''Get the number of times this element is referenced, for instance by
+        Instance elements.
+
+        Only elements which are alive are counted, so discarded Instances,
+        Arrays and copies do not count.'''
+        count = 0 if self._id is None else 1
+        for ref in self._dependents:
+            dependent = ref ()
+            if dependent is not None:
+                count += dependent._GetReferencesTo (self)
+        return count
 
     def GetChildren (self):
         return self._children
@@ -164,25 +469,41 @@ class Element:
             self._scale = geo.Vector2 (x, y)
 
 class Path (Element):
+    __slots__ = ('_points', '_stroke')
+
     def __init__ (self, points, stroke=Stroke ()):
+        '''Create a new path.
+
+        points can be any sequence of points, a flat array ('d') of interleaved
+        coordinates or a NumPy array of shape (N, 2). Buffers are stored
+        without copying, see geo.PointArray.'''
         super (Path, self).__init__ ()
-        self._points = [geo.Vector2(p) for p in points]
+        self._points = geo.PointArray (points)
         self._stroke = stroke
 
     def GetPoints (self):
+        '''Get the points as a geo.PointArray.'''
         return self._points
 
     def GetStroke (self):
         return self._stroke
 
-    def GetBounds (self):
-        bounds = geo.BoundingBox.FromPoints (self._points)
-        bounds.Expand (0.5 * self._stroke.GetWidth ())
+    def _ComputeBounds (self):
+        bounds = self._points.GetBounds ()
+
+        if self._stroke is not None:
+            bounds.Expand (0.5 * self._stroke.GetWidth ())
         return bounds
 
 class Line (Path):
+    __slots__ = ()
+
     def __init__ (self, p0, p1, stroke=Stroke ()):
-        super (Line, self).__init__ ([p0, p1], stroke)
+        # Lines are often created in large numbers, so the point buffer is
+        # packed directly instead of going through the generic conversion
+        x0, y0 = p0
+        x1, y1 = p1
+        super (Line, self).__init__ (array ('d', (x0, y0, x1, y1)), stroke)
 
     def GetStart (self):
         return self.GetPoints () [0]
@@ -191,13 +512,19 @@ class Line (Path):
         return self.GetPoints () [1]
 
 class Polygon (Element):
+    __slots__ = ('_points', '_stroke', '_fill')
+
     def __init__ (self, points, stroke=Stroke (), fill=Fill ()):
+        '''Create a new polygon.
+
+        points accepts the same inputs as Path.'''
         super(Polygon, self).__init__ ()
-        self._points = [geo.Vector2 (p) for p in points]
+        self._points = geo.PointArray (points)
         self._stroke = stroke
         self._fill = fill
 
     def GetPoints (self):
+        '''Get the points as a geo.PointArray.'''
         return self._points
 
     def GetStroke (self):
@@ -206,14 +533,16 @@ class Polygon (Element):
     def GetFill (self):
         return self._fill
 
-    def GetBounds (self):
-        bounds = geo.BoundingBox.FromPoints (self._points)
+    def _ComputeBounds (self):
+        bounds = self._points.GetBounds ()
 
         if self._stroke is not None:
             bounds.Expand (0.5 * self._stroke.GetWidth ())
         return bounds
 
 class Circle (Element):
+    __slots__ = ('_center', '_radius', '_stroke', '_fill')
+
     def __init__ (self, center, radius=1, stroke=Stroke (), fill=Fill ()):
         super (Circle, self).__init__ ()
         self._center = geo.Vector2 (center)
@@ -233,16 +562,26 @@ class Circle (Element):
     def GetFill (self):
         return self._fill
 
-    def GetBounds (self):
-        bounds = geo.BoundingBox ()
-        bounds.Merge ((self._center.x - self._radius, self._center.y - self._radius))
-        bounds.Merge ((self._center.x + self._radius, self._center.y + self._radius))
+    def _ComputeBounds (self):
+        c = self._center
+        r = self._radius
+        bounds = geo.BoundingBox.FromExtents (c.x - r, c.y - r, c.x + r, c.y + r)
 
         if self._stroke is not None:
             bounds.Expand (0.5 * self._stroke.GetWidth ())
         return bounds
 
+def _RectangleBounds (position, size):
+    x0 = position.x
+    y0 = position.y
+    x1 = x0 + size.x
+    y1 = y0 + size.y
+    return geo.BoundingBox.FromExtents (min (x0, x1), min (y0, y1),
+        max (x0, x1), max (y0, y1))
+
 class Rectangle (Element):
+    __slots__ = ('_position', '_size', '_stroke', '_fill', '_cornerRadius')
+
     def __init__ (self, position, size, cornerRadius=0, stroke=Stroke (), fill=Fill ()):
         super (Rectangle, self).__init__ ()
         self._position = geo.Vector2 (position)
@@ -266,16 +605,16 @@ class Rectangle (Element):
     def GetFill (self):
         return self._fill
 
-    def GetBounds (self):
-        bounds = geo.BoundingBox.FromPoints (
-            [self._position, self._position + self._size]
-        )
+    def _ComputeBounds (self):
+        bounds = _RectangleBounds (self._position, self._size)
 
         if self._stroke is not None:
             bounds.Expand (0.5 * self._stroke.GetWidth ())
         return bounds
 
 class Image (Element):
+    __slots__ = ('_position', '_filename', '_size')
+
     def __init__ (self, filename, position, size):
         super (Image, self).__init__ ()
         self._position = geo.Vector2 (position)
@@ -291,35 +630,52 @@ class Image (Element):
     def GetSize (self):
         return self._size
 
-    def GetBounds (self):
-        bounds = geo.BoundingBox.FromPoints (
-            [self._position, self._position + self._size]
-        )
-
-        return bounds
+    def _ComputeBounds (self):
+        return _RectangleBounds (self._position, self._size)
 
 class Instance (Element):
+    __slots__ = ('_source', '_position')
+
     def __init__ (self, source, position):
         super (Instance, self).__init__ ()
-        source._AddReference ()
+        source._AddDependent (self)
         self._source = source
         self._position = geo.Vector2 (position)
 
+    @staticmethod
+    def _CreateUnregistered (source, position):
+        '''Create an instance which is not registered with its source.
+
+        Used for instances which only exist temporarily.'''
+        instance = Instance.__new__ (Instance)
+        Element.__init__ (instance)
+        instance._source = source
+        instance._position = geo.Vector2 (position)
+        return instance
+
+    def _Link (self, replacements):
+        self._source = replacements.get (id (self._source), self._source)
+        super (Instance, self)._Link (replacements)
+
     def GetSource (self):
         return self._source
 
+    def _GetReferencesTo (self, element):
+        return 1 if element is self._source else 0
+
+    def _GetDependencies (self):
+        return (self._source,)
+
     def GetPosition (self):
         return self._position
 
-    def GetBounds (self):
-        b = self._source.GetBounds ()
-
-        return geo.BoundingBox (
-            b.GetMinimum () + self._position,
-            b.GetMaximum () + self._position
-        )
+    def _ComputeBounds (self):
+        return self._source._GetBounds ().Copy ().Translate (
+            self._position.x, self._position.y)
 
 class Group (Element):
+    __slots__ = ('_name', '_translation')
+
     def __init__(self, translation=(0, 0), name=None):
         super(Group, self).__init__ ()
         self._name = name
@@ -327,48 +683,144 @@ class Group (Element):
 
     def Add (self, item):
         assert isinstance(item, Element)
-        self._children.append (item)
+        self._AddChild (item)
 
     def GetTranslation (self):
         return self._translation
 
-    def GetBounds (self):
+    def _ComputeBounds (self):
         b = geo.BoundingBox ()
         for e in self._children:
-            b.Merge (e.GetBounds ())
+            b.MergeBox (e._GetBounds ())
+
+        return b.Translate (self._translation.x, self._translation.y)
+
+class _ArrayInstances:
+    '''Sequence of the instances of an Array, created on demand.'''
+    __slots__ = ('_array',)
+
+    def __init__ (self, array):
+        self._array = array
 
-        return geo.BoundingBox (
-            b.GetMinimum () + self._translation,
-            b.GetMaximum () + self._translation
-        )
+    def __len__ (self):
+        return self._array._columns * self._array._rows
+
+    def __getitem__ (self, index):
+        if isinstance (index, slice):
+            return [self [i] for i in range (*index.indices (len (self)))]
+
+        if index < 0:
+            index += len (self)
+        if index < 0 or index >= len (self):
+            raise IndexError ('instance index out of range')
+
+        return Instance._CreateUnregistered (self._array._element,
+            self._array.GetPosition (index))
+
+    def __iter__ (self):
+        element = self._array._element
+        for position in self._array.GetPositions ():
+            yield Instance._CreateUnregistered (element, position)
 
 class Array (Element):
+    __slots__ = ('_element', '_columns', '_rows', '_offset', '_spacing')
+
     def __init__ (self, element, columns=1, rows=1, offset=(0, 0), spacing=None):
+        '''Place element on a grid with columns x rows cells.
+
+        The array is virtual: instance positions are generated when needed,
+        and no Instance objects are stored. If spacing is not set, the size
+        of element at the time the array is created is used.'''
         super(Array, self).__init__ ()
         self._element = element
         self._columns = columns
         self._rows = rows
         self._offset = geo.Vector2 (offset)
-        self._spacing = geo.Vector2 (spacing) if spacing else element.GetBounds().GetSize()
+        self._spacing = geo.Vector2 (spacing) if spacing else \
+            element._GetBounds ().GetSize ()
+
+        element._AddDependent (self)
+
+    def _Link (self, replacements):
+        self._element = replacements.get (id (self._element), self._element)
+        super (Array, self)._Link (replacements)
+
+    def GetElement (self):
+        return self._element
+
+    def _GetReferencesTo (self, element):
+        return self._columns * self._rows if element is self._element else 0
+
+    def GetColumns (self):
+        return self._columns
+
+    def GetRows (self):
+        return self._rows
+
+    def GetOffset (self):
+        return self._offset
 
-        # Instantiate element
+    def GetSpacing (self):
+        return self._spacing
+
+    def GetPosition (self, index):
+        '''Get the position of the instance with the given index.
+
+        Instances are numbered row by row.'''
+        row, column = divmod (index, self._columns)
+        sx, sy = self.GetSpacing ()
+        return (self._offset.x + sx * column, self._offset.y + sy * row)
+
+    def GetPositions (self):
+        '''Iterate over the positions of all instances, row by row.'''
+        ox, oy = self._offset
+        sx, sy = self.GetSpacing ()
         for row in range (self._rows):
+            y = oy + sy * row
             for column in range (self._columns):
-                self._children.append (Instance (element, self._offset +
-                    geo.Vector2 (self._spacing.x * column, self._spacing.y * row)))
+                yield (ox + sx * column, y)
+
+    def GetChildren (self):
+        '''Get the instances of this array.
+
+        The instances are created on access; prefer GetPositions.'''
+        return _ArrayInstances (self)
+
+    def _GetDependencies (self):
+        return (self._element,)
+
+    def _ComputeBounds (self):
+        if self._columns <= 0 or self._rows <= 0:
+            return geo.BoundingBox ()
+
+        b = self._element._GetBounds ()
+        ox, oy = self._offset
+        sx, sy = self.GetSpacing ()
+
+        bounds = b.Copy ().Translate (ox, oy)
+        bounds.MergeTranslated (b, ox + sx * (self._columns - 1),
+            oy + sy * (self._rows - 1))
+        return bounds
 
 class FontWeight (Enum):
     Normal = 0
     Bold = 1
 
-class Font:
-    def __init__ (self, fontFace=None, size=12, weight=FontWeight.Normal,
+class Font (_Style):
+    __slots__ = ('_size', '_weight', '_fontFace', '_stroke', '_fill')
+
+    def __new__ (cls, fontFace=None, size=12, weight=FontWeight.Normal,
         stroke=None, fill=Fill()):
-        self._size = size
-        self._weight = weight
-        self._fontFace = fontFace
-        self._stroke = stroke
-        self._fill = fill
+        key = (fontFace, size, weight, stroke, fill)
+        font = cls._instances.get (key)
+        if font is None:
+            font = cls._Create (key, _size=size, _weight=weight,
+                _fontFace=fontFace, _stroke=stroke, _fill=fill)
+        return font
+
+    def __reduce__ (self):
+        return (self.__class__, (self._fontFace, self._size, self._weight,
+            self._stroke, self._fill))
 
     def GetSize (self):
         return self._size
@@ -386,6 +838,8 @@ class Font:
         return self._stroke
 
 class Text (Element):
+    __slots__ = ('_text', '_position', '_font', '_stroke')
+
     def __init__ (self, text, position, stroke=Stroke(), font=Font ()):
         super (Text,self).__init__ ()
         self._text = text
@@ -405,22 +859,17 @@ class Text (Element):
     def GetFont (self):
         return self._font
 
-    def GetBounds (self):
-        # Crude approximation
-        # For correct bounds, the backend must actually process this and employ
-        # proper font metrics
-        lines = self._text.split ('\n')
-
-        width = 0
-        height = 0
-
-        for line in lines:
-            width = max (width, len (line) * self._font.GetSize () * 0.5)
-            height += self._font.GetSize () * 1.5 # line spacing
-
-        return geo.BoundingBox (self._position, (width, height))
+    def _ComputeBounds (self):
+        # The position is the start of the baseline, see text.TextMeasurer
+        from .text import GetTextMeasurer
+        minX, minY, maxX, maxY = GetTextMeasurer ().Measure (self._text, self._font)
+        x = self._position.x
+        y = self._position.y
+        return geo.BoundingBox.FromExtents (x + minX, y + minY, x + maxX, y + maxY)
 
 class Drawing (Element):
+    __slots__ = ('_width', '_height', '_margin')
+
     def __init__(self, width = None, height = None, margin = 4):
         '''Create a new drawing.
 
@@ -435,13 +884,19 @@ class Drawing (Element):
         self._margin = margin
 
     def Add (self, item):
-        self._children.append (item)
+        self._AddChild (item)
 
     def GetSize (self):
+        '''Get the size of the drawing, without the margin.
+
+        Unless set explicitly, the size extends from the origin to the maximum
+        of the bounds, and is 0 for an empty drawing.'''
         size = geo.Vector2 (0, 0)
 
         if self._width is None or self._height is None:
-            size = self.GetBounds ().GetMaximum ()
+            bounds = self._GetBounds ()
+            if not bounds.IsEmpty ():
+                size = bounds.GetMaximum ()
 
         if self._width is not None:
             size [0] = self._width
@@ -454,31 +909,123 @@ class Drawing (Element):
     def GetMargin (self):
         return self._margin
 
-    def SaveSvg (self, filename):
+    def RenderSvg (self, **options):
+        '''Render the drawing as SVG and return the document as bytes.
+
+        options are the same as for SaveSvg.'''
+        f = io.BytesIO ()
+        self.SaveSvg (f, **options)
+        return f.getvalue ()
+
+    def SaveSvg (self, filename, **options):
+        '''Save the drawing as SVG.
+
+        filename can be a path or a writable file object. The document is
+        streamed to the output while the drawing is traversed. options are
+        passed on to backends.svg.SvgVisitor.'''
         from .backends.svg import SvgVisitor
-        v = SvgVisitor ()
+        v = SvgVisitor (**options)
         v.Save (filename, self)
 
-    def SavePng (self, filename):
+    def RenderSurface (self, surface=None, workers=None, tile=512, scale=1,
+        lod=False, **options):
+        '''Render the drawing to a Cairo ImageSurface, using scale pixels
+        per unit, and return the surface.
+
+        If surface is set, it is reused instead of allocating a new one.
+        backends.cairo.GetPixels provides access to the pixels of the surface
+        without copying them.
+
+        If workers is larger than 1, the image is rendered in bands using a
+        pool of worker processes. If lod is set, the drawing is simplified for
+        the output resolution first, see lod.Simplify; lod can also be a dict
+        with options for lod.Simplify. options are passed on to
+        backends.cairo.CairoVisitor.'''
         from .backends.cairo import CairoVisitor
-        v = CairoVisitor ()
-        v.SavePng (filename, self)
+        image = self
+        if lod:
+            with profile.Phase ('level of detail'):
+                image = self.Simplify (scale, **(lod if isinstance (lod, dict) else {}))
+
+        v = CairoVisitor (**options)
+        return v.RenderSurface (image, surface, workers=workers, tile=tile,
+            scale=scale)
+
+    def RenderPng (self, **options):
+        '''Render the drawing as PNG and return the image as bytes.
+
+        options are the same as for SavePng.'''
+        f = io.BytesIO ()
+        self.SavePng (f, **options)
+        return f.getvalue ()
 
-    def SavePdf (self, filename):
+    def SavePng (self, filename, workers=None, tile=512, **options):
+        '''Save the drawing as PNG.
+
+        filename can be a path or a writable binary file object. The remaining
+        parameters are the same as for RenderSurface.'''
+        surface = self.RenderSurface (workers=workers, tile=tile, **options)
+        with profile.Phase ('serialization'):
+            surface.write_to_png (filename)
+
+    def RenderPdf (self, **options):
+        '''Render the drawing as PDF and return the document as bytes.
+
+        options are the same as for SavePdf.'''
+        f = io.BytesIO ()
+        self.SavePdf (f, **options)
+        return f.getvalue ()
+
+    def SavePdf (self, filename, **options):
+        '''Save the drawing as PDF.
+
+        filename can be a path or a writable binary file object. options are
+        passed on to backends.cairo.CairoVisitor.'''
         from .backends.cairo import CairoVisitor
-        v = CairoVisitor ()
+        v = CairoVisitor (**options)
         v.SavePdf (filename, self)
 
+    def SaveScene (self, filename):
+        '''Save the drawing as a scene file, which can be loaded again with
+        scene.Load.
+
+        filename can be a path or a writable binary file object.'''
+        from .scene import Save
+        Save (self, filename)
+
+    def Simplify (self, scale=1, **options):
+        '''Create a copy of this drawing which is simplified for rendering
+        with scale pixels per unit.
+
+        See lod.Simplify.'''
+        from .lod import Simplify
+        return Simplify (self, scale, **options)
+
+    def BuildIndex (self):
+        '''Build a spatial index over the leaf elements of this drawing.
+
+        See index.SpatialIndex.'''
+        from .index import SpatialIndex
+        return SpatialIndex (self)
+
     def AddShared (self, item):
         '''Add a new, shared element.
 
         This element will be invisible by default. To place it in the drawing,
         use an Instance which references this object.'''
+        if not self._shared:
+            self._shared = []
         self._shared.append (item)
         return item
 
 class Grid (Group):
+    __slots__ = ('_spacing',)
+
     def __init__ (self, offset, size, spacing, stroke=Stroke ()):
+        '''Create a grid with size [0] x size [1] cells.
+
+        All grid lines are stored in a single LineSet child, so backends
+        render the grid as one path.'''
         super(Grid, self).__init__ ()
 
         if hasattr (spacing, '__len__') and len (spacing) == 2:
@@ -486,22 +1033,25 @@ class Grid (Group):
         else:
             self._spacing = geo.Vector2 (spacing, spacing)
 
-        horizontalLine = Line ((offset [0], offset [1]),
-                      (offset [0] + size [0] * self._spacing.x, offset [1]),
-                      stroke=stroke)
-        self._shared.append (horizontalLine)
+        x0, y0 = offset
+        sx, sy = self._spacing
+        x1 = x0 + size [0] * sx
+        y1 = y0 + size [1] * sy
 
+        segments = array ('d')
         for y in range (0, size [1] + 1):
-            self.Add (Instance (horizontalLine, (0, y * self._spacing.y)))
-
-        verticalLine = Line ((offset [0], offset [1]),
-                             (offset [0], offset [1] + size [1] * self._spacing.y),
-                             stroke=stroke)
-        self._shared.append (verticalLine)
+            segments.extend ((x0, y0 + y * sy, x1, y0 + y * sy))
         for x in range (0, size [0] + 1):
-            self.Add (Instance (verticalLine, (x * self._spacing.x, 0)))
+            segments.extend ((x0 + x * sx, y0, x0 + x * sx, y1))
+
+        self.Add (LineSet (segments, stroke=stroke))
+
+    def GetSpacing (self):
+        return self._spacing
 
 class Cross (Group):
+    __slots__ = ()
+
     def __init__ (self, position, size=1, stroke=Stroke()):
         super(Cross, self).__init__ ()
         self.Add (Line ((position [0] - size, position [1] - size),
@@ -511,15 +1061,242 @@ class Cross (Group):
                         (position [0] - size, position [1] + size),
                         stroke = stroke))
 
-class Visitor:
-    def VisitGeneric (self, element, ctx=None):
-        fname = 'Visit{0}'.format (element.__class__.__name__)
+def _IsBuffer (data):
+    return isinstance (data, (geo.PointArray, array)) or \
+        (geo.numpy is not None and isinstance (data, geo.numpy.ndarray))
 
-        if hasattr (self, fname):
-            func = getattr (self, fname)
-            return func (element, ctx)
+class LineSet (Element):
+    __slots__ = ('_points', '_stroke')
+
+    def __init__ (self, segments, stroke=Stroke ()):
+        '''Create a set of line segments sharing one stroke.
+
+        segments is either a sequence of (start, end) pairs, a flat array ('d')
+        with four coordinates per segment, or a NumPy array of shape (N, 4).
+        This is much cheaper than creating one Line per segment.'''
+        super (LineSet, self).__init__ ()
+        if not _IsBuffer (segments):
+            segments = list (chain.from_iterable (segments))
+        self._points = geo.PointArray (segments)
+        self._stroke = stroke
+
+        if len (self._points) % 2 != 0:
+            raise ValueError ('Each segment must have a start and an end point')
+
+    def GetPoints (self):
+        '''Get the end points as a geo.PointArray.
+
+        Segment i goes from point 2 * i to point 2 * i + 1.'''
+        return self._points
+
+    def GetCount (self):
+        return len (self._points) // 2
+
+    def GetStroke (self):
+        return self._stroke
+
+    def _ComputeBounds (self):
+        bounds = self._points.GetBounds ()
+
+        if self._stroke is not None:
+            bounds.Expand (0.5 * self._stroke.GetWidth ())
+        return bounds
+
+class CircleSet (Element):
+    __slots__ = ('_centers', '_stroke', '_fill', '_radius')
+
+    def __init__ (self, centers, radius=1, stroke=Stroke (), fill=Fill ()):
+        '''Create a set of circles sharing one style.
+
+        centers accepts the same inputs as Path. radius is either a single
+        radius used for all circles, or a sequence or buffer with one radius
+        per circle.'''
+        super (CircleSet, self).__init__ ()
+        self._centers = geo.PointArray (centers)
+        self._stroke = stroke
+        self._fill = fill
+
+        if isinstance (radius, Number):
+            self._radius = radius
+        else:
+            self._radius = geo.PackValues (radius)
+            if len (self._radius) != len (self._centers):
+                raise ValueError ('Expected one radius per circle')
+
+    def GetCenters (self):
+        return self._centers
+
+    def GetRadius (self):
+        '''Get the radius, which is either a number or a buffer with one
+        radius per circle.'''
+        return self._radius
+
+    def GetRadii (self):
+        '''Get a list with the radius of each circle.'''
+        if isinstance (self._radius, Number):
+            return [self._radius] * len (self._centers)
+        return self._radius.tolist ()
+
+    def GetCount (self):
+        return len (self._centers)
+
+    def GetStroke (self):
+        return self._stroke
+
+    def GetFill (self):
+        return self._fill
+
+    def _ComputeBounds (self):
+        if len (self._centers) == 0:
+            return geo.BoundingBox ()
+
+        if isinstance (self._radius, Number):
+            bounds = self._centers.GetBounds ().Expand (self._radius)
+        elif geo.numpy is not None:
+            c = geo.numpy.asarray (self._centers._GetBuffer ()).reshape (-1, 2)
+            r = geo.numpy.asarray (self._radius)
+            bounds = geo.BoundingBox.FromExtents (
+                float ((c [:, 0] - r).min ()), float ((c [:, 1] - r).min ()),
+                float ((c [:, 0] + r).max ()), float ((c [:, 1] + r).max ()))
         else:
-            return self.VisitElement (element, ctx)
+            c = self._centers.GetCoordinates ()
+            r = self._radius
+            xs = c [0::2]
+            ys = c [1::2]
+            bounds = geo.BoundingBox.FromExtents (
+                min (map (operator.sub, xs, r)), min (map (operator.sub, ys, r)),
+                max (map (operator.add, xs, r)), max (map (operator.add, ys, r)))
+
+        if self._stroke is not None:
+            bounds.Expand (0.5 * self._stroke.GetWidth ())
+        return bounds
+
+class PointCloud (Element):
+    __slots__ = ('_points', '_size', '_fill')
+
+    def __init__ (self, points, size=1, fill=Fill ()):
+        '''Create a set of points, drawn as filled squares of the given size.
+
+        points accepts the same inputs as Path.'''
+        super (PointCloud, self).__init__ ()
+        self._points = geo.PointArray (points)
+        self._size = size
+        self._fill = fill
+
+    def GetPoints (self):
+        return self._points
+
+    def GetSize (self):
+        return self._size
+
+    def GetFill (self):
+        return self._fill
+
+    def _ComputeBounds (self):
+        if len (self._points) == 0:
+            return geo.BoundingBox ()
+        return self._points.GetBounds ().Expand (0.5 * self._size)
+
+class Visitor:
+    '''Base class for all visitors.
+
+    VisitGeneric dispatches an element to Visit<ClassName>, using the first
+    class in the method resolution order of the element for which the visitor
+    has a handler. The handlers are resolved once per visitor class and element
+    class, and stored in a dispatch table on the visitor class.
+
+    Visitors created while profiling is active record their visits, see
+    profile.Profiling. Internal passes which do not render the drawing set
+    _profiled to False, so the profile only counts the rendered elements.'''
+    _dispatchTable = {}
+    _profiled = True
+
+    def __init_subclass__ (cls, **kwargs):
+        super ().__init_subclass__ (**kwargs)
+        cls._dispatchTable = {}
+
+    def __init__ (self):
+        if self._profiled:
+            active = profile.GetActiveProfile ()
+            if active is not None:
+                self.EnableProfiling (active)
+
+    def EnableProfiling (self, profile):
+        '''Record all visits of this visitor in profile.
+
+        The instrumented dispatch replaces VisitGeneric on this instance only,
+        so visitors without profiling are not slowed down.'''
+        self._profile = profile
+        self.VisitGeneric = self._ProfiledVisitGeneric
+
+    def DisableProfiling (self):
+        self.__dict__.pop ('VisitGeneric', None)
+        self.__dict__.pop ('_profile', None)
+
+    def __getstate__ (self):
+        # Profiling is not carried over into other processes
+        state = self.__dict__.copy ()
+        state.pop ('VisitGeneric', None)
+        state.pop ('_profile', None)
+        return state
+
+    def _GetCharacterCount (self, ctx):
+        '''Get the number of characters written so far to ctx, or None if the
+        visitor does not track it.'''
+        return None
+
+    def _ProfiledVisitGeneric (self, element, ctx=None):
+        profile = self._profile
+        stack = profile._stack
+        depth = profile._depth
+        elementClass = element.__class__
+        charactersStart = self._GetCharacterCount (ctx)
+
+        nested = [0.0, 0]
+        stack.append (nested)
+        depth [elementClass] = depth.get (elementClass, 0) + 1
+        start = time.perf_counter ()
+        try:
+            return Visitor.VisitGeneric (self, element, ctx)
+        finally:
+            elapsed = time.perf_counter () - start
+            stack.pop ()
+            depth [elementClass] -= 1
+
+            statistics = profile.GetElementStatistics (elementClass.__name__)
+            statistics.count += 1
+            statistics.self += elapsed - nested [0]
+
+            characters = 0
+            if charactersStart is not None:
+                characters = self._GetCharacterCount (ctx) - charactersStart
+                statistics.characters = (statistics.characters or 0) + \
+                    characters - nested [1]
+
+            if stack:
+                stack [-1] [0] += elapsed
+                stack [-1] [1] += characters
+
+            if depth [elementClass] == 0:
+                statistics.cumulative += elapsed
+
+    @classmethod
+    def _ResolveHandler (cls, elementClass):
+        for c in elementClass.__mro__:
+            handler = getattr (cls, 'Visit' + c.__name__, None)
+            if handler is not None:
+                break
+        else:
+            handler = cls.VisitElement
+
+        cls._dispatchTable [elementClass] = handler
+        return handler
+
+    def VisitGeneric (self, element, ctx=None):
+        handler = self._dispatchTable.get (element.__class__)
+        if handler is None:
+            handler = self._ResolveHandler (element.__class__)
+        return handler (self, element, ctx)
 
     def VisitElement (self, element, ctx=None):
         pass
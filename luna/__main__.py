@@ -0,0 +1,5 @@
+import sys
+
+from .cli import Main
+
+sys.exit (Main ())
@@ -1,9 +1,142 @@
 import cairocffi as cairo
-from .. import Visitor, LineJoin, LineCap
+import collections
+import math
+import multiprocessing
+import os
+import threading
+from .. import Visitor, LineJoin, LineCap, FontWeight, Path, Polygon, Circle, \
+	Rectangle, Image, LineSet, CircleSet, PointCloud, geo, profile
+
+class ImageCache:
+	'''A size-bounded cache of decoded images.
+
+	Surfaces are keyed by the absolute path and modification time of the file,
+	so a file which changes on disk is decoded again. If the total size of the
+	decoded images exceeds maxSize bytes, the least recently used ones are
+	evicted. Images which are larger than maxSize are not cached at all.'''
+	def __init__ (self, maxSize=256 << 20):
+		self._maxSize = maxSize
+		self._surfaces = collections.OrderedDict ()
+		self._size = 0
+		self._hits = 0
+		self._misses = 0
+		self._evictions = 0
+		self._lock = threading.Lock ()
+
+	def Get (self, filename):
+		'''Get the decoded surface for the PNG image filename.'''
+		path = os.path.abspath (filename)
+		key = (path, os.stat (path).st_mtime_ns)
+
+		with self._lock:
+			surface = self._surfaces.get (key)
+			if surface is not None:
+				self._surfaces.move_to_end (key)
+				self._hits += 1
+				return surface
+			self._misses += 1
+
+		with profile.Phase ('image decoding'):
+			surface = cairo.ImageSurface.create_from_png (path)
+		size = surface.get_stride () * surface.get_height ()
+		if size > self._maxSize:
+			return surface
+
+		with self._lock:
+			if key not in self._surfaces:
+				# Drop an outdated version of the same file
+				for oldKey in [k for k in self._surfaces if k [0] == path]:
+					self._Remove (oldKey)
+
+				self._surfaces [key] = surface
+				self._size += size
+				self._Evict ()
+
+		return surface
+
+	def _Remove (self, key):
+		surface = self._surfaces.pop (key)
+		self._size -= surface.get_stride () * surface.get_height ()
+
+	def _Evict (self):
+		while self._size > self._maxSize:
+			self._Remove (next (iter (self._surfaces)))
+			self._evictions += 1
+
+	def SetMaxSize (self, maxSize):
+		with self._lock:
+			self._maxSize = maxSize
+			self._Evict ()
+
+	def GetMaxSize (self):
+		return self._maxSize
+
+	def Clear (self):
+		'''Remove all images from the cache and reset the statistics.'''
+		with self._lock:
+			self._surfaces.clear ()
+			self._size = 0
+			self._hits = 0
+			self._misses = 0
+			self._evictions = 0
+
+	def GetStatistics (self):
+		'''Get a dictionary with the number of cached images (count), their
+		total size in bytes (size), and the number of hits, misses and
+		evictions.'''
+		with self._lock:
+			return {
+				'count'     : len (self._surfaces),
+				'size'      : self._size,
+				'hits'      : self._hits,
+				'misses'    : self._misses,
+				'evictions' : self._evictions
+			}
+
+_imageCache = ImageCache ()
+
+def GetImageCache ():
+	'''Get the image cache shared by all Cairo visitors in this process.'''
+	return _imageCache
+
+class _ContextState:
+	'''The graphics state last set on a Cairo context.
+
+	None means the value is unknown and must be set before use.'''
+	__slots__ = ('stroke', 'lineWidth', 'lineJoin', 'lineCap', 'dash', 'source')
 
-class CairoVisitor (Visitor):
 	def __init__ (self):
+		# The stroke whose line attributes are set. Strokes are interned, so
+		# this is usually hit by all elements sharing a style
+		self.stroke = None
+		self.lineWidth = None
+		self.lineJoin = None
+		self.lineCap = None
+		self.dash = None
+		self.source = None
+
+class CairoVisitor (Visitor):
+	def __init__ (self, batchStrokes=False, replayThreshold=None):
+		'''Create a new Cairo visitor.
+
+		The visitor only updates the Cairo graphics state if it differs from
+		the current state. If batchStrokes is set, consecutive Lines and Paths
+		using the same Stroke object are stroked in a single call. This is
+		much faster for scenes with many lines, but overlapping lines with
+		an opacity below 1 are no longer blended with each other.
+
+		If replayThreshold is set, the source of an Instance which is
+		referenced at least replayThreshold times is recorded once into a
+		RecordingSurface, which is then replayed at every Instance instead of
+		visiting the source again. Where the source overlaps other elements,
+		the replayed pixels may differ by one due to rounding, as the
+		recording is blended as a whole.'''
 		super(CairoVisitor,self).__init__ ()
+		self._batchStrokes = batchStrokes
+		self._replayThreshold = replayThreshold
+		self._state = _ContextState ()
+		self._pendingStroke = None
+		self._recordings = {}
 
 	def _VisitCompoundElement (self, element, ctx=None):
 		c = element.GetChildren ()
@@ -27,33 +160,61 @@ class CairoVisitor (Visitor):
 			ctx.translate (-group.GetTranslation () [0],
 						-group.GetTranslation () [1])
 
+	def _BeginStroke (self, stroke, ctx):
+		if self._batchStrokes:
+			if stroke is not self._pendingStroke:
+				self._FlushStrokes (ctx)
+				self._ApplyStroke (stroke, ctx)
+				self._pendingStroke = stroke
+		else:
+			self._ApplyStroke (stroke, ctx)
+
+	def _EndStroke (self, ctx):
+		if not self._batchStrokes:
+			ctx.stroke ()
+
+	def _FlushStrokes (self, ctx):
+		'''Stroke all batched lines and paths.
+
+		Must be called before anything else is drawn.'''
+		if self._pendingStroke is not None:
+			ctx.stroke ()
+			self._pendingStroke = None
+
 	def VisitPath (self, path, ctx = None):
 		if path.GetStroke () is None:
 			return
 
-		self._ApplyStroke (path.GetStroke (), ctx)
-		ctx.move_to (path.GetPoints () [0].x, path.GetPoints () [0].y)
+		coordinates = path.GetPoints ().GetCoordinates ()
+		if len (coordinates) == 0:
+			return
 
-		for p in path.GetPoints () [1:]:
-			ctx.line_to (p.x, p.y)
-		ctx.stroke ()
+		self._BeginStroke (path.GetStroke (), ctx)
+		self._AddPolyline (coordinates, ctx)
+		self._EndStroke (ctx)
 
 	def VisitLine (self, line, ctx = None):
 		if line.GetStroke () is None:
 			return
 
-		self._ApplyStroke (line.GetStroke (), ctx)
-		ctx.move_to (line.GetStart () [0], line.GetStart () [1])
-		ctx.line_to (line.GetEnd () [0], line.GetEnd () [1])
-		ctx.stroke ()
+		x0, y0, x1, y1 = line.GetPoints ().GetCoordinates ()
+
+		self._BeginStroke (line.GetStroke (), ctx)
+		ctx.move_to (x0, y0)
+		ctx.line_to (x1, y1)
+		self._EndStroke (ctx)
 
 	def VisitText (self, text, ctx=None):
-		ctx.set_font_size (text.GetFont ().GetSize ())
+		self._FlushStrokes (ctx)
+		font = text.GetFont ()
+		ctx.set_font_size (font.GetSize ())
 
-		if text.GetFont ().GetFontFace () is not None:
-			ctx.select_font_face (text.GetFont ().GetFontFace (),
-				cairo.FONT_SLANT_NORMAL,
-				cairo.FONT_WEIGHT_NORMAL)
+		# The font is always selected, as the one of the previous text may still
+		# be set. This matches the measurement in text.TextMeasurer
+		ctx.select_font_face (font.GetFontFace () or '',
+			cairo.FONT_SLANT_NORMAL,
+			cairo.FONT_WEIGHT_BOLD if font.GetWeight () == FontWeight.Bold
+			else cairo.FONT_WEIGHT_NORMAL)
 
 		if text.GetFont ().GetFill () is not None:
 			self._ApplyFill (text.GetFont ().GetFill (), ctx)
@@ -69,14 +230,14 @@ class CairoVisitor (Visitor):
 		if polygon.GetFill () is None and polygon.GetStroke () is None:
 			return
 
+		self._FlushStrokes (ctx)
+
 		points = polygon.GetPoints ()
 
 		if len(points) <= 1:
 			return
 
-		ctx.move_to (points [0][0], points [0][1])
-		for p in points [1:]:
-			ctx.line_to (p [0], p [1])
+		self._AddPolyline (points.GetCoordinates (), ctx)
 		ctx.close_path ()
 
 		if polygon.GetFill () is not None:
@@ -94,6 +255,8 @@ class CairoVisitor (Visitor):
 		if rectangle.GetFill () is None and rectangle.GetStroke () is None:
 			return
 
+		self._FlushStrokes (ctx)
+
 		if rectangle.GetCornerRadius () == 0:
 			ctx.rectangle (rectangle.GetPosition () [0], rectangle.GetPosition () [1],
 				rectangle.GetSize ().x, rectangle.GetSize ().y)
@@ -119,7 +282,8 @@ class CairoVisitor (Visitor):
 		ctx.new_path ()
 
 	def VisitImage (self, image, ctx=None):
-		fill = cairo.ImageSurface.create_from_png (image.GetFilename ())
+		self._FlushStrokes (ctx)
+		fill = _imageCache.Get (image.GetFilename ())
 		w = fill.get_width ()
 		h = fill.get_height ()
 
@@ -133,6 +297,8 @@ class CairoVisitor (Visitor):
 		if circle.GetFill () is None and circle.GetStroke () is None:
 			return
 
+		self._FlushStrokes (ctx)
+
 		import math
 
 		ctx.arc (circle.GetCenter () [0], circle.GetCenter () [1],
@@ -148,57 +314,331 @@ class CairoVisitor (Visitor):
 
 		ctx.new_path ()
 
+	def VisitLineSet (self, lineSet, ctx=None):
+		if lineSet.GetStroke () is None or lineSet.GetCount () == 0:
+			return
+
+		self._FlushStrokes (ctx)
+		self._ApplyStroke (lineSet.GetStroke (), ctx)
+
+		moveTo = ctx.move_to
+		lineTo = ctx.line_to
+		it = iter (lineSet.GetPoints ().GetCoordinates ())
+		for x0, y0, x1, y1 in zip (it, it, it, it):
+			moveTo (x0, y0)
+			lineTo (x1, y1)
+		ctx.stroke ()
+
+	def VisitCircleSet (self, circleSet, ctx=None):
+		if circleSet.GetFill () is None and circleSet.GetStroke () is None:
+			return
+
+		import math
+
+		self._FlushStrokes (ctx)
+
+		newSubPath = ctx.new_sub_path
+		arc = ctx.arc
+		c = circleSet.GetCenters ().GetCoordinates ()
+		for x, y, r in zip (c [0::2], c [1::2], circleSet.GetRadii ()):
+			newSubPath ()
+			arc (x, y, r, 0, 2 * math.pi)
+
+		if circleSet.GetFill () is not None:
+			self._ApplyFill (circleSet.GetFill (), ctx)
+			ctx.fill_preserve ()
+
+		if circleSet.GetStroke () is not None:
+			self._ApplyStroke (circleSet.GetStroke (), ctx)
+			ctx.stroke_preserve ()
+
+		ctx.new_path ()
+
+	def VisitPointCloud (self, pointCloud, ctx=None):
+		if pointCloud.GetFill () is None:
+			return
+
+		self._FlushStrokes (ctx)
+
+		size = pointCloud.GetSize ()
+		rectangle = ctx.rectangle
+		it = iter (pointCloud.GetPoints ().GetCoordinates ())
+		for x, y in zip (it, it):
+			rectangle (x - 0.5 * size, y - 0.5 * size, size, size)
+
+		self._ApplyFill (pointCloud.GetFill (), ctx)
+		ctx.fill ()
+
 	def VisitInstance (self, instance, ctx=None):
+		source = instance.GetSource ()
+		recording = self._GetRecording (source, ctx)
+
+		if recording is not None:
+			self._FlushStrokes (ctx)
+			ctx.set_source_surface (recording,
+				instance.GetPosition () [0], instance.GetPosition () [1])
+			ctx.paint ()
+			self._state.source = None
+			return
+
 		ctx.translate (instance.GetPosition () [0], instance.GetPosition () [1])
-		self.VisitGeneric (instance.GetSource (), ctx)
+		self.VisitGeneric (source, ctx)
 		ctx.translate (-instance.GetPosition () [0], -instance.GetPosition () [1])
 
-	def _Render (self, image, surface):
+	def VisitArray (self, array, ctx=None):
+		source = array.GetElement ()
+		recording = self._GetRecording (source, ctx)
+
+		if recording is not None:
+			self._FlushStrokes (ctx)
+			for x, y in array.GetPositions ():
+				ctx.set_source_surface (recording, x, y)
+				ctx.paint ()
+			self._state.source = None
+			return
+
+		for x, y in array.GetPositions ():
+			ctx.translate (x, y)
+			self.VisitGeneric (source, ctx)
+			ctx.translate (-x, -y)
+
+	def _GetRecording (self, source, ctx):
+		'''Get the recording of source, if it should be replayed.
+
+		The recording is created on first use. Sources which are not replayed
+		are stored as None, so their references are only counted once.'''
+		if self._replayThreshold is None:
+			return None
+
+		if source in self._recordings:
+			return self._recordings [source]
+
+		if source.GetReferenceCount () < self._replayThreshold:
+			self._recordings [source] = None
+			return None
+
+		self._FlushStrokes (ctx)
+
+		recording = cairo.RecordingSurface (cairo.CONTENT_COLOR_ALPHA, None)
+		state = self._state
+		self._state = _ContextState ()
+
+		recordingContext = cairo.Context (recording)
+		self.VisitGeneric (source, recordingContext)
+		self._FlushStrokes (recordingContext)
+
+		self._state = state
+		self._recordings [source] = recording
+		return recording
+
+	def __getstate__ (self):
+		# The graphics state and the recordings belong to a single render
+		state = super(CairoVisitor,self).__getstate__ ()
+		for key in ('_state', '_pendingStroke', '_recordings'):
+			state.pop (key, None)
+		return state
+
+	def _Render (self, image, surface, scale=1):
+		if isinstance (surface, cairo.ImageSurface):
+			_MarkDrawn (surface)
 		ctx = cairo.Context (surface)
+		self._state = _ContextState ()
+		self._pendingStroke = None
+		self._recordings = {}
 
+		if scale != 1:
+			ctx.scale (scale, scale)
 		ctx.translate (image.GetMargin (), image.GetMargin ())
 		self.VisitGeneric (image, ctx)
+		self._FlushStrokes (ctx)
+		self._recordings = {}
 
 		return surface
 
-	def SavePng (self, filename, image):
+	def _RenderRegion (self, image, index, surface, region, scale=1):
+		'''Render the part (x, y, width, height) of image to surface.
+
+		The region is given in pixels. Only the entries of the index which
+		intersect the region are visited, and placed directly at their
+		offset.'''
+		_MarkDrawn (surface)
+		ctx = cairo.Context (surface)
+		self._state = _ContextState ()
+		self._pendingStroke = None
+		self._recordings = {}
+
+		x, y, width, height = region
+		margin = image.GetMargin ()
+		minX = x / scale - margin
+		minY = y / scale - margin
+		visible = (minX, minY, minX + width / scale, minY + height / scale)
+
+		for entry in _GetVisibleEntries (index, visible, scale):
+			# The region is moved in whole pixels, before scaling like _Render
+			offset = entry.GetOffset ()
+			ctx.identity_matrix ()
+			ctx.translate (-x, -y)
+			if scale != 1:
+				ctx.scale (scale, scale)
+			ctx.translate (margin + offset.x, margin + offset.y)
+			self.VisitGeneric (entry.GetElement (), ctx)
+
+		self._FlushStrokes (ctx)
+		self._recordings = {}
+
+		return surface
+
+	def _GetSurfaceSize (self, image, scale=1):
 		imageSize = [int(i) for i in image.GetSize ()]
-		surface = cairo.ImageSurface (cairo.FORMAT_ARGB32,
-			imageSize [0] + image.GetMargin () * 2,
-			imageSize [1] + image.GetMargin () * 2)
+		return (math.ceil ((imageSize [0] + image.GetMargin () * 2) * scale),
+			math.ceil ((imageSize [1] + image.GetMargin () * 2) * scale))
+
+	def RenderSurface (self, image, surface=None, workers=None, tile=512, scale=1):
+		'''Render image to an ARGB32 ImageSurface, using scale pixels per unit.
+
+		If surface is set, it is cleared and rendered to instead of creating a
+		new surface, which avoids an allocation per frame when rendering
+		repeatedly. It must have the format ARGB32 and the right size.
+
+		If workers is larger than 1, the image is split into horizontal bands
+		which are tile pixels high. The bands are rendered in a pool of worker
+		processes, each of which receives the drawing once and builds a
+		spatial index over it to find the elements in the current band. Each
+		band is rendered with a border above and below, so the result is
+		identical to rendering in a single process. Only with batchStrokes,
+		lines which are culled in a band are no longer stroked together with
+		their neighbours, which can change the anti-aliasing where they meet.
+
+		tile can also be a (width, height) pair to split the image into
+		rectangular tiles. Cairo clips edges to the left and right of a tile
+		in fixed point though, so long edges crossing a vertical tile
+		boundary may be anti-aliased slightly differently.
+
+		Returns the surface.'''
+		with profile.Phase ('bounds'):
+			width, height = self._GetSurfaceSize (image, scale)
+
+		if surface is None:
+			surface = cairo.ImageSurface (cairo.FORMAT_ARGB32, width, height)
+		elif surface.get_format () != cairo.FORMAT_ARGB32 or \
+			surface.get_width () != width or surface.get_height () != height:
+			raise ValueError ('Expected an ARGB32 surface of size {}x{}'.format (
+				width, height))
+		elif workers is None or workers <= 1:
+			ctx = cairo.Context (surface)
+			ctx.set_operator (cairo.OPERATOR_CLEAR)
+			ctx.paint ()
+
+		with profile.Phase ('traversal'):
+			if workers is None or workers <= 1:
+				self._Render (image, surface, scale)
+			else:
+				self._RenderTiled (image, surface, workers, tile, scale)
+
+		return surface
+
+	def SavePng (self, filename, image, workers=None, tile=512, scale=1):
+		'''Save image as PNG.
+
+		filename can be a path or a writable binary file object. See
+		RenderSurface for the remaining parameters.'''
+		surface = self.RenderSurface (image, None, workers, tile, scale)
+		with profile.Phase ('serialization'):
+			surface.write_to_png (filename)
+
+	def _RenderTiled (self, image, surface, workers, tile, scale=1):
+		width = surface.get_width ()
+		height = surface.get_height ()
+
+		if isinstance (tile, (tuple, list)):
+			tileWidth, tileHeight = tile
+		else:
+			tileWidth, tileHeight = width, tile
+
+		tiles = [(x, y, min (tileWidth, width - x), min (tileHeight, height - y))
+			for y in range (0, height, tileHeight)
+			for x in range (0, width, tileWidth)]
 
-		self._Render (image, surface).write_to_png (filename)
+		surface.flush ()
+		target = surface.get_data ()
+		stride = surface.get_stride ()
+
+		with multiprocessing.Pool (min (workers, len (tiles)),
+			initializer=_InitTileWorker, initargs=(self, image, width, scale)) as pool:
+			for (x, y, w, h), data, tileStride in pool.imap_unordered (_RenderTile, tiles):
+				for row in range (h):
+					offset = (y + row) * stride + x * 4
+					tileOffset = row * tileStride
+					target [offset:offset + w * 4] = data [tileOffset:tileOffset + w * 4]
+
+		surface.mark_dirty ()
+		return surface
 
 	def SavePdf (self, filename, image):
-		imageSize = [int(i) for i in image.GetSize ()]
+		'''Save image as PDF.
+
+		filename can be a path or a writable binary file object.'''
+		with profile.Phase ('bounds'):
+			imageSize = [int(i) for i in image.GetSize ()]
 		surface = cairo.PDFSurface (filename,
 			imageSize [0] + image.GetMargin () * 2,
 			imageSize [1] + image.GetMargin () * 2)
 
-		self._Render (image, surface)
+		with profile.Phase ('traversal'):
+			self._Render (image, surface)
 
-	def _ApplyStroke (self, stroke, ctx):
-		ctx.set_line_width (stroke.GetWidth ())
-		ctx.set_line_join (self._CairoLineJoin (stroke.GetLineJoin ()))
-		ctx.set_line_cap (self._CairoLineCap (stroke.GetLineCap ()))
+		with profile.Phase ('serialization'):
+			# Writes the remaining output, which is required for file objects
+			surface.finish ()
 
-		if stroke.GetDashPattern () is not None:
-			ctx.set_dash (stroke.GetDashPattern ())
-		else:
-			ctx.set_dash ([])
+	def _AddPolyline (self, coordinates, ctx):
+		'''Add a polyline from a flat coordinate list to the current path.'''
+		it = iter (coordinates)
+		ctx.move_to (next (it), next (it))
+		lineTo = ctx.line_to
+		for x, y in zip (it, it):
+			lineTo (x, y)
 
-		ctx.set_source_rgba (
-			stroke.GetColor ().R () / 255,
-			stroke.GetColor ().G () / 255,
-			stroke.GetColor ().B () / 255,
-			stroke.GetOpacity ())
+	def _ApplyStroke (self, stroke, ctx):
+		state = self._state
+		if stroke is not state.stroke:
+			self._ApplyLineAttributes (stroke, ctx)
+			state.stroke = stroke
+
+		self._SetSource (stroke.GetRGBA (), ctx)
+
+	def _ApplyLineAttributes (self, stroke, ctx):
+		state = self._state
+
+		width = stroke.GetWidth ()
+		if width != state.lineWidth:
+			ctx.set_line_width (width)
+			state.lineWidth = width
+
+		lineJoin = stroke.GetLineJoin ()
+		if lineJoin is not state.lineJoin:
+			ctx.set_line_join (self._CairoLineJoin (lineJoin))
+			state.lineJoin = lineJoin
+
+		lineCap = stroke.GetLineCap ()
+		if lineCap is not state.lineCap:
+			ctx.set_line_cap (self._CairoLineCap (lineCap))
+			state.lineCap = lineCap
+
+		dash = stroke.GetDashPattern ()
+		if dash is None:
+			dash = ()
+		if dash != state.dash:
+			ctx.set_dash (list (dash))
+			state.dash = dash
 
 	def _ApplyFill (self, fill, ctx):
-		ctx.set_source_rgba (
-			fill.GetColor ().R () / 255,
-			fill.GetColor ().G () / 255,
-			fill.GetColor ().B () / 255,
-			fill.GetOpacity ())
+		self._SetSource (fill.GetRGBA (), ctx)
+
+	def _SetSource (self, rgba, ctx):
+		if rgba != self._state.source:
+			ctx.set_source_rgba (*rgba)
+			self._state.source = rgba
 
 	def _CairoLineJoin (self, lineJoin):
 		m = {
@@ -217,3 +657,98 @@ class CairoVisitor (Visitor):
 		}
 
 		return m [lineCap]
+
+def GetPixels (surface):
+	'''Get the pixels of an ImageSurface without copying them.
+
+	If NumPy is available, this returns an array of shape (height, width, 4)
+	with one byte per channel, otherwise a flat memoryview including the row
+	padding. For ARGB32 surfaces, the channels are premultiplied and stored in
+	native byte order, that is, as BGRA on little-endian machines.
+
+	The result refers to the memory of the surface, so the surface must be kept
+	alive while it is used. Call mark_dirty on the surface after modifying the
+	pixels.'''
+	surface.flush ()
+	data = surface.get_data ()
+
+	if geo.numpy is None:
+		return memoryview (data)
+
+	return geo.numpy.ndarray ((surface.get_height (), surface.get_width (), 4),
+		dtype=geo.numpy.uint8, buffer=data,
+		strides=(surface.get_stride (), 4, 1))
+
+def _MarkDrawn (surface):
+	'''Mark an ImageSurface as drawn to.
+
+	Cairo blends the first element drawn onto a surface it knows to be clear
+	with different rounding. Marking the surface keeps the result independent
+	of which element is drawn first, which differs between tiles.'''
+	surface.mark_dirty ()
+
+# Elements with exact bounds. All other elements, in particular Text, for which
+# only an estimate is available, are never culled.
+_cullableTypes = (Path, Polygon, Circle, Rectangle, Image, LineSet, CircleSet,
+	PointCloud)
+
+class _CullingIndex:
+	'''A spatial index together with the data needed for conservative culling.'''
+	def __init__ (self, image):
+		self.index = image.BuildIndex ()
+		self.alwaysVisible = []
+		maxStrokeWidth = 0
+
+		for entry in self.index.GetEntries ():
+			element = entry.GetElement ()
+			if not isinstance (element, _cullableTypes):
+				self.alwaysVisible.append (entry)
+			elif hasattr (element, 'GetStroke') and element.GetStroke () is not None:
+				maxStrokeWidth = max (maxStrokeWidth, element.GetStroke ().GetWidth ())
+
+		# Account for miter joins and square caps
+		self.padding = 5 * maxStrokeWidth
+
+def _GetVisibleEntries (index, region, scale=1):
+	minX, minY, maxX, maxY = region
+	# Anti-aliasing extends up to a pixel beyond the bounds
+	p = index.padding + 2 / scale
+	entries = index.index.Query (geo.BoundingBox.FromExtents (
+		minX - p, minY - p, maxX + p, maxY + p))
+
+	if index.alwaysVisible:
+		entries = list ({e.GetOrder () : e for e in entries + index.alwaysVisible}.values ())
+		entries.sort (key=lambda e: e.GetOrder ())
+
+	return entries
+
+# Visitor, drawing and index of a tile rendering worker process
+_tileWorkerScene = None
+
+def _InitTileWorker (visitor, image, imageWidth, scale=1):
+	global _tileWorkerScene
+	_tileWorkerScene = (visitor, image, _CullingIndex (image), imageWidth, scale)
+
+def _RenderTile (tile):
+	visitor, image, index, imageWidth, scale = _tileWorkerScene
+	x, y, width, height = tile
+
+	# Cairo clips geometry to the surface, which changes the anti-aliasing
+	# of strokes close to the edge. The tile is rendered with a border which
+	# is cropped afterwards, so its edges match rendering in one piece. A tile
+	# spanning the full width is clipped at the same place as the image, and
+	# only needs a border above and below
+	border = math.ceil (index.padding * scale) + 4
+	borderX = 0 if width == imageWidth else border
+	surface = cairo.ImageSurface (cairo.FORMAT_ARGB32,
+		width + 2 * borderX, height + 2 * border)
+	visitor._RenderRegion (image, index, surface, (x - borderX, y - border,
+		width + 2 * borderX, height + 2 * border), scale)
+	surface.flush ()
+
+	data = surface.get_data ()
+	stride = surface.get_stride ()
+	rows = [data [(row + border) * stride + borderX * 4:
+		(row + border) * stride + (borderX + width) * 4] for row in range (height)]
+
+	return tile, b''.join (rows), width * 4
@@ -1,145 +1,531 @@
-import svgwrite
-from .. import Visitor, LineJoin, LineCap
+import gzip
+import io
+import math
+from xml.sax.saxutils import escape
+
+from .. import Visitor, LineJoin, LineCap, Array, profile
+
+def _FormatNumber (value):
+	if isinstance (value, float) and value.is_integer ():
+		return str (int (value))
+	return str (value)
+
+def _MakeNumberFormat (precision):
+	'''Create a function which formats numbers with at most precision
+	decimal places, or _FormatNumber if precision is None.'''
+	if precision is None:
+		return _FormatNumber
+
+	def FormatNumber (value):
+		if not math.isfinite (value):
+			return _FormatNumber (value)
+
+		value = round (value, precision)
+		if value == int (value):
+			# Also turns -0.0 into 0
+			return str (int (value))
+		return '{:.{}f}'.format (value, precision).rstrip ('0')
+
+	return FormatNumber
+
+def _ToBase36 (value):
+	digits = '0123456789abcdefghijklmnopqrstuvwxyz'
+	result = []
+	while True:
+		value, digit = divmod (value, 36)
+		result.append (digits [digit])
+		if value == 0:
+			break
+	return ''.join (reversed (result))
+
+def _FormatAttributes (attributes, formatNumber=_FormatNumber):
+	result = []
+	for key, value in attributes.items ():
+		if isinstance (value, str):
+			value = escape (value, {'"' : '&quot;'})
+		else:
+			value = formatNumber (value)
+		result.append (' {}="{}"'.format (key, value))
+	return ''.join (result)
+
+class SvgWriter:
+	'''Writes SVG markup to a text or binary stream.
+
+	Markup is collected in a buffer which is written to the stream once it
+	exceeds chunkSize characters, so the stream only sees a few large writes.
+	Call Flush at the end to write out the remaining data. formatNumber is
+	used to format numeric attribute values.'''
+	def __init__ (self, stream, chunkSize = 1 << 16, formatNumber = _FormatNumber):
+		self._stream = stream
+		self._formatNumber = formatNumber
+		self._binary = not isinstance (stream, io.TextIOBase)
+		self._chunkSize = chunkSize
+		self._buffer = []
+		self._size = 0
+		self._flushedSize = 0
+
+	def GetCharacterCount (self):
+		'''Get the number of characters written so far, before encoding.'''
+		return self._flushedSize + self._size
+
+	def Write (self, markup):
+		self._buffer.append (markup)
+		self._size += len (markup)
+
+		if self._size >= self._chunkSize:
+			self.Flush ()
+
+	def Flush (self):
+		if not self._buffer:
+			return
+
+		with profile.Phase ('serialization'):
+			data = ''.join (self._buffer)
+			if self._binary:
+				data = data.encode ('utf-8')
+			self._stream.write (data)
+
+		self._buffer = []
+		self._flushedSize += self._size
+		self._size = 0
+
+	def StartElement (self, tag, attributes):
+		self.Write ('<{}{}>'.format (tag, _FormatAttributes (attributes, self._formatNumber)))
+
+	def EndElement (self, tag):
+		self.Write ('</{}>'.format (tag))
+
+	def EmptyElement (self, tag, attributes):
+		self.Write ('<{}{} />'.format (tag, _FormatAttributes (attributes, self._formatNumber)))
+
+	def TextElement (self, tag, attributes, text):
+		self.Write ('<{0}{1}>{2}</{0}>'.format (tag,
+			_FormatAttributes (attributes, self._formatNumber), escape (text)))
+
+def _CollectShared (root, visitor=None):
+	'''Collect all shared elements in the tree below root.
+
+	Shared elements are returned in the order of a depth-first traversal,
+	including elements shared by shared elements. If visitor is set, it visits
+	each element of the tree on the way.'''
+	result = []
+	pending = [root]
+
+	while pending:
+		element = pending.pop ()
+		if visitor is not None:
+			visitor.VisitGeneric (element)
+		shared = element.GetShared ()
+		result.extend (shared)
+
+		# The instances of an array do not share anything
+		if not isinstance (element, Array):
+			pending.extend (reversed (element.GetChildren ()))
+		pending.extend (reversed (shared))
+
+	return result
+
+# Marks elements which have no fill attribute at all
+_NO_FILL = object ()
+
+class _StyleCollector (Visitor):
+	'''Assigns the style classes of an SvgVisitor before the document is
+	written, so the style element can precede the content.
+
+	Each handler must pass the same stroke and fill as the corresponding
+	handler of SvgVisitor.'''
+	_profiled = False
+
+	def __init__ (self, svgVisitor):
+		super (_StyleCollector, self).__init__ ()
+		self._svgVisitor = svgVisitor
+
+	def VisitElement (self, element, ctx=None):
+		pass
+
+	def VisitPath (self, path, ctx=None):
+		self._svgVisitor._GetStyleClass (path.GetStroke ())
+
+	def VisitPolygon (self, polygon, ctx=None):
+		self._svgVisitor._GetStyleClass (polygon.GetStroke (), polygon.GetFill ())
+
+	def VisitRectangle (self, rectangle, ctx=None):
+		self._svgVisitor._GetStyleClass (rectangle.GetStroke (), rectangle.GetFill ())
+
+	def VisitCircle (self, circle, ctx=None):
+		self._svgVisitor._GetStyleClass (circle.GetStroke (), circle.GetFill ())
+
+	def VisitLineSet (self, lineSet, ctx=None):
+		self._svgVisitor._GetStyleClass (lineSet.GetStroke (), None)
+
+	def VisitCircleSet (self, circleSet, ctx=None):
+		self._svgVisitor._GetStyleClass (circleSet.GetStroke (), circleSet.GetFill ())
+
+	def VisitPointCloud (self, pointCloud, ctx=None):
+		self._svgVisitor._GetStyleClass (None, pointCloud.GetFill ())
 
 class SvgVisitor (Visitor):
-	def __init__ (self):
+	'''Writes a drawing as SVG.
+
+	Elements are written to the output while the tree is traversed, so no
+	document is built in memory. The visit methods take an SvgWriter as the
+	context.
+
+	If styleClasses is set, stroke and fill are not written as attributes.
+	Each distinct combination becomes a CSS class instead. The classes are
+	collected while looking for the shared elements, and written into a single
+	style element at the start of the document.
+
+	precision limits the number of decimal places of all numbers. If shortIds
+	is set, elements without a user-specified id are numbered in the order in
+	which they are written, so the output does not depend on the memory layout
+	of the process. If compress is set, Save writes gzip-compressed SVG; by
+	default, this is done if the file name ends in .svgz.'''
+	def __init__ (self, styleClasses=False, precision=None, shortIds=False,
+		compress=None):
 		super(SvgVisitor,self).__init__ ()
-
-	def _UpdateCommonAttributes (self, svgItem, element):
+		self._styleClasses = styleClasses
+		self._formatNumber = _MakeNumberFormat (precision)
+		self._shortIds = shortIds
+		self._compress = compress
+		self._ResetStyles ()
+		self._ResetIds ()
+
+	def _ResetIds (self):
+		# Elements are kept alive so their ids cannot be reused while writing
+		self._ids = {}
+		self._idElements = []
+
+	def _GetId (self, element):
+		if not self._shortIds or element.HasIdentifier ():
+			return element.GetId ()
+
+		result = self._ids.get (id (element))
+		if result is None:
+			result = 'i' + _ToBase36 (len (self._idElements))
+			self._ids [id (element)] = result
+			self._idElements.append (element)
+		return result
+
+	def _ResetStyles (self):
+		# Attributes of each stroke and fill. Styles are interned and hashable,
+		# so these are computed once per distinct style
+		self._strokeAttributes = {}
+		self._fillAttributes = {}
+		# Maps a stroke/fill pair to the class name
+		self._styleNames = {}
+		# Maps the CSS declarations to the class name, so equal styles share
+		# a class even if they differ in attributes which are not written
+		self._styleRules = {}
+
+	def _GetStrokeAttributes (self, stroke):
+		result = self._strokeAttributes.get (stroke)
+		if result is None:
+			result = self._strokeAttributes [stroke] = self._SvgStroke (stroke)
+		return result
+
+	def _GetFillAttributes (self, fill):
+		result = self._fillAttributes.get (fill)
+		if result is None:
+			result = self._fillAttributes [fill] = self._SvgFill (fill)
+		return result
+
+	def _ApplyStyle (self, attributes, stroke, fill=_NO_FILL):
+		if not self._styleClasses:
+			attributes.update (self._GetStrokeAttributes (stroke))
+			if fill is not _NO_FILL:
+				attributes.update (self._GetFillAttributes (fill))
+			return
+
+		attributes ['class'] = self._GetStyleClass (stroke, fill)
+
+	def _GetStyleClass (self, stroke, fill=_NO_FILL):
+		key = (stroke, fill)
+		name = self._styleNames.get (key)
+		if name is None:
+			style = dict (self._GetStrokeAttributes (stroke))
+			if fill is not _NO_FILL:
+				style.update (self._GetFillAttributes (fill))
+
+			declarations = ';'.join (['{}:{}'.format (k,
+				v if isinstance (v, str) else self._formatNumber (v))
+				for k, v in style.items ()])
+			name = self._styleRules.get (declarations)
+			if name is None:
+				name = 's{}'.format (len (self._styleRules))
+				self._styleRules [declarations] = name
+
+			self._styleNames [key] = name
+
+		return name
+
+	def _CommonAttributes (self, element, translation=None):
+		attributes = dict ()
 		if element.IsReferenced ():
-			svgItem ['id'] = element.GetId ()
+			attributes ['id'] = self._GetId (element)
+
+		transform = []
+		if translation is not None and (translation [0] != 0 or translation [1] != 0):
+			transform.append ('translate({},{})'.format (
+				self._formatNumber (translation [0]), self._formatNumber (translation [1])))
 
 		if (element.GetScale ()[0] != 1 or element.GetScale ()[1] != 1):
-			svgItem.scale (e.GetScale ())
+			transform.append ('scale({},{})'.format (
+				self._formatNumber (element.GetScale () [0]),
+				self._formatNumber (element.GetScale () [1])))
+
+		if transform:
+			attributes ['transform'] = ' '.join (transform)
 
-	def _VisitCompoundElement (self, element, ctx=None):
-		for sharedElement in element.GetShared ():
-			svgItem = self.VisitGeneric (sharedElement, ctx)
-			self._UpdateCommonAttributes (svgItem, sharedElement)
+		return attributes
 
-			ctx.defs.add (svgItem)
+	def _GetCharacterCount (self, ctx):
+		return ctx.GetCharacterCount ()
 
+	def _VisitCompoundElement (self, element, ctx, attributes):
 		children = element.GetChildren ()
 		if len (children) == 0:
-			return None
-		else:
-			g = ctx.g ()
-			for childElement in children:
-				svgItem = self.VisitGeneric (childElement, ctx)
-				self._UpdateCommonAttributes (svgItem, childElement)
-
-				g.add (svgItem)
+			ctx.EmptyElement ('g', attributes)
+			return
 
-			return g
+		ctx.StartElement ('g', attributes)
+		for childElement in children:
+			self.VisitGeneric (childElement, ctx)
+		ctx.EndElement ('g')
 
 	def VisitElement (self, element, ctx=None):
-		return self._VisitCompoundElement (element, ctx)
+		self._VisitCompoundElement (element, ctx,
+			self._CommonAttributes (element))
 
 	def VisitGroup (self, group, ctx=None):
-		g = self._VisitCompoundElement (group, ctx)
-
-		if group.GetTranslation () [0] != 0 or group.GetTranslation () [1] != 0:
-			g.translate (group.GetTranslation () [0],
-						group.GetTranslation () [1])
-		return g
+		self._VisitCompoundElement (group, ctx,
+			self._CommonAttributes (group, group.GetTranslation ()))
 
 	def VisitPath (self, path, ctx = None):
-		p = dict ()
-		p.update (self._SvgStroke (path.GetStroke ()))
+		p = self._CommonAttributes (path)
+		p ['points'] = self._SvgPoints (path.GetPoints ())
+		self._ApplyStyle (p, path.GetStroke ())
 
-		return ctx.polyline (path.GetPoints (),
-			**p)
+		ctx.EmptyElement ('polyline', p)
 
 	def VisitLine (self, line, ctx = None):
-		p = dict ()
-		p.update (self._SvgStroke (line.GetStroke ()))
+		x1, y1, x2, y2 = line.GetPoints ().GetCoordinates ()
+
+		p = self._CommonAttributes (line)
+		p ['x1'] = x1
+		p ['y1'] = y1
+		p ['x2'] = x2
+		p ['y2'] = y2
+		self._ApplyStyle (p, line.GetStroke ())
 
-		return ctx.line (line.GetStart (), line.GetEnd (),
-			**p)
+		ctx.EmptyElement ('line', p)
 
 	def VisitPolygon (self, polygon, ctx = None):
-		p = dict ()
-		p.update (self._SvgStroke (polygon.GetStroke ()))
-		p.update (self._SvgFill (polygon.GetFill ()))
+		p = self._CommonAttributes (polygon)
+		p ['points'] = self._SvgPoints (polygon.GetPoints ())
+		self._ApplyStyle (p, polygon.GetStroke (), polygon.GetFill ())
 
-		return ctx.polygon (polygon.GetPoints (),
-			**p)
+		ctx.EmptyElement ('polygon', p)
 
 	def VisitRectangle (self, rectangle, ctx=None):
-		p = dict ()
-		p.update (self._SvgStroke (rectangle.GetStroke ()))
-		p.update (self._SvgFill (rectangle.GetFill ()))
+		p = self._CommonAttributes (rectangle)
+		p ['x'] = rectangle.GetPosition ().x
+		p ['y'] = rectangle.GetPosition ().y
+		p ['width'] = rectangle.GetSize ().x
+		p ['height'] = rectangle.GetSize ().y
 
 		if rectangle.GetCornerRadius () != 0:
 			p ['rx'] = rectangle.GetCornerRadius ()
 			p ['ry'] = rectangle.GetCornerRadius ()
 
-		return ctx.rect (rectangle.GetPosition (),
-			rectangle.GetSize (),
-			**p)
+		self._ApplyStyle (p, rectangle.GetStroke (), rectangle.GetFill ())
+
+		ctx.EmptyElement ('rect', p)
 
 	def VisitImage (self, image, ctx=None):
-		p = dict ()
+		p = self._CommonAttributes (image)
+		p ['x'] = image.GetPosition ().x
+		p ['y'] = image.GetPosition ().y
+		p ['width'] = image.GetSize ().x
+		p ['height'] = image.GetSize ().y
+		p ['xlink:href'] = image.GetFilename ()
 
-		return ctx.image (image.GetFilename (), image.GetPosition (),
-			image.GetSize (), **p)
+		ctx.EmptyElement ('image', p)
 
 	def VisitCircle (self, circle, ctx=None):
-		p = dict ()
-		p.update (self._SvgStroke (circle.GetStroke ()))
-		p.update (self._SvgFill (circle.GetFill ()))
+		p = self._CommonAttributes (circle)
+		p ['cx'] = circle.GetCenter ().x
+		p ['cy'] = circle.GetCenter ().y
+		p ['r'] = circle.GetRadius ()
+		self._ApplyStyle (p, circle.GetStroke (), circle.GetFill ())
+
+		ctx.EmptyElement ('circle', p)
+
+	def VisitLineSet (self, lineSet, ctx=None):
+		c = [self._formatNumber (v) for v in lineSet.GetPoints ().GetCoordinates ()]
+		it = iter (c)
+
+		p = self._CommonAttributes (lineSet)
+		p ['d'] = ''.join (['M' + x0 + ',' + y0 + 'L' + x1 + ',' + y1
+			for x0, y0, x1, y1 in zip (it, it, it, it)])
+		self._ApplyStyle (p, lineSet.GetStroke (), None)
+
+		ctx.EmptyElement ('path', p)
+
+	def VisitCircleSet (self, circleSet, ctx=None):
+		c = circleSet.GetCenters ().GetCoordinates ()
+
+		# Each circle is drawn as two half-circle arcs
+		d = []
+		for x, y, r in zip (c [0::2], c [1::2], circleSet.GetRadii ()):
+			d.append ('M{x},{y}a{r},{r} 0 1,0 {d},0a{r},{r} 0 1,0 -{d},0z'.format (
+				x=self._formatNumber (x - r), y=self._formatNumber (y),
+				r=self._formatNumber (r), d=self._formatNumber (2 * r)))
 
-		return ctx.circle (circle.GetCenter (),
-			circle.GetRadius (),
-			**p)
+		p = self._CommonAttributes (circleSet)
+		p ['d'] = ''.join (d)
+		self._ApplyStyle (p, circleSet.GetStroke (), circleSet.GetFill ())
+
+		ctx.EmptyElement ('path', p)
+
+	def VisitPointCloud (self, pointCloud, ctx=None):
+		size = pointCloud.GetSize ()
+		s = self._formatNumber (size)
+		square = 'h{0}v{0}h-{0}z'.format (s)
+		c = [self._formatNumber (v - 0.5 * size) for v in pointCloud.GetPoints ().GetCoordinates ()]
+		it = iter (c)
+
+		p = self._CommonAttributes (pointCloud)
+		p ['d'] = ''.join (['M' + x + ',' + y + square for x, y in zip (it, it)])
+		self._ApplyStyle (p, None, pointCloud.GetFill ())
+
+		ctx.EmptyElement ('path', p)
 
 	def VisitText (self, text, ctx=None):
-		p = dict ()
+		p = self._CommonAttributes (text)
+		p ['x'] = text.GetPosition ().x
+		p ['y'] = text.GetPosition ().y
 
 		style = []
 		if text.GetFont ().GetFontFace () is not None:
 			style.append ('font-face:{};'.format (text.GetFont ().GetFontFace ()))
 
-		style.append ('font-size:{}px;'.format (text.GetFont ().GetSize ()))
+		style.append ('font-size:{}px;'.format (
+			self._formatNumber (text.GetFont ().GetSize ())))
 
 		p ['style'] = ''.join (style)
 
-		return ctx.text (text.GetText (), text.GetPosition (), **p)
+		ctx.TextElement ('text', p, text.GetText ())
 
 	def VisitInstance (self, instance, ctx=None):
-		return ctx.use ('#' + instance.GetSource().GetId (),
-			insert=instance.GetPosition ())
+		p = self._CommonAttributes (instance)
+		p ['x'] = instance.GetPosition ().x
+		p ['y'] = instance.GetPosition ().y
+		p ['xlink:href'] = '#' + self._GetId (instance.GetSource ())
 
-	def Save (self, filename, image):
-		imageSize = image.GetSize ()
-		print (imageSize [0], image.GetMargin ())
-		d = svgwrite.Drawing (filename,
-			size = (imageSize [0] + image.GetMargin () * 2,
-					imageSize [1] + image.GetMargin () * 2),
-			profile = 'full')
+		ctx.EmptyElement ('use', p)
+
+	def VisitArray (self, array, ctx=None):
+		href = '#' + self._GetId (array.GetElement ())
 
-		rootItem = self.VisitGeneric (image, d)
-		rootItem.translate (image.GetMargin (), image.GetMargin ())
-		if rootItem is not None:
-			d.add (rootItem)
+		ctx.StartElement ('g', self._CommonAttributes (array))
+		for x, y in array.GetPositions ():
+			ctx.EmptyElement ('use', {'x' : x, 'y' : y, 'xlink:href' : href})
+		ctx.EndElement ('g')
 
-		d.save ()
+	def Save (self, filename, image):
+		'''Save image as SVG.
+
+		filename can be a path or a writable text or binary file object.'''
+		compress = self._compress
+		if compress is None:
+			compress = isinstance (filename, str) and filename.endswith ('.svgz')
+
+		if hasattr (filename, 'write'):
+			if compress:
+				self._WriteCompressed (filename, image)
+			else:
+				self.Write (filename, image)
+		elif compress:
+			with open (filename, 'wb') as f:
+				self._WriteCompressed (f, image)
+		else:
+			with open (filename, 'w', encoding='utf-8') as f:
+				self.Write (f, image)
+
+	def _WriteCompressed (self, stream, image):
+		# No file name or time stamp, so the output is reproducible
+		with gzip.GzipFile (filename='', mode='wb', fileobj=stream, mtime=0) as f:
+			self.Write (f, image)
+
+	def Write (self, stream, image):
+		'''Write image as SVG to a text or binary stream.'''
+		with profile.Phase ('bounds'):
+			imageSize = image.GetSize ()
+		margin = image.GetMargin ()
+
+		self._ResetStyles ()
+		self._ResetIds ()
+
+		writer = SvgWriter (stream, formatNumber=self._formatNumber)
+		writer.Write ('<?xml version="1.0" encoding="utf-8" ?>\n')
+		writer.StartElement ('svg', {
+			'baseProfile'   : 'full',
+			'height'        : imageSize [1] + margin * 2,
+			'version'       : '1.1',
+			'width'         : imageSize [0] + margin * 2,
+			'xmlns'         : 'http://www.w3.org/2000/svg',
+			'xmlns:ev'      : 'http://www.w3.org/2001/xml-events',
+			'xmlns:xlink'   : 'http://www.w3.org/1999/xlink'
+		})
+
+		with profile.Phase ('traversal'):
+			# Shared elements are emitted up-front so the remaining traversal
+			# never has to go back
+			shared = _CollectShared (image,
+				_StyleCollector (self) if self._styleClasses else None)
+
+			if self._styleRules:
+				writer.TextElement ('style', {'type' : 'text/css'},
+					''.join (['.{}{{{}}}'.format (name, declarations)
+						for declarations, name in self._styleRules.items ()]))
+
+			if shared:
+				writer.StartElement ('defs', {})
+				for sharedElement in shared:
+					self.VisitGeneric (sharedElement, writer)
+				writer.EndElement ('defs')
+			else:
+				writer.EmptyElement ('defs', {})
+
+			self._VisitCompoundElement (image, writer, {
+				'transform' : 'translate({},{})'.format (
+					self._formatNumber (margin), self._formatNumber (margin))
+			})
+
+		writer.EndElement ('svg')
+		writer.Flush ()
+
+	def _SvgPoints (self, points):
+		c = [self._formatNumber (v) for v in points.GetCoordinates ()]
+		return ' '.join ([x + ',' + y for x, y in zip (c [0::2], c [1::2])])
 
 	def _SvgStroke (self, stroke):
 		if stroke is None:
 			return {'stroke' : 'none'}
 		else:
 			result = {'stroke'          : self._SvgColor (stroke.GetColor ()),
-					'stroke_width'      : stroke.GetWidth (),
-					'stroke_linejoin'   : self._SvgLineJoin (stroke.GetLineJoin ()),
-					'stroke_linecap'    : self._SvgLineCap (stroke.GetLineCap ())
+					'stroke-width'      : stroke.GetWidth (),
+					'stroke-linejoin'   : self._SvgLineJoin (stroke.GetLineJoin ()),
+					'stroke-linecap'    : self._SvgLineCap (stroke.GetLineCap ())
 					}
 
 			if stroke.GetDashPattern () is not None:
-				result ['stroke-dasharray'] = ','.join (map (str, stroke.GetDashPattern ()))
+				result ['stroke-dasharray'] = ','.join (map (self._formatNumber,
+					stroke.GetDashPattern ()))
 
 			if stroke.GetOpacity () != 1:
-				result ['stroke_opacity'] = stroke.GetOpacity ()
+				result ['stroke-opacity'] = stroke.GetOpacity ()
 
 			return result
 
@@ -152,12 +538,13 @@ class SvgVisitor (Visitor):
 			}
 
 			if fill.GetOpacity () != 1:
-				result ['fill_opacity'] = fill.GetOpacity ()
+				result ['fill-opacity'] = fill.GetOpacity ()
 
 			return result
 
 	def _SvgColor (self, color):
-		return svgwrite.rgb (color.R (), color.G (), color.B ())
+		return 'rgb({:d},{:d},{:d})'.format (
+			int (color.R ()), int (color.G ()), int (color.B ()))
 
 	def _SvgLineJoin (self, lineJoin):
 		m = {
@@ -0,0 +1,183 @@
+'''Command line interface for exporting many drawings at once.
+
+Each input is a scene script, a scene file or a pickled Drawing. A scene
+script must define a function CreateDrawing, which returns the drawing, or a
+global variable drawing. Scripts are run with __name__ set to '__luna__', so code
+guarded by if __name__ == '__main__' is not executed. Scene files (.luna) are
+written by Drawing.SaveScene.
+
+    luna -f svg,png -o figures scenes/*.py
+
+Inputs are processed by a pool of worker processes, which are reused for all
+inputs, so imports and caches are only paid for once per worker. The time of
+each step is reported per input. Failures are reported as well, but do not
+stop the run; the exit code is 1 if any input failed.'''
+
+import argparse
+import concurrent.futures
+import os
+import pickle
+import runpy
+import sys
+import time
+import traceback
+
+FORMATS = ('svg', 'svgz', 'png', 'pdf')
+
+def LoadDrawing (filename):
+    '''Load a drawing from a scene script, a scene file or a pickled Drawing.'''
+    from . import Drawing
+
+    if filename.endswith ('.py'):
+        # Like for scripts run directly, modules next to the script can be
+        # imported
+        directory = os.path.dirname (os.path.abspath (filename))
+        sys.path.insert (0, directory)
+        try:
+            namespace = runpy.run_path (filename, run_name='__luna__')
+        finally:
+            sys.path.remove (directory)
+
+        if 'CreateDrawing' in namespace:
+            drawing = namespace ['CreateDrawing'] ()
+        elif 'drawing' in namespace:
+            drawing = namespace ['drawing']
+        else:
+            raise ValueError ('{} defines neither CreateDrawing nor drawing'.format (
+                filename))
+    elif filename.endswith ('.luna'):
+        from . import scene
+        drawing = scene.Load (filename)
+    else:
+        with open (filename, 'rb') as f:
+            drawing = pickle.load (f)
+
+    if not isinstance (drawing, Drawing):
+        raise ValueError ('{} does not provide a Drawing'.format (filename))
+    return drawing
+
+def _Save (drawing, filename, format, scale, lod):
+    if format in ('svg', 'svgz'):
+        drawing.SaveSvg (filename)
+    elif format == 'png':
+        drawing.SavePng (filename, scale=scale, lod=lod)
+    elif format == 'pdf':
+        drawing.SavePdf (filename)
+
+def _Export (filename, outputs, scale, lod):
+    '''Load the drawing from filename and save it to each (format, filename)
+    pair of outputs.
+
+    Returns the time of each step, and the error message of each step which
+    failed. If loading fails, nothing is saved.'''
+    times = {}
+    errors = {}
+
+    def Run (step, function, *args):
+        start = time.perf_counter ()
+        try:
+            return function (*args)
+        except (Exception, SystemExit):
+            # Scene scripts may call sys.exit, which must not end the run
+            errors [step] = traceback.format_exc ()
+        finally:
+            times [step] = time.perf_counter () - start
+
+    drawing = Run ('load', LoadDrawing, filename)
+    if 'load' not in errors:
+        for format, output in outputs:
+            Run (format, _Save, drawing, output, format, scale, lod)
+
+    return times, errors
+
+def _InitWorker ():
+    # Import the backends up-front, so this is not timed as part of the
+    # first export
+    from .backends import svg
+    try:
+        from .backends import cairo
+    except (ImportError, OSError):
+        pass
+
+def _GetOutputs (filename, formats, directory):
+    stem = os.path.splitext (os.path.basename (filename)) [0]
+    if directory is None:
+        directory = os.path.dirname (filename)
+    return [(format, os.path.join (directory, stem + '.' + format))
+        for format in formats]
+
+def _FormatResult (filename, times, errors, verbose):
+    steps = ', '.join (['{} {:.1f} ms'.format (step, seconds * 1000)
+        for step, seconds in times.items () if step not in errors])
+    if not errors:
+        return '{:<40}{}'.format (filename, steps)
+
+    lines = ['{:<40}FAILED {}{}'.format (filename, ', '.join (errors),
+        ' (' + steps + ')' if steps else '')]
+    for step, error in errors.items ():
+        if verbose:
+            lines.append (error.rstrip ())
+        else:
+            lines.append ('    {}: {}'.format (step, error.rstrip ().splitlines () [-1]))
+    return '\n'.join (lines)
+
+def Main (args=None):
+    parser = argparse.ArgumentParser (prog='luna',
+        description='Export drawings from scene scripts, scene files or pickled '
+        'drawings.')
+    parser.add_argument ('inputs', nargs='+', metavar='INPUT',
+        help='Scene script (.py), scene file (.luna) or pickled Drawing')
+    parser.add_argument ('-f', '--format', default='svg',
+        help='Comma-separated output formats, out of {}'.format (', '.join (FORMATS)))
+    parser.add_argument ('-o', '--output-directory',
+        help='Directory for the output files, by default next to the input')
+    parser.add_argument ('-j', '--jobs', type=int, default=os.cpu_count (),
+        help='Number of worker processes; with 1, all inputs are processed '
+        'in this process')
+    parser.add_argument ('--scale', type=float, default=1,
+        help='Pixels per unit for PNG output')
+    parser.add_argument ('--lod', action='store_true',
+        help='Simplify drawings for the resolution of PNG output')
+    parser.add_argument ('-v', '--verbose', action='store_true',
+        help='Print the full traceback of failures')
+    args = parser.parse_args (args)
+
+    formats = [f.strip ().lower () for f in args.format.split (',') if f.strip ()]
+    for format in formats:
+        if format not in FORMATS:
+            parser.error ('unknown format: {}'.format (format))
+
+    if args.output_directory is not None:
+        os.makedirs (args.output_directory, exist_ok=True)
+
+    jobs = [(filename, _GetOutputs (filename, formats, args.output_directory),
+        args.scale, args.lod) for filename in args.inputs]
+
+    start = time.perf_counter ()
+    failed = 0
+
+    def Report (filename, times, errors):
+        nonlocal failed
+        if errors:
+            failed += 1
+        print (_FormatResult (filename, times, errors, args.verbose), flush=True)
+
+    if args.jobs is None or args.jobs <= 1 or len (jobs) == 1:
+        _InitWorker ()
+        for job in jobs:
+            Report (job [0], *_Export (*job))
+    else:
+        with concurrent.futures.ProcessPoolExecutor (max_workers=args.jobs,
+            initializer=_InitWorker) as pool:
+            futures = {pool.submit (_Export, *job) : job [0] for job in jobs}
+            for future in concurrent.futures.as_completed (futures):
+                try:
+                    times, errors = future.result ()
+                except Exception:
+                    # For instance, if the worker process died
+                    times, errors = {}, {'worker' : traceback.format_exc ()}
+                Report (futures [future], times, errors)
+
+    print ('{} inputs, {} failed, {:.2f} s'.format (len (jobs), failed,
+        time.perf_counter () - start), flush=True)
+    return 1 if failed else 0
@@ -1,24 +1,43 @@
+from array import array
+from itertools import chain
 from numbers import Number
-import copy
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 class Vector2:
+    '''A 2D vector.
+
+    The constructor accepts either two numbers or a single sequence of length
+    two. Arguments are only validated here; arithmetic operations assume valid
+    vectors and do not check their operands.'''
+    __slots__ = ('x', 'y')
+
     def __init__ (self, *args):
         if len (args) == 1:
-            assert (hasattr (args [0], '__len__') and len (args[0]) == 2)
-            self.x = args [0][0]
-            self.y = args [0][1]
+            p = args [0]
+            if not hasattr (p, '__len__') or len (p) != 2:
+                raise ValueError ('Expected a sequence of length 2')
+            x = p [0]
+            y = p [1]
+        elif len (args) == 2:
+            x, y = args
         else:
-            assert (len (args) == 2)
-            assert (isinstance (args [0], Number))
-            assert (isinstance (args [1], Number))
-            self.x = args [0]
-            self.y = args [1]
+            raise TypeError ('Vector2 takes either one or two arguments')
+
+        if not isinstance (x, Number) or not isinstance (y, Number):
+            raise TypeError ('Vector2 components must be numbers')
+
+        self.x = x
+        self.y = y
 
     def __repr__ (self):
         return 'Vector2 ({}, {})'.format (self.x, self.y)
 
     def __eq__ (self, other):
-        if isinstance (other, Vector2):
+        if type (other) is Vector2:
             return self.x == other.x and self.y == other.y
         else:
             return self.x == other [0] and self.y == other [1]
@@ -34,116 +53,377 @@ class Vector2:
             return self.x
         elif key == 1:
             return self.y
+        raise IndexError ('Vector2 index out of range')
 
     def __setitem__ (self, key, value):
         if key == 0:
             self.x = value
         elif key == 1:
             self.y = value
+        else:
+            raise IndexError ('Vector2 index out of range')
 
     def __iter__ (self):
-        return iter([self.x, self.y])
+        return iter ((self.x, self.y))
+
+    def Copy (self):
+        return _MakeVector2 (self.x, self.y)
 
     def __add__ (self, other):
-        if isinstance (other, Vector2):
-            return Vector2 (self.x + other.x, self.y + other.y)
+        if type (other) is Vector2:
+            return _MakeVector2 (self.x + other.x, self.y + other.y)
         else:
-            assert (hasattr (other, '__len__') and len (other) == 2)
-            return (self.x + other [0], self.y + other [1])
+            return _MakeVector2 (self.x + other [0], self.y + other [1])
 
     def __sub__ (self, other):
-        if isinstance (other, Vector2):
-            return Vector2 (self.x - other.x, self.y - other.y)
+        if type (other) is Vector2:
+            return _MakeVector2 (self.x - other.x, self.y - other.y)
         else:
-            assert (hasattr (other, '__len__') and len (other) == 2)
-            return (self.x - other [0], self.y - other [1])
+            return _MakeVector2 (self.x - other [0], self.y - other [1])
+
+    def __iadd__ (self, other):
+        self.x += other [0]
+        self.y += other [1]
+        return self
+
+    def __isub__ (self, other):
+        self.x -= other [0]
+        self.y -= other [1]
+        return self
 
     def __imul__ (self, other):
-        assert (isinstance (other, Number))
         self.x *= other
         self.y *= other
         return self
 
     def __mul__ (self, other):
-        c = Vector2 (self.x, self.y)
-        c *= other
-        return c
+        return _MakeVector2 (self.x * other, self.y * other)
+
+    __rmul__ = __mul__
 
     def __itruediv__ (self, other):
-        assert (isinstance (other, Number))
         self.x /= other
         self.y /= other
         return self
 
     def __truediv__ (self, other):
-        c = Vector2 (self.x, self.y)
-        c /= other
-        return c
+        return _MakeVector2 (self.x / other, self.y / other)
+
+def _MakeVector2 (x, y, _new=object.__new__):
+    '''Create a Vector2 without validating the components.'''
+    v = _new (Vector2)
+    v.x = x
+    v.y = y
+    return v
+
+_inf = float ('inf')
 
 class BoundingBox:
+    '''An axis-aligned bounding box.
+
+    A default-constructed bounding box is empty; merging anything into it
+    yields the bounds of the merged object. The box is stored as four floats,
+    and the Merge*, Expand and Translate methods update it in place.'''
+    __slots__ = ('_minX', '_minY', '_maxX', '_maxY')
+
     def __init__ (self, minCorner = None, maxCorner = None):
         if minCorner is not None:
-            self._min = Vector2 (minCorner)
+            self._minX, self._minY = Vector2 (minCorner)
         else:
-            self._min = Vector2 (float ('inf'), float ('inf'))
+            self._minX = self._minY = _inf
 
         if maxCorner is not None:
-            self._max = Vector2 (maxCorner)
+            self._maxX, self._maxY = Vector2 (maxCorner)
         else:
-            self._max = Vector2 (-float ('inf'), -float ('inf'))
+            self._maxX = self._maxY = -_inf
+
+    @staticmethod
+    def FromExtents (minX, minY, maxX, maxY, _new=object.__new__):
+        '''Create a bounding box from its extents without validation.'''
+        result = _new (BoundingBox)
+        result._minX = minX
+        result._minY = minY
+        result._maxX = maxX
+        result._maxY = maxY
+        return result
 
     @staticmethod
     def FromPoints (points):
+        if isinstance (points, PointArray):
+            return points.GetBounds ()
+
         result = BoundingBox ()
         result.MergePoints (points)
         return result
 
+    def Copy (self):
+        return BoundingBox.FromExtents (self._minX, self._minY,
+            self._maxX, self._maxY)
+
+    def GetExtents (self):
+        '''Get the extents as a tuple (minX, minY, maxX, maxY).'''
+        return (self._minX, self._minY, self._maxX, self._maxY)
+
+    def IsEmpty (self):
+        return self._minX > self._maxX or self._minY > self._maxY
+
     def Merge (self, other):
-        if isinstance (other, BoundingBox):
-            return self.MergePoints (other)
-        elif isinstance (other, Vector2) or isinstance (other, tuple):
+        if type (other) is BoundingBox:
+            return self.MergeBox (other)
+        else:
             return self.MergePoint (other)
 
+    def MergeBox (self, other):
+        if other._minX < self._minX:
+            self._minX = other._minX
+        if other._minY < self._minY:
+            self._minY = other._minY
+        if other._maxX > self._maxX:
+            self._maxX = other._maxX
+        if other._maxY > self._maxY:
+            self._maxY = other._maxY
+        return self
+
+    def MergeTranslated (self, other, dx, dy):
+        '''Merge other translated by (dx, dy) without creating a new box.'''
+        if other._minX + dx < self._minX:
+            self._minX = other._minX + dx
+        if other._minY + dy < self._minY:
+            self._minY = other._minY + dy
+        if other._maxX + dx > self._maxX:
+            self._maxX = other._maxX + dx
+        if other._maxY + dy > self._maxY:
+            self._maxY = other._maxY + dy
+        return self
+
     def MergePoint (self, point):
-        self._min.x = min (point [0], self._min.x)
-        self._min.y = min (point [1], self._min.y)
-        self._max.x = max (point [0], self._max.x)
-        self._max.y = max (point [1], self._max.y)
+        x = point [0]
+        y = point [1]
+        if x < self._minX:
+            self._minX = x
+        if y < self._minY:
+            self._minY = y
+        if x > self._maxX:
+            self._maxX = x
+        if y > self._maxY:
+            self._maxY = y
         return self
 
     def MergePoints (self, points):
+        if isinstance (points, PointArray):
+            return self.MergeBox (points.GetBounds ())
+
         for p in points:
             self.MergePoint (p)
         return self
 
     def Expand (self, amount):
-        v = Vector2 (amount, amount)
-        self._min -= v
-        self._max += v
+        self._minX -= amount
+        self._minY -= amount
+        self._maxX += amount
+        self._maxY += amount
+        return self
+
+    def Translate (self, dx, dy):
+        self._minX += dx
+        self._minY += dy
+        self._maxX += dx
+        self._maxY += dy
+        return self
 
     def __len__ (self):
         return 2
 
     def __getitem__ (self, key):
         if key == 0:
-            return self._min
+            return self.GetMinimum ()
         elif key == 1:
-            return self._max
+            return self.GetMaximum ()
+        raise IndexError ('BoundingBox index out of range')
 
     def __iter__ (self):
-        return iter([self._min, self._max])
+        return iter ((self.GetMinimum (), self.GetMaximum ()))
+
+    def __repr__ (self):
+        return 'BoundingBox (({}, {}), ({}, {}))'.format (*self.GetExtents ())
 
     def GetMinimum (self):
-        return self._min
+        return _MakeVector2 (self._minX, self._minY)
 
     def GetMaximum (self):
-        return self._max
+        return _MakeVector2 (self._maxX, self._maxY)
 
     def GetWidth (self):
-        return self._max.x - self._min.x
+        return self._maxX - self._minX
 
     def GetHeight (self):
-        return self._max.y - self._min.y
+        return self._maxY - self._minY
 
     def GetSize (self):
-        return Vector2 (self.GetWidth (), self.GetHeight ())
+        return _MakeVector2 (self._maxX - self._minX, self._maxY - self._minY)
+
+# Sequences with at least this many points are stored in a NumPy array if NumPy
+# is available. Below that, the overhead of creating a NumPy array dominates.
+_NUMPY_THRESHOLD = 64
+
+class PointArray:
+    '''A compact, contiguous array of 2D points.
+
+    Points are stored either in a flat array ('d') of interleaved x, y
+    coordinates, or in a NumPy array of shape (N, 2). Flat arrays and NumPy
+    arrays are used directly without converting each point; NumPy arrays of
+    shape (N, 2k) are viewed as (Nk, 2). Other sequences of points are packed
+    into a NumPy array if NumPy is available and the sequence is large, and
+    into a flat array ('d') otherwise.
+
+    If a buffer is modified after it has been passed in, InvalidateBounds must
+    be called on the element using it.'''
+    __slots__ = ('_data', '_shared', '_external')
+
+    def __init__ (self, points):
+        # Set if the buffer is shared copy-on-write, see _Share
+        self._shared = False
+        # Set if the buffer was passed in and is still owned by the caller
+        self._external = False
+
+        if isinstance (points, PointArray):
+            self._data = points._data
+            self._shared = points._shared
+            self._external = points._external
+        elif isinstance (points, array):
+            if points.typecode != 'd':
+                points = array ('d', points)
+            else:
+                self._external = True
+            if len (points) % 2 != 0:
+                raise ValueError ('A flat point array must have an even length')
+            self._data = points
+        elif numpy is not None and isinstance (points, numpy.ndarray):
+            converted = numpy.asarray (points, dtype=float)
+            self._external = converted is points
+            points = converted
+            if (points.ndim == 1 and len (points) % 2 == 0) or \
+                (points.ndim == 2 and points.shape [1] % 2 == 0 and points.shape [1] != 2):
+                points = points.reshape (-1, 2)
+            if points.ndim != 2 or points.shape [1] != 2:
+                raise ValueError ('A point array must have the shape (N, 2)')
+            self._data = points
+        else:
+            if not hasattr (points, '__len__'):
+                points = list (points)
+
+            if numpy is not None and len (points) >= _NUMPY_THRESHOLD:
+                self._data = numpy.array (points, dtype=float).reshape (-1, 2)
+            else:
+                self._data = array ('d', chain.from_iterable (points))
+                if len (self._data) != 2 * len (points):
+                    raise ValueError ('Each point must have two coordinates')
+
+    def _IsFlat (self):
+        return isinstance (self._data, array)
+
+    def GetData (self):
+        '''Get the underlying buffer.
+
+        This is either a flat array ('d') or a NumPy array of shape (N, 2). If
+        the buffer is shared with a copy of the element, see Element.Copy, it
+        is copied first, so it can be modified without affecting the copy.'''
+        if self._shared:
+            self._data = self._CopyBuffer ()
+            self._shared = False
+        return self._data
+
+    def _CopyBuffer (self):
+        return self._data [:] if self._IsFlat () else self._data.copy ()
+
+    def _GetBuffer (self):
+        '''Get the underlying buffer for reading, without copying it.'''
+        return self._data
+
+    def _Share (self):
+        '''Get a new PointArray sharing the buffer with this one.
+
+        The buffer is copied as soon as either of them is asked for it with
+        GetData. A buffer which is still owned by the caller may be modified
+        in place at any time, so it is copied right away instead.'''
+        result = PointArray.__new__ (PointArray)
+        result._external = False
+        if self._external:
+            result._data = self._CopyBuffer ()
+            result._shared = False
+            return result
+        result._data = self._data
+        result._shared = True
+        self._shared = True
+        return result
+
+    def GetCoordinates (self):
+        '''Get all coordinates as a flat list [x0, y0, x1, y1, ...].'''
+        if self._IsFlat ():
+            return self._data.tolist ()
+        else:
+            return self._data.ravel ().tolist ()
+
+    def GetBounds (self):
+        if len (self) == 0:
+            return BoundingBox ()
+
+        data = self._data
+        if self._IsFlat ():
+            xs = data [0::2]
+            ys = data [1::2]
+            return BoundingBox.FromExtents (min (xs), min (ys), max (xs), max (ys))
+        else:
+            lo = data.min (axis=0)
+            hi = data.max (axis=0)
+            return BoundingBox.FromExtents (float (lo [0]), float (lo [1]),
+                float (hi [0]), float (hi [1]))
+
+    def __len__ (self):
+        if self._IsFlat ():
+            return len (self._data) // 2
+        else:
+            return len (self._data)
+
+    def __getitem__ (self, key):
+        if isinstance (key, slice):
+            if not self._IsFlat ():
+                return PointArray (self._data [key])
+
+            start, stop, step = key.indices (len (self))
+            if step == 1:
+                return PointArray (self._data [2 * start:2 * max (start, stop)])
+            return PointArray ([self [i] for i in range (start, stop, step)])
+
+        if key < 0:
+            key += len (self)
+        if key < 0 or key >= len (self):
+            raise IndexError ('point index out of range')
+
+        if self._IsFlat ():
+            return _MakeVector2 (self._data [2 * key], self._data [2 * key + 1])
+        else:
+            return _MakeVector2 (float (self._data [key, 0]), float (self._data [key, 1]))
+
+    def __iter__ (self):
+        c = iter (self.GetCoordinates ())
+        for x, y in zip (c, c):
+            yield _MakeVector2 (x, y)
+
+    def __repr__ (self):
+        return 'PointArray ({})'.format (
+            [(p.x, p.y) for p in self])
+
+def PackValues (values):
+    '''Pack a sequence of numbers into a compact buffer.
+
+    Like PointArray, this uses a NumPy array for large inputs if NumPy is
+    available, and an array ('d') otherwise. Buffers are used as-is.'''
+    if isinstance (values, array):
+        return values
+    if numpy is not None:
+        if isinstance (values, numpy.ndarray):
+            return numpy.asarray (values, dtype=float).ravel ()
+        if hasattr (values, '__len__') and len (values) >= _NUMPY_THRESHOLD:
+            return numpy.array (values, dtype=float)
+    return array ('d', values)
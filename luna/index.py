@@ -0,0 +1,176 @@
+'''Spatial index over the leaf elements of a drawing.
+
+The index is a static R-tree, bulk-loaded using the sort-tile-recursive
+algorithm. Transforms are resolved while building the index, so a leaf which
+is placed by several Instances gets one entry per placement.'''
+
+import math
+
+from . import geo, Group, Instance, Array
+
+class IndexEntry:
+    '''A leaf element placed in the drawing.'''
+    __slots__ = ('_element', '_offset', '_extents', '_order')
+
+    def __init__ (self, element, offset, extents, order):
+        self._element = element
+        self._offset = offset
+        self._extents = extents
+        self._order = order
+
+    def GetElement (self):
+        return self._element
+
+    def GetOffset (self):
+        '''Get the translation of the element within the drawing.'''
+        return geo.Vector2 (self._offset)
+
+    def GetBounds (self):
+        '''Get the bounds of the element within the drawing.'''
+        return geo.BoundingBox.FromExtents (*self._extents)
+
+    def GetOrder (self):
+        '''Get the position of this entry in drawing order.'''
+        return self._order
+
+    def __repr__ (self):
+        return 'IndexEntry ({}, {})'.format (self._element.GetId (), self._offset)
+
+def _CollectEntries (drawing):
+    entries = []
+    pending = [(drawing, 0, 0)]
+
+    while pending:
+        element, dx, dy = pending.pop ()
+
+        if isinstance (element, Instance):
+            p = element.GetPosition ()
+            pending.append ((element.GetSource (), dx + p.x, dy + p.y))
+            continue
+
+        if isinstance (element, Array):
+            source = element.GetElement ()
+            pending.extend ([(source, dx + x, dy + y)
+                for x, y in reversed (list (element.GetPositions ()))])
+            continue
+
+        if isinstance (element, Group):
+            t = element.GetTranslation ()
+            dx += t.x
+            dy += t.y
+
+        children = element.GetChildren ()
+        if len (children) > 0 or isinstance (element, Group):
+            pending.extend ([(child, dx, dy) for child in reversed (children)])
+            continue
+
+        bounds = element.GetBounds ()
+        if bounds.IsEmpty ():
+            continue
+
+        minX, minY, maxX, maxY = bounds.GetExtents ()
+        entries.append (IndexEntry (element, (dx, dy),
+            (minX + dx, minY + dy, maxX + dx, maxY + dy), len (entries)))
+
+    return entries
+
+class _Node:
+    __slots__ = ('extents', 'children', 'isLeaf')
+
+    def __init__ (self, children, isLeaf):
+        self.children = children
+        self.isLeaf = isLeaf
+
+        if isLeaf:
+            extents = [c._extents for c in children]
+        else:
+            extents = [c.extents for c in children]
+
+        self.extents = (min ([e [0] for e in extents]),
+            min ([e [1] for e in extents]),
+            max ([e [2] for e in extents]),
+            max ([e [3] for e in extents]))
+
+def _GetExtents (item):
+    if isinstance (item, _Node):
+        return item.extents
+    return item._extents
+
+def _Pack (items, capacity, isLeaf):
+    '''Pack one level of the tree using sort-tile-recursive.'''
+    nodeCount = math.ceil (len (items) / capacity)
+    sliceCount = math.ceil (math.sqrt (nodeCount))
+    sliceSize = sliceCount * capacity
+
+    def CenterX (item):
+        e = _GetExtents (item)
+        return e [0] + e [2]
+
+    def CenterY (item):
+        e = _GetExtents (item)
+        return e [1] + e [3]
+
+    items = sorted (items, key=CenterX)
+    nodes = []
+    for i in range (0, len (items), sliceSize):
+        s = sorted (items [i:i + sliceSize], key=CenterY)
+        for j in range (0, len (s), capacity):
+            nodes.append (_Node (s [j:j + capacity], isLeaf))
+
+    return nodes
+
+class SpatialIndex:
+    '''A spatial index over the leaf elements of a drawing.
+
+    The index is a snapshot; it has to be rebuilt after the drawing has been
+    modified. Use Drawing.BuildIndex to create one.'''
+    def __init__ (self, drawing, nodeCapacity=16):
+        self._entries = _CollectEntries (drawing)
+        self._root = None
+
+        if not self._entries:
+            return
+
+        nodes = _Pack (self._entries, nodeCapacity, True)
+        while len (nodes) > 1:
+            nodes = _Pack (nodes, nodeCapacity, False)
+        self._root = nodes [0]
+
+    def GetEntries (self):
+        '''Get all entries in drawing order.'''
+        return self._entries
+
+    def __len__ (self):
+        return len (self._entries)
+
+    def _Query (self, minX, minY, maxX, maxY):
+        if self._root is None:
+            return []
+
+        result = []
+        pending = [self._root]
+        while pending:
+            node = pending.pop ()
+            if node.isLeaf:
+                for entry in node.children:
+                    e = entry._extents
+                    if e [0] <= maxX and e [2] >= minX and e [1] <= maxY and e [3] >= minY:
+                        result.append (entry)
+            else:
+                for child in node.children:
+                    e = child.extents
+                    if e [0] <= maxX and e [2] >= minX and e [1] <= maxY and e [3] >= minY:
+                        pending.append (child)
+
+        result.sort (key=IndexEntry.GetOrder)
+        return result
+
+    def Query (self, bounds):
+        '''Get all entries whose bounds intersect bounds, in drawing order.'''
+        return self._Query (*bounds.GetExtents ())
+
+    def ElementsAt (self, point):
+        '''Get all entries whose bounds contain point, in drawing order.
+
+        The last entry is the top-most one.'''
+        return self._Query (point [0], point [1], point [0], point [1])
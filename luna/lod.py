@@ -0,0 +1,401 @@
+'''Level-of-detail simplification for rendering at a known resolution.
+
+Simplify creates a copy of a drawing which looks the same when rendered at a
+given scale, but is cheaper to render: polylines are simplified using the
+Ramer-Douglas-Peucker algorithm, elements which are too small to be visible are
+dropped, and shapes which cover only a pixel or so are replaced by points.
+
+The result is a snapshot which shares all unchanged elements with the original
+drawing. It is meant to be rendered and thrown away; changes to the original
+drawing are not reflected in it.'''
+
+from array import array
+import math
+from numbers import Number
+
+from . import geo, Visitor, Path, Polygon, Instance, Group, Array, Drawing, \
+    PointCloud, Fill
+
+def _FarthestPoint (xs, ys, first, last):
+    '''Find the point between first and last which is farthest from the
+    segment from first to last.
+
+    Returns the index and the squared distance.'''
+    x0 = xs [first]
+    y0 = ys [first]
+    dx = xs [last] - x0
+    dy = ys [last] - y0
+    length = dx * dx + dy * dy
+
+    index = first
+    maxDistance = -1
+    for i in range (first + 1, last):
+        px = xs [i] - x0
+        py = ys [i] - y0
+
+        if length > 0:
+            t = min (max ((px * dx + py * dy) / length, 0), 1)
+            px -= t * dx
+            py -= t * dy
+
+        distance = px * px + py * py
+        if distance > maxDistance:
+            maxDistance = distance
+            index = i
+
+    return index, maxDistance
+
+def _FarthestPointNumpy (xs, ys, first, last):
+    np = geo.numpy
+    x0 = xs [first]
+    y0 = ys [first]
+    dx = xs [last] - x0
+    dy = ys [last] - y0
+    length = dx * dx + dy * dy
+
+    px = xs [first + 1:last] - x0
+    py = ys [first + 1:last] - y0
+
+    if length > 0:
+        t = (px * dx + py * dy) / length
+        np.minimum (np.maximum (t, 0, out=t), 1, out=t)
+        px -= t * dx
+        py -= t * dy
+
+    distance = px * px + py * py
+    i = int (distance.argmax ())
+    return first + 1 + i, float (distance [i])
+
+# Minimum length of a span for which the farthest point is searched using
+# NumPy. For shorter spans, the call overhead dominates.
+_NUMPY_SPAN = 32
+
+def _Simplify (xs, ys, tolerance, xsNumpy=None, ysNumpy=None):
+    count = len (xs)
+    keep = [0]
+    pending = [(0, count - 1)]
+    while pending:
+        first, last = pending.pop ()
+
+        if last - first > 1:
+            if xsNumpy is not None and last - first > _NUMPY_SPAN:
+                index, distance = _FarthestPointNumpy (xsNumpy, ysNumpy, first, last)
+            else:
+                index, distance = _FarthestPoint (xs, ys, first, last)
+
+            if distance > tolerance:
+                # Process the first half next, so points are kept in order
+                pending.append ((index, last))
+                pending.append ((first, index))
+                continue
+
+        keep.append (last)
+
+    return keep
+
+def _SnapFilterNumpy (xs, ys, cellSize):
+    '''Get the indices of the points which do not fall into the same grid cell
+    as their predecessor. The first and last point are always kept.'''
+    np = geo.numpy
+    cx = np.floor (xs / cellSize)
+    cy = np.floor (ys / cellSize)
+
+    keep = np.empty (len (xs), dtype=bool)
+    keep [0] = True
+    keep [1:] = (cx [1:] != cx [:-1]) | (cy [1:] != cy [:-1])
+    keep [-1] = True
+    return np.flatnonzero (keep)
+
+def SimplifyPolyline (points, tolerance):
+    '''Simplify a polyline using the Ramer-Douglas-Peucker algorithm.
+
+    points is a geo.PointArray. No point of the original polyline is farther
+    than tolerance from the simplified one. Returns the indices of the points
+    to keep, in order.'''
+    count = len (points)
+    if count <= 2:
+        return list (range (count))
+
+    data = points._GetBuffer ()
+    if points._IsFlat ():
+        return _Simplify (data [0::2], data [1::2], tolerance * tolerance)
+
+    # Dense runs of points are thinned out first, which is cheap to do for
+    # all points at once. This and the subdivision each use up half of the
+    # tolerance.
+    tolerance *= 0.5
+    indices = _SnapFilterNumpy (data [:, 0], data [:, 1], tolerance / 2 ** 0.5)
+    xs = data [indices, 0]
+    ys = data [indices, 1]
+    keep = _Simplify (xs.tolist (), ys.tolist (), tolerance * tolerance, xs, ys)
+    return indices [keep].tolist ()
+
+class _Point:
+    '''A shape which is collapsed to a single point.'''
+    __slots__ = ('x', 'y', 'size', 'fill')
+
+    def __init__ (self, x, y, size, fill):
+        self.x = x
+        self.y = y
+        self.size = size
+        self.fill = fill
+
+def _SetChildren (element, children):
+    # The snapshot is never modified, so the children are not registered with
+    # it. Otherwise, every snapshot would be kept alive by the original
+    # elements it shares.
+    element._children = children
+    return element
+
+class _Simplifier (Visitor):
+    '''Visits a drawing and returns the simplified version of each element.
+
+    The visit methods return the element itself if it is unchanged, a new
+    element, a _Point, or None if the element is dropped.'''
+    _profiled = False
+
+    def __init__ (self, scale, tolerance, dropSize, pointSize):
+        super (_Simplifier, self).__init__ ()
+        self._scale = scale
+        self._tolerance = tolerance / scale
+        self._dropSize = dropSize / scale
+        self._pointSize = pointSize / scale
+        self._sources = {}
+
+    def _GetSize (self, element):
+        bounds = element._GetBounds ()
+        if bounds.IsEmpty ():
+            return None
+        minX, minY, maxX, maxY = bounds.GetExtents ()
+        return max (maxX - minX, maxY - minY)
+
+    def _Collapse (self, element, stroke, fill):
+        '''Replace element by a point if it is tiny, or drop it if it is too
+        small to be visible.
+
+        Returns the element if it must be kept as is.'''
+        scale = element.GetScale ()
+        if scale [0] != 1 or scale [1] != 1:
+            return element
+
+        bounds = element._GetBounds ()
+        if bounds.IsEmpty ():
+            return None
+
+        minX, minY, maxX, maxY = bounds.GetExtents ()
+        size = max (maxX - minX, maxY - minY)
+        if size >= self._pointSize:
+            return element
+
+        fill = self._GetPointFill (stroke, fill)
+        if size < self._dropSize or fill is None:
+            return None
+
+        return _Point ((minX + maxX) / 2, (minY + maxY) / 2,
+            self._QuantizeSize (size), fill)
+
+    def _QuantizeSize (self, size):
+        '''Round size up to a quarter of a pixel, so that points of similar
+        size can be merged.'''
+        # The tolerance absorbs rounding errors in the bounds
+        return math.ceil (size * self._scale * 4 - 1e-6) / (self._scale * 4)
+
+    def _GetPointFill (self, stroke, fill):
+        '''Get the fill of a point replacing a shape with stroke and fill.'''
+        # The stroke covers most of a tiny shape, and it is drawn on top
+        if stroke is None:
+            return fill
+
+        # Fills are interned, so equal strokes result in the same fill
+        return Fill (stroke.GetColor (), stroke.GetOpacity ())
+
+    def _Simplified (self, element):
+        result = self.VisitGeneric (element)
+        if isinstance (result, _Point):
+            return PointCloud ([(result.x, result.y)], result.size, result.fill)
+        return result
+
+    def _GetSource (self, source):
+        if source in self._sources:
+            return self._sources [source]
+
+        result = self._Simplified (source)
+        self._sources [source] = result
+        return result
+
+    def _SimplifyChildren (self, children):
+        '''Simplify a list of elements.
+
+        Returns None if no element changes. Points from consecutive elements
+        are merged into one PointCloud per size and fill. This changes the
+        order in which the points are drawn, which is not visible at their
+        size.'''
+        result = []
+        changed = False
+        points = {}
+
+        def FlushPoints ():
+            for (size, fill), coordinates in points.items ():
+                result.append (PointCloud (coordinates, size, fill))
+            points.clear ()
+
+        for child in children:
+            simplified = self.VisitGeneric (child)
+            if simplified is not child:
+                changed = True
+
+            if isinstance (simplified, _Point):
+                key = (simplified.size, simplified.fill)
+                coordinates = points.get (key)
+                if coordinates is None:
+                    coordinates = points [key] = array ('d')
+                coordinates.append (simplified.x)
+                coordinates.append (simplified.y)
+                continue
+
+            FlushPoints ()
+            if simplified is not None:
+                result.append (simplified)
+
+        FlushPoints ()
+        return result if changed else None
+
+    def VisitElement (self, element, ctx=None):
+        # Elements without a dedicated handler are kept unchanged
+        return element
+
+    def VisitText (self, text, ctx=None):
+        # The bounds of text are only an estimate, so text is always kept
+        return text
+
+    def VisitImage (self, image, ctx=None):
+        size = self._GetSize (image)
+        if size is None or size < self._dropSize:
+            return None
+        return image
+
+    def VisitGroup (self, group, ctx=None):
+        size = self._GetSize (group)
+        if size is not None and size < self._dropSize:
+            return None
+
+        children = self._SimplifyChildren (group.GetChildren ())
+        if children is None:
+            return group
+
+        result = Group (group.GetTranslation ())
+        result.Scale (*group.GetScale ())
+        return _SetChildren (result, children)
+
+    def VisitDrawing (self, drawing, ctx=None):
+        children = self._SimplifyChildren (drawing.GetChildren ())
+        shared = [self._GetSource (s) for s in drawing.GetShared ()]
+
+        size = drawing.GetSize ()
+        result = Drawing (size [0], size [1], drawing.GetMargin ())
+        _SetChildren (result, children if children is not None else
+            list (drawing.GetChildren ()))
+        for s in shared:
+            if s is not None:
+                result.AddShared (s)
+        return result
+
+    def VisitInstance (self, instance, ctx=None):
+        source = self._GetSource (instance.GetSource ())
+        if source is instance.GetSource ():
+            return instance
+        if source is None:
+            return None
+        return Instance (source, instance.GetPosition ())
+
+    def VisitArray (self, array, ctx=None):
+        source = self._GetSource (array.GetElement ())
+        if source is array.GetElement ():
+            return array
+        if source is None:
+            return None
+        return Array (source, array.GetColumns (), array.GetRows (),
+            array.GetOffset (), array.GetSpacing ())
+
+    def _SimplifyPoints (self, points, minCount=2):
+        '''Simplify a polyline, or return None if nothing can be removed or
+        fewer than minCount points would be left.'''
+        if self._tolerance <= 0 or len (points) <= minCount:
+            return None
+
+        keep = SimplifyPolyline (points, self._tolerance)
+        if len (keep) == len (points) or len (keep) < minCount:
+            return None
+
+        data = points._GetBuffer ()
+        if points._IsFlat ():
+            result = array ('d')
+            for i in keep:
+                result.append (data [2 * i])
+                result.append (data [2 * i + 1])
+            return result
+        else:
+            return data [keep]
+
+    def VisitPath (self, path, ctx=None):
+        result = self._Collapse (path, path.GetStroke (), None)
+        if result is not path:
+            return result
+
+        points = self._SimplifyPoints (path.GetPoints ())
+        if points is None:
+            return path
+        return Path (points, path.GetStroke ())
+
+    def VisitPolygon (self, polygon, ctx=None):
+        result = self._Collapse (polygon, polygon.GetStroke (), polygon.GetFill ())
+        if result is not polygon:
+            return result
+
+        points = self._SimplifyPoints (polygon.GetPoints (), 3)
+        if points is None:
+            return polygon
+        return Polygon (points, polygon.GetStroke (), polygon.GetFill ())
+
+    def VisitCircle (self, circle, ctx=None):
+        return self._Collapse (circle, circle.GetStroke (), circle.GetFill ())
+
+    def VisitRectangle (self, rectangle, ctx=None):
+        return self._Collapse (rectangle, rectangle.GetStroke (), rectangle.GetFill ())
+
+    def VisitCircleSet (self, circleSet, ctx=None):
+        if circleSet.GetCount () == 0:
+            return None
+
+        if circleSet.GetScale () [0] != 1 or circleSet.GetScale () [1] != 1:
+            return circleSet
+
+        radius = circleSet.GetRadius ()
+        if not isinstance (radius, Number):
+            radius = max (radius)
+
+        stroke = circleSet.GetStroke ()
+        size = 2 * radius
+        if stroke is not None:
+            size += stroke.GetWidth ()
+
+        if size >= self._pointSize:
+            return circleSet
+
+        fill = self._GetPointFill (stroke, circleSet.GetFill ())
+        if size < self._dropSize or fill is None:
+            return None
+
+        return PointCloud (circleSet.GetCenters (), self._QuantizeSize (size), fill)
+
+def Simplify (drawing, scale=1, tolerance=0.25, dropSize=0.05, pointSize=1.5):
+    '''Simplify drawing for rendering with scale pixels per unit.
+
+    tolerance is the maximum error in pixels when simplifying paths and
+    polygons. Elements smaller than dropSize pixels are removed, and filled or
+    stroked shapes smaller than pointSize pixels are replaced by a square point
+    of the same size. Text is never changed.
+
+    Returns a new drawing of the same size, which shares all unchanged elements
+    with drawing.'''
+    return _Simplifier (scale, tolerance, dropSize, pointSize).VisitGeneric (drawing)
@@ -0,0 +1,146 @@
+'''Profiling of visitors and export phases.
+
+Profiling is enabled for all rendering visitors created inside a Profiling
+block:
+
+    with profile.Profiling () as p:
+        drawing.SaveSvg ('out.svg')
+    print (p.Format ())
+
+While profiling is off, visitors dispatch directly and phases are not timed,
+so there is no per-element overhead. Work done in the worker processes of
+tiled rendering is not recorded.'''
+
+import contextlib
+import threading
+import time
+
+_state = threading.local ()
+_exporters = []
+
+class ElementStatistics:
+    '''Statistics for all visits of one element class.
+
+    cumulative includes the time spent in nested elements, except for nested
+    elements of the same class, which are already counted. characters is the
+    number of characters of markup written for the element itself, or None if
+    the backend does not report it. It is counted before encoding and
+    compression, so it is not the number of bytes written to the file.'''
+    __slots__ = ('count', 'cumulative', 'self', 'characters')
+
+    def __init__ (self):
+        self.count = 0
+        self.cumulative = 0.0
+        self.self = 0.0
+        self.characters = None
+
+class Profile:
+    '''Collects visit statistics per element class and phase timings.'''
+    def __init__ (self):
+        self._elements = {}
+        self._phases = {}
+        # Per active visit, the time and characters of its nested visits
+        self._stack = []
+        # Number of active visits per element class
+        self._depth = {}
+
+    def GetElementStatistics (self, className):
+        statistics = self._elements.get (className)
+        if statistics is None:
+            statistics = self._elements [className] = ElementStatistics ()
+        return statistics
+
+    def AddPhaseTime (self, phase, seconds):
+        self._phases [phase] = self._phases.get (phase, 0.0) + seconds
+
+    def GetReport (self):
+        '''Get the results as a dictionary.
+
+        'phases' maps the name of each phase to its total time in seconds.
+        Phases may nest; for instance, serialization of SVG happens during the
+        traversal. 'elements' maps each element class name to a dictionary
+        with count, cumulative and self time in seconds, and the number of
+        characters written, see ElementStatistics.'''
+        return {
+            'phases' : dict (self._phases),
+            'elements' : {name : {
+                    'count'         : s.count,
+                    'cumulative'    : s.cumulative,
+                    'self'          : s.self,
+                    'characters'    : s.characters
+                } for name, s in self._elements.items ()}
+        }
+
+    def Format (self):
+        '''Format the results as a table.'''
+        lines = ['{:<24}{:>10}{:>14}{:>14}{:>12}'.format (
+            'Element', 'Count', 'Cumul. [ms]', 'Self [ms]', 'Characters')]
+
+        for name, s in sorted (self._elements.items (),
+            key=lambda item: item [1].self, reverse=True):
+            lines.append ('{:<24}{:>10}{:>14.2f}{:>14.2f}{:>12}'.format (
+                name, s.count, s.cumulative * 1000, s.self * 1000,
+                '-' if s.characters is None else s.characters))
+
+        lines.append ('')
+        for phase, seconds in self._phases.items ():
+            lines.append ('{:<24}{:>10.2f} ms'.format (phase, seconds * 1000))
+
+        return '\n'.join (lines)
+
+def GetActiveProfile ():
+    '''Get the profile of the innermost Profiling block of this thread.'''
+    return getattr (_state, 'profile', None)
+
+def AddExporter (exporter):
+    '''Add a function which is called with the report of every Profiling
+    block when it ends, for instance to forward the results to a metrics
+    system.'''
+    _exporters.append (exporter)
+
+def RemoveExporter (exporter):
+    _exporters.remove (exporter)
+
+@contextlib.contextmanager
+def Profiling (exporter=None):
+    '''Enable profiling for all visitors created in this block.
+
+    Yields the Profile. When the block ends, the report is passed to exporter,
+    if set, and to all exporters registered with AddExporter.'''
+    profile = Profile ()
+    previous = GetActiveProfile ()
+    _state.profile = profile
+    try:
+        yield profile
+    finally:
+        _state.profile = previous
+
+    report = profile.GetReport ()
+    if exporter is not None:
+        exporter (report)
+    for e in _exporters:
+        e (report)
+
+class _PhaseTimer:
+    __slots__ = ('_profile', '_phase', '_start')
+
+    def __init__ (self, profile, phase):
+        self._profile = profile
+        self._phase = phase
+
+    def __enter__ (self):
+        self._start = time.perf_counter ()
+
+    def __exit__ (self, *args):
+        self._profile.AddPhaseTime (self._phase, time.perf_counter () - self._start)
+
+_noPhase = contextlib.nullcontext ()
+
+def Phase (name):
+    '''Time the enclosed code as phase name of the active profile.
+
+    Does nothing if profiling is off.'''
+    profile = getattr (_state, 'profile', None)
+    if profile is None:
+        return _noPhase
+    return _PhaseTimer (profile, name)
@@ -0,0 +1,671 @@
+'''A compact binary file format for drawings.
+
+Scene files store a tree of elements, so a drawing can be exported again
+without running the code which built it:
+
+    drawing.SaveScene ('figure.luna')
+    drawing = scene.Load ('figure.luna')
+
+References are kept as references: an element which is used by several
+Instances or Arrays, like the shared elements of a drawing, is stored once, and
+all of them reference the same element after loading. Elements of other
+classes are stored as the built-in class they derive from.
+
+A file consists of a JSON header with the styles, strings and the location of
+the sections, followed by binary sections. The elements are stored column by
+column, one section per attribute, and the coordinates of all elements are
+stored in a single section. When loading, the file is memory-mapped
+copy-on-write. Large point and value buffers become NumPy views into the
+mapping, so they are only read from disk when used, and modifying them does
+not change the file. Smaller buffers are copied into arrays, like PointArray
+does for small inputs. All numbers are stored little-endian. On big-endian
+machines, sections are byte-swapped while saving and loading, and NumPy views
+use a little-endian dtype.'''
+
+from array import array
+import contextlib
+import gc
+import json
+import math
+import mmap
+from numbers import Number
+import struct
+import sys
+
+from . import Visitor, Element, Drawing, Group, Grid, Cross, Path, Line, \
+    Polygon, Circle, Rectangle, Image, Instance, Array, Text, LineSet, \
+    CircleSet, PointCloud, Color, Stroke, Fill, Font, FontWeight, LineCap, \
+    LineJoin, geo
+
+_MAGIC = b'LUNASCN\0'
+_VERSION = 1
+# Magic, version and length of the JSON header
+_PREAMBLE = struct.Struct ('<8sII')
+
+# The classes which can be stored, in the order of their codes
+_KINDS = (Element, Drawing, Group, Grid, Cross, Path, Line, Polygon, Circle,
+    Rectangle, Image, Instance, Array, Text, LineSet, CircleSet, PointCloud)
+_KIND_CODES = {cls : code for code, cls in enumerate (_KINDS)}
+
+# Per-element columns. Indices of styles, strings and elements are -1 if
+# unset. Children and shared elements are stored as ranges of the children
+# section, the shared elements following the children.
+_COLUMNS = (
+    ('kind', 'B'),
+    ('id', 'i'),
+    ('stroke', 'i'),
+    ('fill', 'i'),
+    ('font', 'i'),
+    ('string', 'i'),
+    ('reference', 'i'),
+    ('childStart', 'q'),
+    ('childCount', 'i'),
+    ('sharedCount', 'i'),
+    ('pointStart', 'q'),
+    ('pointCount', 'q'),
+    ('valueStart', 'q'),
+    ('valueCount', 'q'),
+    ('parameters', 'd')
+)
+
+# Numbers per element in the parameters column. The last two are the scale,
+# the others depend on the kind of the element.
+_PARAMETERS = 8
+
+_nan = float ('nan')
+# Zeros to fill up the kind-specific parameters
+_PADDING = [(0,) * (_PARAMETERS - 2 - i) for i in range (_PARAMETERS - 1)]
+_noReplacements = {}
+_MakeVector2 = geo._MakeVector2
+
+# Set if arrays must be byte-swapped to match the file
+_SWAP = sys.byteorder != 'little'
+
+def _LittleEndian (chunk):
+    '''Get chunk with the byte order of the file, swapping a copy of arrays if
+    necessary. NumPy chunks are little-endian already.'''
+    if _SWAP and isinstance (chunk, array):
+        chunk = array (chunk.typecode, chunk)
+        chunk.byteswap ()
+    return chunk
+
+def _Number (value):
+    '''Convert value into a number which can be stored in JSON.'''
+    if isinstance (value, (int, float)):
+        return value
+    return float (value)
+
+@contextlib.contextmanager
+def _CollectionPaused ():
+    '''Pause the garbage collector.
+
+    Saving and loading create many objects which are kept until the end, and
+    no garbage, so the collector would only scan them over and over.'''
+    enabled = gc.isenabled ()
+    gc.disable ()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable ()
+
+def _Align (size):
+    return (size + 7) & ~7
+
+class _Writer (Visitor):
+    '''Collects the elements of a tree into columns.'''
+    _profiled = False
+
+    def __init__ (self):
+        super (_Writer, self).__init__ ()
+        # One tuple per element with the values of all columns except for the
+        # parameters, which are stored separately
+        self._rows = []
+        self._parameters = array ('d')
+        self._children = array ('i')
+        # Chunks of the points and values sections. Flat arrays are merged
+        # into the last chunk, so there are few chunks even if there are many
+        # small elements.
+        self._points = []
+        self._pointCount = 0
+        self._values = []
+        self._valueCount = 0
+
+        self._indices = {}
+        self._styles = []
+        self._styleIndices = {}
+        self._strings = []
+        self._stringIndices = {}
+
+    def _Collect (self, root):
+        '''Assign an index to each element reachable from root.'''
+        indices = self._indices
+        elements = []
+        pending = [root]
+        while pending:
+            element = pending.pop ()
+            if id (element) in indices:
+                continue
+            indices [id (element)] = len (elements)
+            elements.append (element)
+
+            # Most elements only depend on their children
+            dependencies = element._GetDependencies ()
+            if dependencies is not element._children:
+                pending.extend (dependencies)
+            if element._shared:
+                pending.extend (reversed (element._shared))
+            if element._children:
+                pending.extend (reversed (element._children))
+        return elements
+
+    def Write (self, root, f):
+        for element in self._Collect (root):
+            self.VisitGeneric (element)
+
+        columns = list (zip (*self._rows)) if self._rows else [()] * (len (_COLUMNS) - 1)
+        sections = [(name, [array (code, column)])
+            for (name, code), column in zip (_COLUMNS, columns)]
+        sections.append (('parameters', [self._parameters]))
+        sections.append (('children', [self._children]))
+        sections.append (('points', self._points))
+        sections.append (('values', self._values))
+
+        layout = {}
+        offset = 0
+        for name, chunks in sections:
+            size = sum (_GetByteSize (chunk) for chunk in chunks)
+            layout [name] = [offset, size]
+            offset = _Align (offset + size)
+
+        header = json.dumps ({
+            'count'     : len (self._indices),
+            'sections'  : layout,
+            'styles'    : self._styles,
+            'strings'   : self._strings
+        }, separators=(',', ':')).encode ('utf-8')
+
+        f.write (_PREAMBLE.pack (_MAGIC, _VERSION, len (header)))
+        f.write (header)
+        position = _PREAMBLE.size + len (header)
+        f.write (bytes (_Align (position) - position))
+
+        for name, chunks in sections:
+            size = 0
+            for chunk in chunks:
+                f.write (_LittleEndian (chunk))
+                size += _GetByteSize (chunk)
+            f.write (bytes (_Align (size) - size))
+
+    def _GetString (self, value):
+        if value is None:
+            return -1
+        index = self._stringIndices.get (value)
+        if index is None:
+            index = self._stringIndices [value] = len (self._strings)
+            self._strings.append (value)
+        return index
+
+    def _GetStyle (self, style):
+        if style is None:
+            return -1
+        index = self._styleIndices.get (style)
+        if index is None:
+            encoded = self._EncodeStyle (style)
+            index = self._styleIndices [style] = len (self._styles)
+            self._styles.append (encoded)
+        return index
+
+    def _EncodeColor (self, color):
+        return [_Number (color.R ()), _Number (color.G ()), _Number (color.B ())]
+
+    def _EncodeStyle (self, style):
+        if isinstance (style, Stroke):
+            dashPattern = style.GetDashPattern ()
+            return {
+                'type'          : 'Stroke',
+                'color'         : self._EncodeColor (style.GetColor ()),
+                'width'         : _Number (style.GetWidth ()),
+                'lineCap'       : style.GetLineCap ().name,
+                'lineJoin'      : style.GetLineJoin ().name,
+                'dashPattern'   : None if dashPattern is None
+                    else [_Number (v) for v in dashPattern],
+                'opacity'       : _Number (style.GetOpacity ())
+            }
+        elif isinstance (style, Fill):
+            return {
+                'type'      : 'Fill',
+                'color'     : self._EncodeColor (style.GetColor ()),
+                'opacity'   : _Number (style.GetOpacity ())
+            }
+        elif isinstance (style, Font):
+            return {
+                'type'      : 'Font',
+                'fontFace'  : style.GetFontFace (),
+                'size'      : _Number (style.GetSize ()),
+                'weight'    : style.GetWeight ().name,
+                'stroke'    : self._GetStyle (style.GetStroke ()),
+                'fill'      : self._GetStyle (style.GetFill ())
+            }
+        raise ValueError ('Cannot store style {!r}'.format (style))
+
+    def _AddChunk (self, chunks, data):
+        if isinstance (data, array):
+            if chunks and isinstance (chunks [-1], array):
+                chunks [-1].extend (data)
+            else:
+                chunks.append (array ('d', data))
+        else:
+            chunks.append (geo.numpy.ascontiguousarray (data, dtype='<f8'))
+
+    def _AddPoints (self, points):
+        data = points._GetBuffer ()
+        count = len (data) // 2 if points._IsFlat () else len (data)
+        self._AddChunk (self._points, data)
+        start = self._pointCount
+        self._pointCount += count
+        return start, count
+
+    def _AddValues (self, values):
+        self._AddChunk (self._values, values)
+        start = self._valueCount
+        self._valueCount += len (values)
+        return start, len (values)
+
+    def _AddRow (self, element, cls, parameters=(), stroke=None, fill=None,
+        font=None, string=None, reference=None, points=None, values=None):
+        indices = self._indices
+        children = element._children
+        shared = element._shared
+
+        childStart = len (self._children)
+        if children:
+            self._children.extend ([indices [id (child)] for child in children])
+        if shared:
+            self._children.extend ([indices [id (s)] for s in shared])
+
+        pointStart, pointCount = (0, 0) if points is None else self._AddPoints (points)
+        valueStart, valueCount = (0, 0) if values is None else self._AddValues (values)
+
+        self._rows.append ((
+            _KIND_CODES [cls],
+            self._GetString (element._id),
+            self._GetStyle (stroke),
+            self._GetStyle (fill),
+            self._GetStyle (font),
+            self._GetString (string),
+            -1 if reference is None else indices [id (reference)],
+            childStart, len (children), len (shared),
+            pointStart, pointCount, valueStart, valueCount))
+
+        p = self._parameters
+        p.extend (parameters)
+        p.extend (_PADDING [len (parameters)])
+        p.extend (element._scale)
+
+    def VisitElement (self, element, ctx=None):
+        self._AddRow (element, Element)
+
+    def VisitDrawing (self, drawing, ctx=None):
+        self._AddRow (drawing, Drawing, (
+            _nan if drawing._width is None else drawing._width,
+            _nan if drawing._height is None else drawing._height,
+            drawing._margin))
+
+    def VisitGroup (self, group, ctx=None):
+        self._AddRow (group, Group, group._translation, string=group._name)
+
+    def VisitGrid (self, grid, ctx=None):
+        self._AddRow (grid, Grid, (grid._translation.x, grid._translation.y,
+            grid._spacing.x, grid._spacing.y), string=grid._name)
+
+    def VisitCross (self, cross, ctx=None):
+        self._AddRow (cross, Cross, cross._translation, string=cross._name)
+
+    def VisitPath (self, path, ctx=None):
+        self._AddRow (path, Path, stroke=path._stroke, points=path._points)
+
+    def VisitLine (self, line, ctx=None):
+        self._AddRow (line, Line, stroke=line._stroke, points=line._points)
+
+    def VisitPolygon (self, polygon, ctx=None):
+        self._AddRow (polygon, Polygon, stroke=polygon._stroke,
+            fill=polygon._fill, points=polygon._points)
+
+    def VisitCircle (self, circle, ctx=None):
+        self._AddRow (circle, Circle, (circle._center.x, circle._center.y,
+            circle._radius), stroke=circle._stroke, fill=circle._fill)
+
+    def VisitRectangle (self, rectangle, ctx=None):
+        self._AddRow (rectangle, Rectangle, (rectangle._position.x,
+            rectangle._position.y, rectangle._size.x, rectangle._size.y,
+            rectangle._cornerRadius), stroke=rectangle._stroke,
+            fill=rectangle._fill)
+
+    def VisitImage (self, image, ctx=None):
+        self._AddRow (image, Image, (image._position.x, image._position.y,
+            image._size.x, image._size.y), string=image._filename)
+
+    def VisitInstance (self, instance, ctx=None):
+        self._AddRow (instance, Instance, instance._position,
+            reference=instance._source)
+
+    def VisitArray (self, array, ctx=None):
+        self._AddRow (array, Array, (array._columns, array._rows,
+            array._offset.x, array._offset.y, array._spacing.x,
+            array._spacing.y), reference=array._element)
+
+    def VisitText (self, text, ctx=None):
+        self._AddRow (text, Text, text._position, stroke=text._stroke,
+            font=text._font, string=text._text)
+
+    def VisitLineSet (self, lineSet, ctx=None):
+        self._AddRow (lineSet, LineSet, stroke=lineSet._stroke,
+            points=lineSet._points)
+
+    def VisitCircleSet (self, circleSet, ctx=None):
+        radius = circleSet._radius
+        if isinstance (radius, Number):
+            self._AddRow (circleSet, CircleSet, (radius,),
+                stroke=circleSet._stroke, fill=circleSet._fill,
+                points=circleSet._centers)
+        else:
+            self._AddRow (circleSet, CircleSet, (_nan,),
+                stroke=circleSet._stroke, fill=circleSet._fill,
+                points=circleSet._centers, values=radius)
+
+    def VisitPointCloud (self, pointCloud, ctx=None):
+        self._AddRow (pointCloud, PointCloud, (pointCloud._size,),
+            fill=pointCloud._fill, points=pointCloud._points)
+
+def _GetByteSize (chunk):
+    if isinstance (chunk, array):
+        return len (chunk) * chunk.itemsize
+    return chunk.nbytes
+
+def Save (element, filename):
+    '''Save element and everything it references as a scene file.
+
+    filename can be a path or a writable binary file object.'''
+    with _CollectionPaused ():
+        if hasattr (filename, 'write'):
+            _Writer ().Write (element, filename)
+        else:
+            with open (filename, 'wb') as f:
+                _Writer ().Write (element, f)
+
+class _Reader:
+    '''Creates the elements stored in a scene file.'''
+    def __init__ (self, data):
+        self._data = data
+        self._raw = memoryview (data)
+
+        magic, version, headerSize = _PREAMBLE.unpack_from (data)
+        if magic != _MAGIC:
+            raise ValueError ('Not a scene file')
+        if version != _VERSION:
+            raise ValueError ('Unsupported scene file version {}'.format (version))
+
+        start = _PREAMBLE.size
+        header = json.loads (bytes (self._raw [start:start + headerSize]).decode ('utf-8'))
+        self._count = header ['count']
+        self._dataStart = _Align (start + headerSize)
+        self._sections = header ['sections']
+
+        # Lists are faster to index than memoryviews. The parameters are
+        # mostly read once, so they are not converted, which would create
+        # an object for each of them.
+        for name, code in _COLUMNS:
+            column = self._GetSection (name, code)
+            setattr (self, '_' + name,
+                column if name == 'parameters' else column.tolist ())
+        self._children = self._GetSection ('children', 'i').tolist ()
+        self._pointsOffset = self._dataStart + self._sections ['points'] [0]
+        self._valuesOffset = self._dataStart + self._sections ['values'] [0]
+
+        # Unset indices are -1, so the trailing None is used for them
+        self._strings = header ['strings'] + [None]
+        self._styles = []
+        for style in header ['styles']:
+            self._styles.append (self._DecodeStyle (style))
+        self._styles.append (None)
+
+        self._loaders = {
+            Element     : self._LoadElement,
+            Drawing     : self._LoadDrawing,
+            Group       : self._LoadGroup,
+            Grid        : self._LoadGrid,
+            Cross       : self._LoadGroup,
+            Path        : self._LoadPath,
+            Line        : self._LoadPath,
+            Polygon     : self._LoadPolygon,
+            Circle      : self._LoadCircle,
+            Rectangle   : self._LoadRectangle,
+            Image       : self._LoadImage,
+            Instance    : self._LoadInstance,
+            Array       : self._LoadArray,
+            Text        : self._LoadText,
+            LineSet     : self._LoadPath,
+            CircleSet   : self._LoadCircleSet,
+            PointCloud  : self._LoadPointCloud
+        }
+
+    def _GetSection (self, name, code):
+        offset, size = self._sections [name]
+        offset += self._dataStart
+        if _SWAP:
+            column = array (code)
+            column.frombytes (self._raw [offset:offset + size])
+            column.byteswap ()
+            return column
+        return self._raw [offset:offset + size].cast (code)
+
+    def _DecodeStyle (self, style):
+        kind = style ['type']
+        if kind == 'Stroke':
+            return Stroke (Color (*style ['color']), style ['width'],
+                LineCap [style ['lineCap']], LineJoin [style ['lineJoin']],
+                style ['dashPattern'], style ['opacity'])
+        elif kind == 'Fill':
+            return Fill (Color (*style ['color']), style ['opacity'])
+        elif kind == 'Font':
+            # Styles only refer to styles stored before them
+            return Font (style ['fontFace'], style ['size'],
+                FontWeight [style ['weight']], self._styles [style ['stroke']]
+                if style ['stroke'] >= 0 else None, self._styles [style ['fill']]
+                if style ['fill'] >= 0 else None)
+        raise ValueError ('Unknown style {}'.format (kind))
+
+    def _GetBuffer (self, offset, count, width):
+        '''Get count * width numbers at offset, as a NumPy view into the file if
+        there are many, and as a copy otherwise.'''
+        if geo.numpy is not None and count >= geo._NUMPY_THRESHOLD:
+            data = geo.numpy.frombuffer (self._data, dtype='<f8',
+                count=count * width, offset=offset)
+            return data.reshape (-1, width) if width > 1 else data
+        data = array ('d')
+        data.frombytes (self._raw [offset:offset + 8 * width * count])
+        if _SWAP:
+            data.byteswap ()
+        return data
+
+    def _GetPoints (self, i):
+        # The buffer is valid already, so the checks of the constructor are
+        # skipped
+        points = geo.PointArray.__new__ (geo.PointArray)
+        points._data = self._GetBuffer (
+            self._pointsOffset + 16 * self._pointStart [i], self._pointCount [i], 2)
+        points._shared = False
+        points._external = False
+        return points
+
+    def _GetValues (self, i):
+        return self._GetBuffer (self._valuesOffset + 8 * self._valueStart [i],
+            self._valueCount [i], 1)
+
+    def _Create (self, cls, i):
+        element = cls.__new__ (cls)
+        Element.__init__ (element, self._strings [self._id [i]])
+        p = self._parameters
+        k = i * _PARAMETERS + _PARAMETERS - 2
+        if p [k] != 1 or p [k + 1] != 1:
+            element._scale = geo.Vector2 (p [k], p [k + 1])
+        return element
+
+    def _LoadElement (self, cls, i):
+        return self._Create (cls, i)
+
+    def _LoadDrawing (self, cls, i):
+        drawing = self._Create (cls, i)
+        p = self._parameters
+        k = i * _PARAMETERS
+        drawing._width = None if math.isnan (p [k]) else p [k]
+        drawing._height = None if math.isnan (p [k + 1]) else p [k + 1]
+        drawing._margin = p [k + 2]
+        return drawing
+
+    def _LoadGroup (self, cls, i):
+        group = self._Create (cls, i)
+        p = self._parameters
+        k = i * _PARAMETERS
+        group._translation = _MakeVector2 (p [k], p [k + 1])
+        group._name = self._strings [self._string [i]]
+        return group
+
+    def _LoadGrid (self, cls, i):
+        grid = self._LoadGroup (cls, i)
+        p = self._parameters
+        k = i * _PARAMETERS
+        grid._spacing = _MakeVector2 (p [k + 2], p [k + 3])
+        return grid
+
+    def _LoadPath (self, cls, i):
+        path = self._Create (cls, i)
+        path._points = self._GetPoints (i)
+        path._stroke = self._styles [self._stroke [i]]
+        return path
+
+    def _LoadPolygon (self, cls, i):
+        polygon = self._LoadPath (cls, i)
+        polygon._fill = self._styles [self._fill [i]]
+        return polygon
+
+    def _LoadCircle (self, cls, i):
+        circle = self._Create (cls, i)
+        p = self._parameters
+        k = i * _PARAMETERS
+        circle._center = _MakeVector2 (p [k], p [k + 1])
+        circle._radius = p [k + 2]
+        circle._stroke = self._styles [self._stroke [i]]
+        circle._fill = self._styles [self._fill [i]]
+        return circle
+
+    def _LoadRectangle (self, cls, i):
+        rectangle = self._Create (cls, i)
+        p = self._parameters
+        k = i * _PARAMETERS
+        rectangle._position = _MakeVector2 (p [k], p [k + 1])
+        rectangle._size = _MakeVector2 (p [k + 2], p [k + 3])
+        rectangle._cornerRadius = p [k + 4]
+        rectangle._stroke = self._styles [self._stroke [i]]
+        rectangle._fill = self._styles [self._fill [i]]
+        return rectangle
+
+    def _LoadImage (self, cls, i):
+        image = self._Create (cls, i)
+        p = self._parameters
+        k = i * _PARAMETERS
+        image._position = _MakeVector2 (p [k], p [k + 1])
+        image._size = _MakeVector2 (p [k + 2], p [k + 3])
+        image._filename = self._strings [self._string [i]]
+        return image
+
+    def _LoadInstance (self, cls, i):
+        instance = self._Create (cls, i)
+        p = self._parameters
+        k = i * _PARAMETERS
+        instance._position = _MakeVector2 (p [k], p [k + 1])
+        # The source is set in Read, once all elements exist
+        instance._source = None
+        return instance
+
+    def _LoadArray (self, cls, i):
+        a = self._Create (cls, i)
+        p = self._parameters
+        k = i * _PARAMETERS
+        a._element = None
+        a._columns = int (p [k])
+        a._rows = int (p [k + 1])
+        a._offset = _MakeVector2 (p [k + 2], p [k + 3])
+        a._spacing = _MakeVector2 (p [k + 4], p [k + 5])
+        return a
+
+    def _LoadText (self, cls, i):
+        text = self._Create (cls, i)
+        p = self._parameters
+        k = i * _PARAMETERS
+        text._text = self._strings [self._string [i]]
+        text._position = _MakeVector2 (p [k], p [k + 1])
+        text._font = self._styles [self._font [i]]
+        text._stroke = self._styles [self._stroke [i]]
+        return text
+
+    def _LoadCircleSet (self, cls, i):
+        circleSet = self._Create (cls, i)
+        circleSet._centers = self._GetPoints (i)
+        circleSet._stroke = self._styles [self._stroke [i]]
+        circleSet._fill = self._styles [self._fill [i]]
+        if self._valueCount [i] > 0:
+            circleSet._radius = self._GetValues (i)
+        else:
+            circleSet._radius = self._parameters [i * _PARAMETERS]
+        return circleSet
+
+    def _LoadPointCloud (self, cls, i):
+        pointCloud = self._Create (cls, i)
+        pointCloud._points = self._GetPoints (i)
+        pointCloud._size = self._parameters [i * _PARAMETERS]
+        pointCloud._fill = self._styles [self._fill [i]]
+        return pointCloud
+
+    def Read (self):
+        loaders = [self._loaders [cls] for cls in _KINDS]
+        elements = [loaders [kind] (_KINDS [kind], i)
+            for i, kind in enumerate (self._kind)]
+
+        children = self._children
+        for i, reference in enumerate (self._reference):
+            count = self._childCount [i]
+            sharedCount = self._sharedCount [i]
+            if count or sharedCount:
+                element = elements [i]
+                start = self._childStart [i]
+                if count:
+                    element._children = [elements [j]
+                        for j in children [start:start + count]]
+                if sharedCount:
+                    element._shared = [elements [j]
+                        for j in children [start + count:start + count + sharedCount]]
+
+            if reference >= 0:
+                element = elements [i]
+                if isinstance (element, Instance):
+                    element._source = elements [reference]
+                else:
+                    element._element = elements [reference]
+
+        for element in elements:
+            element._Link (_noReplacements)
+
+        return elements [0]
+
+def Load (filename):
+    '''Load the element stored in the scene file filename.
+
+    The file is memory-mapped and must not be modified while elements loaded
+    from it are in use.'''
+    with open (filename, 'rb') as f:
+        data = mmap.mmap (f.fileno (), 0, access=mmap.ACCESS_COPY)
+
+    with _CollectionPaused ():
+        return _Reader (data).Read ()
@@ -0,0 +1,228 @@
+import math
+import pickle
+
+import pytest
+
+from luna import *
+
+try:
+	import cairocffi as cairo
+	from luna.backends.cairo import CairoVisitor
+except (ImportError, OSError):
+	cairo = None
+
+pytestmark = pytest.mark.skipif (cairo is None, reason='Cairo is not available')
+
+class _CountingContext:
+	def __init__ (self, ctx):
+		self._ctx = ctx
+		self.calls = []
+
+	def __getattr__ (self, name):
+		func = getattr (self._ctx, name)
+		def Call (*args):
+			self.calls.append (name)
+			return func (*args)
+		return Call
+
+def _Pixels (drawing, visitor):
+	surface = cairo.ImageSurface (cairo.FORMAT_ARGB32, 64, 64)
+	visitor._Render (drawing, surface)
+	return bytes (surface.get_data ())
+
+def _CreateLines ():
+	d = Drawing (64, 64)
+	stroke = Stroke (Color (255, 0, 0), width=2)
+	for y in range (0, 60, 6):
+		d.Add (Line ((2, y), (58, y), stroke=stroke))
+	return d
+
+def testCairoSkipsRedundantStateChanges ():
+	d = _CreateLines ()
+	v = CairoVisitor ()
+	ctx = _CountingContext (cairo.Context (cairo.ImageSurface (cairo.FORMAT_ARGB32, 64, 64)))
+	for line in d.GetChildren ():
+		v.VisitGeneric (line, ctx)
+
+	assert (ctx.calls.count ('set_line_width') == 1)
+	assert (ctx.calls.count ('set_source_rgba') == 1)
+	assert (ctx.calls.count ('stroke') == len (d.GetChildren ()))
+
+def testCairoBatchedStrokesMatch ():
+	d = _CreateLines ()
+
+	assert (_Pixels (d, CairoVisitor ()) ==
+		_Pixels (d, CairoVisitor (batchStrokes=True)))
+
+def testCairoReplayMatchesDirectRendering ():
+	d = Drawing (64, 64)
+	cube = Group ()
+	cube.Add (Rectangle ((0, 0), (6, 6), fill=Fill (Color (0, 128, 0))))
+	cube.Add (Line ((0, 0), (6, 6)))
+	d.Add (Array (d.AddShared (cube), 8, 8, offset=(2, 2), spacing=(7, 7)))
+
+	# The round caps overlap the neighbouring cubes, where the recording is
+	# blended as a whole and may be rounded differently
+	difference = [abs (x - y) for x, y in zip (_Pixels (d, CairoVisitor ()),
+		_Pixels (d, CairoVisitor (replayThreshold=2)))]
+	assert (max (difference) <= 1)
+	assert (sum (difference) < len (difference) / 100)
+
+def testCairoReplayCountsReferencesOnce ():
+	class CountingGroup (Group):
+		__slots__ = ()
+		counted = 0
+
+		def GetReferenceCount (self):
+			CountingGroup.counted += 1
+			return super ().GetReferenceCount ()
+
+	d = Drawing (64, 64)
+	cube = d.AddShared (CountingGroup ())
+	cube.Add (Rectangle ((0, 0), (6, 6), fill=Fill (Color (0, 128, 0))))
+	for i in range (8):
+		d.Add (Instance (cube, (i * 7, 0)))
+
+	_Pixels (d, CairoVisitor (replayThreshold=100))
+	assert (CountingGroup.counted == 1)
+
+def testCairoTiledRenderingMatchesSerial (tmpdir):
+	d = Drawing (100, 80)
+	for i in range (20):
+		d.Add (Line ((i * 5, 0), (100 - i * 5, 80), stroke=Stroke (width=1.5)))
+		d.Add (Circle ((i * 5, 40), 3, fill=Fill (Color (0, 0, 200))))
+	d.Add (Text ('Tiles', (10, 70)))
+
+	serial = str (tmpdir.join ('serial.png'))
+	tiled = str (tmpdir.join ('tiled.png'))
+	d.SavePng (serial)
+	d.SavePng (tiled, workers=2, tile=(32, 24))
+
+	a = cairo.ImageSurface.create_from_png (serial)
+	b = cairo.ImageSurface.create_from_png (tiled)
+	assert (bytes (a.get_data ()) == bytes (b.get_data ()))
+
+def testCairoBandsMatchSerial ():
+	d = Drawing (1200, 900, margin=3)
+	g = Group ((13.5, 7.25))
+	g.Add (Polygon ([(1, 1), (900, 30), (60, 700)], fill=Fill (Color (0, 200, 0), opacity=0.3)))
+	d.Add (g)
+	for i in range (200):
+		x = (i * 337) % 1200
+		y = (i * 211) % 900
+		d.Add (Line ((x, y), ((x * 7) % 1200 + 0.3, (y * 3) % 900 + 0.6),
+			stroke=Stroke (width=0.5 + i % 4)))
+		d.Add (Circle ((y * 1.3 + 0.1, x * 0.7 + 0.4), 1 + i % 37,
+			fill=Fill (Color (0, 0, 200), opacity=0.4)))
+	for i in range (20):
+		d.Add (Text ('Label {}'.format (i), (i * 53, 12 + i * 44)))
+
+	v = CairoVisitor ()
+	for scale in (1, 0.37):
+		serial = v.RenderSurface (d, scale=scale)
+		tiled = v.RenderSurface (d, workers=4, scale=scale)
+		assert (bytes (serial.get_data ()) == bytes (tiled.get_data ()))
+
+def testCairoTiledRenderingAfterReplay ():
+	d = Drawing (64, 64)
+	cube = d.AddShared (Rectangle ((0, 0), (6, 6), fill=Fill (Color (0, 128, 0))))
+	d.Add (Array (cube, 8, 8, spacing=(8, 8)))
+
+	v = CairoVisitor (replayThreshold=2)
+	expected = v.RenderSurface (d)
+	assert (not v._recordings)
+	v = pickle.loads (pickle.dumps (v))
+	tiled = v.RenderSurface (d, workers=2, tile=16)
+	assert (bytes (expected.get_data ()) == bytes (tiled.get_data ()))
+
+def testCairoLevelOfDetailMatchesFullRendering (tmpdir):
+	d = Drawing (400, 400)
+	d.Add (Path ([(x * 0.1, 200 + 100 * math.sin (x * 0.001)) for x in range (4000)]))
+	for i in range (1000):
+		d.Add (Circle ((i % 40 * 10, i // 40 * 10), 0.5, stroke=None))
+
+	full = str (tmpdir.join ('full.png'))
+	simplified = str (tmpdir.join ('simplified.png'))
+	d.SavePng (full, scale=0.25)
+	d.SavePng (simplified, scale=0.25, lod=True)
+
+	a = cairo.ImageSurface.create_from_png (full)
+	b = cairo.ImageSurface.create_from_png (simplified)
+	assert (a.get_width () == b.get_width () == 102)
+
+	difference = [abs (x - y) for x, y in zip (bytes (a.get_data ()), bytes (b.get_data ()))]
+	assert (max (difference) < 64)
+
+def testCairoProfilingWithLevelOfDetail ():
+	from luna import profile
+
+	d = Drawing (100, 100)
+	for i in range (10):
+		d.Add (Line ((i * 10, 0), (i * 10, 100)))
+
+	with profile.Profiling () as p:
+		d.RenderPng (lod=True)
+
+	elements = p.GetReport () ['elements']
+	assert (elements ['Line'] ['count'] == 10)
+	assert (elements ['Drawing'] ['count'] == 1)
+
+def testCairoImageCache (tmpdir):
+	from luna.backends.cairo import GetImageCache
+
+	filename = str (tmpdir.join ('image.png'))
+	cairo.ImageSurface (cairo.FORMAT_ARGB32, 4, 4).write_to_png (filename)
+
+	d = Drawing (64, 64)
+	d.Add (Array (d.AddShared (Image (filename, (0, 0), (4, 4))), 4, 4))
+
+	cache = GetImageCache ()
+	cache.Clear ()
+	d.SavePng (str (tmpdir.join ('a.png')))
+	d.SavePdf (str (tmpdir.join ('a.pdf')))
+
+	statistics = cache.GetStatistics ()
+	assert (statistics ['misses'] == 1)
+	assert (statistics ['hits'] == 31)
+	assert (statistics ['size'] == 4 * 4 * 4)
+
+	cache.SetMaxSize (0)
+	assert (cache.GetStatistics () ['count'] == 0)
+	cache.SetMaxSize (256 << 20)
+
+def testCairoRenderToMemory (tmpdir):
+	d = _CreateLines ()
+	filename = str (tmpdir.join ('lines.png'))
+	d.SavePng (filename)
+
+	with open (filename, 'rb') as f:
+		assert (d.RenderPng () == f.read ())
+	assert (d.RenderPdf ().startswith (b'%PDF'))
+
+def testCairoRenderSurfaceReuse ():
+	from luna.backends.cairo import GetPixels
+
+	d = _CreateLines ()
+	surface = d.RenderSurface ()
+	pixels = GetPixels (surface)
+	expected = bytes (surface.get_data ())
+
+	pixels [:] = 255
+	surface.mark_dirty ()
+	assert (d.RenderSurface (surface) is surface)
+	assert (bytes (surface.get_data ()) == expected)
+
+	with pytest.raises (ValueError):
+		d.RenderSurface (surface, scale=2)
+
+def testCairoTextMetrics ():
+	from luna.text import TextMeasurer
+
+	m = TextMeasurer ()
+	font = Font (size=20)
+	assert (m.UsesCairo ())
+
+	narrow = m.Measure ('iiii', font)
+	wide = m.Measure ('MMMM', font)
+	assert (narrow [2] - narrow [0] < wide [2] - wide [0])
+	assert (Text ('MMMM', (0, 0), font=font).GetBounds ().GetExtents () == wide)
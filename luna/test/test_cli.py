@@ -0,0 +1,51 @@
+import os
+import pickle
+
+import pytest
+
+from luna import Drawing, Circle
+from luna.cli import Main
+
+_SCENE = '''
+from luna import *
+
+def CreateDrawing ():
+	d = Drawing (10, 10)
+	d.Add (Line ((0, 0), (10, 10)))
+	return d
+'''
+
+@pytest.mark.parametrize ('jobs', [1, 2])
+def testExportContinuesAfterFailures (tmpdir, capsys, jobs):
+	tmpdir.join ('a.py').write (_SCENE)
+	tmpdir.join ('b.py').write ('raise RuntimeError ("broken scene")')
+	tmpdir.join ('c.py').write ('import sys\nsys.exit (1)')
+	output = tmpdir.join ('out')
+
+	inputs = [str (tmpdir.join (name)) for name in ['b.py', 'a.py', 'c.py']]
+	result = Main (['-j', str (jobs), '-f', 'svg,svgz', '-o', str (output)] + inputs)
+
+	assert (result == 1)
+	assert (sorted (os.listdir (str (output))) == ['a.svg', 'a.svgz'])
+
+	out = capsys.readouterr ().out
+	assert ('RuntimeError: broken scene' in out)
+	assert ('SystemExit: 1' in out)
+	assert ('3 inputs, 2 failed' in out)
+
+def testExportPickledDrawing (tmpdir):
+	d = Drawing ()
+	d.Add (Circle ((5, 5), 3))
+	with open (str (tmpdir.join ('scene.pickle')), 'wb') as f:
+		pickle.dump (d, f)
+
+	assert (Main (['-j', '1', str (tmpdir.join ('scene.pickle'))]) == 0)
+	assert (tmpdir.join ('scene.svg').read ().startswith ('<?xml'))
+
+def testExportSceneFile (tmpdir):
+	d = Drawing ()
+	d.Add (Circle ((5, 5), 3))
+	d.SaveScene (str (tmpdir.join ('scene.luna')))
+
+	assert (Main (['-j', '1', str (tmpdir.join ('scene.luna'))]) == 0)
+	assert (tmpdir.join ('scene.svg').read () == d.RenderSvg ().decode ('utf-8'))
@@ -1,4 +1,7 @@
-from luna.geo import Vector2, BoundingBox
+from array import array
+import pytest
+
+from luna.geo import Vector2, BoundingBox, PointArray
 
 def test_Vector2_Add ():
 	a = Vector2 (1, 2)
@@ -26,3 +29,54 @@ def test_BoundingBox_FromPoints ():
 	b = BoundingBox.FromPoints ([(5,2), (7, 1), (6, 3)])
 
 	assert (b.GetSize ().x == 2)
+
+def test_PointArray_FromSequence ():
+	p = PointArray ([(5,2), (7, 1), (6, 3)])
+
+	assert (len (p) == 3)
+	assert (p [1] == (7, 1))
+	assert (p [-1] == (6, 3))
+	assert (p.GetCoordinates () == [5, 2, 7, 1, 6, 3])
+
+def test_PointArray_FlatBufferIsNotCopied ():
+	data = array ('d', [5, 2, 7, 1, 6, 3])
+	p = PointArray (data)
+
+	assert (p.GetData () is data)
+	assert ([tuple (v) for v in p [1:]] == [(7, 1), (6, 3)])
+
+def test_PointArray_Bounds ():
+	b = PointArray (array ('d', [5, 2, 7, 1, 6, 3])).GetBounds ()
+
+	assert (b.GetMinimum () == (5, 1))
+	assert (b.GetMaximum () == (7, 3))
+
+def test_PointArray_NumPy ():
+	numpy = pytest.importorskip ('numpy')
+	data = numpy.array ([(5,2), (7, 1), (6, 3)], dtype=float)
+	p = PointArray (data)
+
+	assert (p.GetData () is data)
+	assert (p [2] == (6, 3))
+	assert (p.GetBounds ().GetSize () == (2, 2))
+
+def test_Vector2_RejectsNonNumbers ():
+	with pytest.raises (TypeError):
+		Vector2 ('a', 1)
+
+	with pytest.raises (ValueError):
+		Vector2 ((1, 2, 3))
+
+def test_BoundingBox_MergeInPlace ():
+	b = BoundingBox ()
+	assert (b.IsEmpty ())
+
+	other = BoundingBox ((0, 0), (1, 2))
+	r = b.MergeTranslated (other, 5, 5).MergePoint ((1, 1))
+
+	assert (r is b)
+	assert (b.GetExtents () == (1, 1, 6, 7))
+
+	b.Expand (1)
+	assert (b.GetMinimum () == (0, 0))
+	assert (b.GetMaximum () == (7, 8))
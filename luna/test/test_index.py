@@ -0,0 +1,44 @@
+from luna import *
+from luna.geo import BoundingBox
+
+def _CreateDrawing ():
+	d = Drawing ()
+	for y in range (10):
+		g = Group ((0, y * 10))
+		for x in range (10):
+			g.Add (Circle ((x * 10, 0), 2, stroke=None))
+		d.Add (g)
+
+	marker = d.AddShared (Rectangle ((0, 0), (4, 4), stroke=None))
+	d.Add (Instance (marker, (200, 200)))
+	d.Add (Instance (marker, (202, 202)))
+	return d
+
+def testIndexResolvesTransforms ():
+	index = _CreateDrawing ().BuildIndex ()
+	assert (len (index) == 102)
+
+	hits = index.Query (BoundingBox ((29, 49), (31, 51)))
+	assert (len (hits) == 1)
+	assert (hits [0].GetOffset () == (0, 50))
+	assert (hits [0].GetBounds ().GetExtents () == (28, 48, 32, 52))
+
+def testIndexElementsAtInDrawingOrder ():
+	index = _CreateDrawing ().BuildIndex ()
+	hits = index.ElementsAt ((203, 203))
+
+	assert (len (hits) == 2)
+	assert (hits [0].GetElement () is hits [1].GetElement ())
+	assert (hits [1].GetOffset () == (202, 202))
+	assert (index.ElementsAt ((5, 5)) == [])
+
+def testIndexMatchesLinearScan ():
+	index = _CreateDrawing ().BuildIndex ()
+
+	def Intersects (entry):
+		minX, minY, maxX, maxY = entry.GetBounds ().GetExtents ()
+		return minX <= 47 and maxX >= 15 and minY <= 63 and maxY >= 15
+
+	expected = [e for e in index.GetEntries () if Intersects (e)]
+	assert (len (expected) > 0)
+	assert (index.Query (BoundingBox ((15, 15), (47, 63))) == expected)
@@ -0,0 +1,65 @@
+import math
+
+import pytest
+
+from luna import *
+from luna import geo, lod
+
+def _DistanceToSegment (p, a, b):
+	dx = b [0] - a [0]
+	dy = b [1] - a [1]
+	length = dx * dx + dy * dy
+	t = 0
+	if length > 0:
+		t = min (max (((p [0] - a [0]) * dx + (p [1] - a [1]) * dy) / length, 0), 1)
+	return math.hypot (p [0] - a [0] - t * dx, p [1] - a [1] - t * dy)
+
+@pytest.mark.parametrize ('count', [50, 5000])
+def testSimplifyPolylineWithinTolerance (count):
+	points = [(i * 0.01, math.sin (i * 0.01)) for i in range (count)]
+	tolerance = 0.01
+
+	keep = lod.SimplifyPolyline (geo.PointArray (points), tolerance)
+	assert (keep [0] == 0 and keep [-1] == count - 1)
+	assert (keep == sorted (keep))
+	assert (len (keep) < count / 4)
+
+	for first, last in zip (keep, keep [1:]):
+		for i in range (first + 1, last):
+			assert (_DistanceToSegment (points [i], points [first], points [last]) <= tolerance)
+
+def testSimplifyDrawing ():
+	d = Drawing ()
+	path = Path ([(x, x % 2 * 0.01) for x in range (100)])
+	d.Add (path)
+	big = Circle ((50, 50), 20)
+	d.Add (big)
+	for i in range (10):
+		d.Add (Circle ((i, 0), 0.1, stroke=None))
+	d.Add (Circle ((0, 0), 0.001, stroke=None))
+	marker = d.AddShared (Rectangle ((0, 0), (0.2, 0.2), stroke=None))
+	d.Add (Instance (marker, (5, 5)))
+
+	s = d.Simplify (1)
+	assert (s.GetSize () == d.GetSize ())
+	assert (d.GetChildren () [0] is path)
+
+	simplePath, circle, points, instance = s.GetChildren ()
+	assert (len (simplePath.GetPoints ()) == 2)
+	assert (circle is big)
+	assert (isinstance (points, PointCloud))
+	assert (len (points.GetPoints ()) == 10)
+	assert (points.GetSize () == 0.25)
+
+	assert (isinstance (instance.GetSource (), PointCloud))
+	assert (s.GetShared () == [instance.GetSource ()])
+
+def testSimplifyKeepsUnchangedDrawing ():
+	d = Drawing ()
+	g = Group ((1, 1))
+	g.Add (Circle ((0, 0), 10))
+	d.Add (g)
+
+	s = d.Simplify (1)
+	assert (s.GetChildren () [0] is g)
+	assert (s.GetChildren () [0].GetChildren () [0].GetRadius () == 10)
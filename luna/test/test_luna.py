@@ -1,3 +1,7 @@
+import pickle
+
+import pytest
+
 from luna import *
 
 def testDrawingAutoBounds():
@@ -31,3 +35,257 @@ def testDrawingAutoBounds():
 	# Size is different from bounds, an image goes from (0,0) to bounds max.
 	assert (s.x == b.GetMaximum ().x)
 	assert (s.y == b.GetMaximum ().y)
+
+def testBoundsAreCachedAndInvalidatedOnAdd ():
+	d = Drawing ()
+	g = Group ((10, 0))
+	d.Add (g)
+	g.Add (Line ((0, 0), (10, 10)))
+
+	assert (d.GetBounds ().GetMaximum () == (20.5, 10.5))
+	assert (d.GetBounds () is not d.GetBounds ())
+
+	g.Add (Line ((0, 0), (20, 20)))
+	assert (d.GetBounds ().GetMaximum () == (30.5, 20.5))
+
+def testSharedBoundsAreComputedOnce ():
+	class CountingCircle (Circle):
+		computed = 0
+
+		def _ComputeBounds (self):
+			CountingCircle.computed += 1
+			return super ()._ComputeBounds ()
+
+	d = Drawing ()
+	c = d.AddShared (CountingCircle ((0, 0), 1, stroke=None))
+	d.Add (Array (c, 10, 10, spacing=(2, 2)))
+
+	assert (d.GetSize () == (19, 19))
+	assert (CountingCircle.computed == 1)
+
+def testInvalidateBoundsPropagatesToInstances ():
+	import array as pyarray
+	points = pyarray.array ('d', [0, 0, 1, 1])
+	p = Path (points, stroke=None)
+	d = Drawing ()
+	d.Add (Instance (p, (5, 5)))
+	assert (d.GetSize () == (6, 6))
+
+	points [2] = 3
+	p.InvalidateBounds ()
+	assert (d.GetSize () == (8, 6))
+
+def testTemporaryInstancesAreReleased ():
+	c = Circle ((0, 0), 1)
+	instance = Instance (c, (1, 1))
+	for i in range (1000):
+		c.GetBounds ()
+		Instance (c, (i, i)).GetBounds ()
+
+	assert (len (c._dependents) < 16)
+	c.InvalidateBounds ()
+	assert (instance._bounds is None)
+
+def testCopyKeepsBoundsInvalidation ():
+	g = Group ()
+	g.Add (Line ((0, 0), (1, 1)))
+	c = g.Copy ()
+	assert (c.GetBounds ().GetMaximum () == (1.5, 1.5))
+
+	c.GetChildren () [0].InvalidateBounds ()
+	c.Add (Line ((0, 0), (4, 4)))
+	assert (c.GetBounds ().GetMaximum () == (4.5, 4.5))
+	assert (g.GetBounds ().GetMaximum () == (1.5, 1.5))
+
+def testPrimitiveSetBounds ():
+	lines = LineSet ([((0, 0), (1, 1)), ((2, 2), (3, 5))], stroke=Stroke (width=2))
+	assert (lines.GetCount () == 2)
+	assert (lines.GetBounds ().GetExtents () == (-1, -1, 4, 6))
+
+	circles = CircleSet ([(0, 0), (10, 10)], radius=[1, 3], stroke=None)
+	assert (circles.GetBounds ().GetExtents () == (-1, -1, 13, 13))
+
+	points = PointCloud ([(0, 0), (10, 10)], size=2)
+	assert (points.GetBounds ().GetExtents () == (-1, -1, 11, 11))
+
+def testPrimitiveSetBoundsWithoutNumPy (monkeypatch):
+	monkeypatch.setattr (geo, 'numpy', None)
+
+	circles = CircleSet ([(x, x) for x in range (100)],
+		radius=[1] * 99 + [5], stroke=None)
+	assert (isinstance (circles.GetCenters ().GetData (), geo.array))
+	assert (circles.GetBounds ().GetExtents () == (-1, -1, 104, 104))
+
+def testArrayIsVirtual ():
+	c = Circle ((0, 0), 1, stroke=None)
+	a = Array (c, 1000, 1000, offset=(5, 5))
+
+	assert (c.GetReferenceCount () == 1000 * 1000)
+	assert (len (a.GetChildren ()) == 1000 * 1000)
+	assert (a.GetBounds ().GetExtents () == (4, 4, 2004, 2004))
+
+	children = a.GetChildren ()
+	assert (children [1001].GetPosition () == (7, 7))
+	assert (children [1001].GetSource () is c)
+
+def testArrayBoundsMatchInstances ():
+	g = Group ()
+	g.Add (Line ((0, 0), (3, 1)))
+	a = Array (g, 3, 2, offset=(1, 2), spacing=(-4, 5))
+
+	expected = geo.BoundingBox ()
+	for instance in a.GetChildren ():
+		expected.Merge (instance.GetBounds ())
+
+	assert (a.GetBounds ().GetExtents () == expected.GetExtents ())
+
+def testArraySpacingDoesNotDependOnQueries ():
+	def Build (query):
+		g = Group ()
+		g.Add (Rectangle ((0, 0), (2, 2), stroke=None))
+		a = Array (g, 3, 1)
+		if query:
+			a.GetBounds ()
+		g.Add (Rectangle ((0, 0), (10, 10), stroke=None))
+		g.InvalidateBounds ()
+		return a
+
+	for query in (False, True):
+		a = Build (query)
+		assert (a.GetSpacing () == (2, 2))
+		assert (a.GetBounds ().GetExtents () == (0, 0, 14, 10))
+
+def testVisitorDispatchFollowsClassHierarchy ():
+	class GroupVisitor (Visitor):
+		def __init__ (self):
+			self.visited = []
+
+		def VisitElement (self, element, ctx=None):
+			self.visited.append ('Element')
+
+		def VisitGroup (self, group, ctx=None):
+			self.visited.append ('Group')
+
+		def VisitPath (self, path, ctx=None):
+			self.visited.append ('Path')
+
+	class LineVisitor (GroupVisitor):
+		def VisitLine (self, line, ctx=None):
+			self.visited.append ('Line')
+
+	elements = [Grid ((0, 0), (2, 2), 1), Cross ((0, 0)), Line ((0, 0), (1, 1)),
+		Circle ((0, 0), 1)]
+
+	v = GroupVisitor ()
+	for e in elements:
+		v.VisitGeneric (e)
+	assert (v.visited == ['Group', 'Group', 'Path', 'Element'])
+
+	v = LineVisitor ()
+	for e in elements:
+		v.VisitGeneric (e)
+	assert (v.visited == ['Group', 'Group', 'Line', 'Element'])
+
+def testPickleRestoresElements ():
+	d = Drawing (10, 10)
+	c = d.AddShared (Circle ((1, 1), 2))
+	d.Add (Instance (c, (4, 4)))
+	d.Add (Line ((0, 0), (3, 3)))
+	assert (not hasattr (d.GetChildren () [1], '__dict__'))
+
+	copy = pickle.loads (pickle.dumps (d))
+	line = copy.GetChildren () [1]
+	assert (line.GetStart () == (0, 0) and line.GetEnd () == (3, 3))
+	assert (copy.GetChildren () [0].GetSource () is copy.GetShared () [0])
+	assert (copy.GetBounds ().GetMaximum () == (7.5, 7.5))
+
+def testStylesAreInterned ():
+	red = Stroke (Color (255, 0, 0), width=2, dashPattern=[5, 5])
+	assert (Stroke (Color (255, 0, 0), width=2, dashPattern=DashPattern.Dash) is red)
+	assert (Stroke (Color (255, 0, 0), width=2.0, dashPattern=[5.0, 5]) is red)
+	assert (Stroke (width=2) == Stroke (width=2.0))
+	assert (Stroke (width=2) != Stroke (width=2.5))
+	assert (Fill (Color (128)) is Fill (Color (128, 128, 128)))
+	assert (Font (size=10) is Font (size=10))
+	assert (len ({red, Stroke (Color (255, 0, 0), width=2, dashPattern=[5, 5])}) == 1)
+	assert (pickle.loads (pickle.dumps (red)) is red)
+
+	assert (red.GetRGBA () == (1, 0, 0, 1))
+	assert (red.GetDashPattern () == (5, 5))
+	assert (all ([isinstance (v, float) for v in red.GetDashPattern ()]))
+
+	with pytest.raises (AttributeError):
+		red._width = 3
+
+def testCopySharesData ():
+	d = Drawing ()
+	marker = d.AddShared (Circle ((0, 0), 1))
+	d.Add (Instance (marker, (5, 5)))
+	path = Path ([(0, 0), (1, 1), (2, 0)])
+	d.Add (path)
+
+	c = d.Copy ()
+	instance, pathCopy = c.GetChildren ()
+	assert (instance.GetSource () is marker)
+	assert (marker.GetReferenceCount () == 2)
+	assert (pathCopy is not path and pathCopy.GetStroke () is path.GetStroke ())
+	assert (pathCopy.GetPoints ()._GetBuffer () is path.GetPoints ()._GetBuffer ())
+
+	# Modifying the points of the copy does not change the original
+	pathCopy.GetPoints ().GetData () [2] = 10
+	pathCopy.InvalidateBounds ()
+	assert (c.GetBounds ().GetMaximum () == (10.5, 6.5))
+	assert (d.GetBounds ().GetMaximum () == (6.5, 6.5))
+	assert (path.GetPoints () [1] == (1, 1))
+
+def testCopyDoesNotAliasCallerBuffers ():
+	points = geo.array ('d', [0, 0, 1, 1, 2, 0])
+	radius = geo.array ('d', [1, 2])
+	path = Path (points)
+	circles = CircleSet (geo.array ('d', [0, 0, 4, 4]), radius)
+	assert (path.GetBounds ().GetMaximum () == (2.5, 1.5))
+
+	pathCopy = path.Copy ()
+	circlesCopy = circles.Copy ()
+	assert (pathCopy.GetPoints ()._GetBuffer () is not points)
+
+	# The caller modifies its buffers, the copies keep the old values
+	points [2] = 10
+	radius [1] = 5
+	path.InvalidateBounds ()
+	circles.InvalidateBounds ()
+	assert (path.GetBounds ().GetMaximum () == (10.5, 1.5))
+	assert (pathCopy.GetPoints () [1] == (1, 1))
+	assert (pathCopy.GetBounds ().GetMaximum () == (2.5, 1.5))
+	assert (circles.GetRadii () == [1, 5])
+	assert (circlesCopy.GetRadii () == [1, 2])
+
+	# Copies of a copy share its private buffer again
+	again = pathCopy.Copy ()
+	assert (again.GetPoints ()._GetBuffer () is pathCopy.GetPoints ()._GetBuffer ())
+
+def testDiscardedCopiesAreReleased ():
+	import gc
+	import weakref
+
+	d = Drawing ()
+	marker = d.AddShared (Circle ((0, 0), 1))
+	d.Add (Instance (marker, (5, 5)))
+	d.Add (Array (marker, 10, 10))
+	assert (marker.GetReferenceCount () == 101)
+
+	copies = [d.Copy () for i in range (50)]
+	assert (marker.GetReferenceCount () == 51 * 101)
+
+	ref = weakref.ref (copies [0])
+	del copies
+	gc.collect ()
+	assert (ref () is None)
+	assert (marker.GetReferenceCount () == 101)
+
+	# The source still invalidates the bounds of the original
+	d.GetBounds ()
+	marker.Scale (2)
+	marker.InvalidateBounds ()
+	assert (d._bounds is None)
+	assert (len (marker._dependents) < 16)
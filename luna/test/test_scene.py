@@ -0,0 +1,125 @@
+from array import array
+import io
+
+import pytest
+
+from luna import *
+from luna import geo, scene
+
+def _CreateDrawing ():
+	d = Drawing (margin=2)
+	d.Add (Line ((0, 0), (10, 10), stroke=Stroke (Color (255, 0, 0), 2,
+		dashPattern=DashPattern.Dash)))
+	g = Group ((3, 4), name='group')
+	g.Add (Polygon ([(1, 1), (4, 1), (2, 3)], fill=Fill (Color (0, 0, 255), opacity=0.5)))
+	g.Add (Text ('a < b', (5, 40), font=Font ('Arial', 10, FontWeight.Bold)))
+	g.Add (Rectangle ((1, 2), (3, 4), cornerRadius=1))
+	g.Scale (2)
+	d.Add (g)
+	d.Add (Grid ((0, 0), (2, 3), 5))
+	d.Add (Cross ((20, 20)))
+	s = d.AddShared (Circle ((0, 0), 2))
+	d.Add (Array (s, 2, 1, offset=(50, 50)))
+	d.Add (Instance (s, (70, 70)))
+	d.Add (CircleSet ([(0, 0), (1, 1)], radius=[1, 2]))
+	d.Add (PointCloud (array ('d', [5, 5, 6, 6]), size=2))
+	return d
+
+def _Reload (element, tmpdir):
+	filename = str (tmpdir.join ('scene.luna'))
+	scene.Save (element, filename)
+	return scene.Load (filename)
+
+def testSceneRoundTrip (tmpdir):
+	d = _CreateDrawing ()
+	loaded = _Reload (d, tmpdir)
+
+	assert (loaded.RenderSvg (shortIds=True) == d.RenderSvg (shortIds=True))
+	assert (loaded.GetBounds ().GetMinimum () == d.GetBounds ().GetMinimum ())
+	assert (loaded.GetBounds ().GetMaximum () == d.GetBounds ().GetMaximum ())
+
+def testSceneKeepsReferences (tmpdir):
+	d = Drawing ()
+	s = d.AddShared (Rectangle ((0, 0), (1, 1)))
+	d.Add (Instance (s, (0, 0)))
+	d.Add (Array (s, 2, 3, spacing=(1, 1)))
+	loaded = _Reload (d, tmpdir)
+
+	shared = loaded.GetShared () [0]
+	instance, grid = loaded.GetChildren ()
+	assert (instance.GetSource () is shared)
+	assert (grid.GetElement () is shared)
+	assert (shared.GetReferenceCount () == 7)
+
+	# Bounds are invalidated through the references
+	maximum = loaded.GetBounds ().GetMaximum ()
+	shared._size = geo.Vector2 (2, 2)
+	shared.InvalidateBounds ()
+	assert (loaded.GetBounds ().GetMaximum () == maximum + geo.Vector2 (1, 1))
+
+def testSceneMapsLargeBuffers (tmpdir):
+	numpy = pytest.importorskip ('numpy')
+	points = numpy.arange (2000, dtype=float).reshape (-1, 2)
+	d = Drawing ()
+	d.Add (PointCloud (points))
+	d.Add (Path ([(0, 0), (1, 1)]))
+	filename = str (tmpdir.join ('scene.luna'))
+	d.SaveScene (filename)
+
+	cloud, path = scene.Load (filename).GetChildren ()
+	data = cloud.GetPoints ()._GetBuffer ()
+	assert (isinstance (data, numpy.ndarray))
+	assert (not data.flags.owndata)
+	assert ((data == points).all ())
+	assert (isinstance (path.GetPoints ()._GetBuffer (), array))
+
+	# The mapping is private, so changes are not written back
+	data [0, 0] = -1
+	cloud, _ = scene.Load (filename).GetChildren ()
+	assert (cloud.GetPoints ()._GetBuffer () [0, 0] == 0)
+
+def testSceneStoresSubclassesAsBaseClass ():
+	class Marker (Circle):
+		__slots__ = ()
+
+	d = Drawing ()
+	d.Add (Marker ((1, 2), 3))
+	f = io.BytesIO ()
+	d.SaveScene (f)
+
+	with pytest.raises (ValueError):
+		scene._Reader (b'NOTLUNA\0' + f.getvalue () [8:])
+
+	circle = scene._Reader (bytearray (f.getvalue ())).Read ().GetChildren () [0]
+	assert (type (circle) is Circle)
+	assert (circle.GetCenter () == geo.Vector2 (1, 2))
+	assert (circle.GetRadius () == 3)
+
+def testSceneStoresNumPyScalars (tmpdir):
+	numpy = pytest.importorskip ('numpy')
+	d = Drawing ()
+	d.Add (CircleSet ([(0, 0), (4, 4)], radius=numpy.float32 (2)))
+	d.Add (Circle ((1, 1), numpy.float64 (3)))
+	loaded = _Reload (d, tmpdir)
+
+	circles, circle = loaded.GetChildren ()
+	assert (circles.GetRadius () == 2)
+	assert (circle.GetRadius () == 3)
+	assert (loaded.GetBounds ().GetExtents () == d.GetBounds ().GetExtents ())
+
+def testSceneSwapsByteOrder (monkeypatch):
+	d = _CreateDrawing ()
+	f = io.BytesIO ()
+	d.SaveScene (f)
+
+	# Pretend to be on a machine with the other byte order, which swaps all
+	# arrays while saving and swaps them back while loading
+	monkeypatch.setattr (scene, '_SWAP', True)
+	swapped = io.BytesIO ()
+	d.SaveScene (swapped)
+	assert (swapped.getvalue () != f.getvalue ())
+	assert (len (swapped.getvalue ()) == len (f.getvalue ()))
+
+	loaded = scene._Reader (bytearray (swapped.getvalue ())).Read ()
+	assert (loaded.RenderSvg (shortIds=True) == d.RenderSvg (shortIds=True))
+	assert (loaded.GetBounds ().GetMaximum () == d.GetBounds ().GetMaximum ())
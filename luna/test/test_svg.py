@@ -0,0 +1,241 @@
+import gzip
+import io
+import xml.etree.ElementTree as ET
+
+from luna import *
+
+_SVG = '{http://www.w3.org/2000/svg}'
+_XLINK = '{http://www.w3.org/1999/xlink}'
+
+def _CreateDrawing ():
+	d = Drawing ()
+	d.Add (Line ((0, 0), (10, 10)))
+	g = Group ((3, 4))
+	g.Add (Polygon ([(1, 1), (4, 1), (2, 3)], fill=Fill (Color (0, 0, 255), opacity=0.5)))
+	g.Add (Text ('a < b', (5, 40)))
+	d.Add (g)
+	s = d.AddShared (Circle ((0, 0), 2))
+	d.Add (Array (s, 2, 1, offset=(50, 50)))
+	return d
+
+def _Parse (data):
+	return ET.fromstring (data)
+
+def testSvgStructure ():
+	f = io.StringIO ()
+	_CreateDrawing ().SaveSvg (f)
+	root = _Parse (f.getvalue ())
+
+	defs, content = list (root)
+	assert (defs.tag == _SVG + 'defs')
+	assert (content.get ('transform') == 'translate(4,4)')
+
+	circle = defs [0]
+	assert (circle.tag == _SVG + 'circle')
+
+	line, group, array = list (content)
+	assert (line.get ('x2') == '10')
+	assert (group.get ('transform') == 'translate(3,4)')
+	assert (group [0].get ('points') == '1,1 4,1 2,3')
+	assert (group [0].get ('fill-opacity') == '0.5')
+	assert (group [1].text == 'a < b')
+
+	uses = list (array)
+	assert (len (uses) == 2)
+	assert (uses [1].get ('x') == '55')
+	assert (uses [1].get (_XLINK + 'href') == '#' + circle.get ('id'))
+
+def testSvgBinaryStream ():
+	f = io.BytesIO ()
+	_CreateDrawing ().SaveSvg (f)
+
+	assert (f.getvalue ().startswith (b'<?xml'))
+	_Parse (f.getvalue ())
+
+def testSvgPrimitiveSetsUseSinglePath ():
+	d = Drawing ()
+	d.Add (LineSet ([((0, 0), (1, 1)), ((2, 2), (3, 5))]))
+	d.Add (CircleSet ([(5, 5), (10, 10)], radius=2))
+
+	f = io.StringIO ()
+	d.SaveSvg (f)
+	lines, circles = list (_Parse (f.getvalue ()) [1])
+
+	assert (lines.tag == _SVG + 'path')
+	assert (lines.get ('d') == 'M0,0L1,1M2,2L3,5')
+	assert (circles.get ('d').count ('z') == 2)
+
+def testSvgGridIsSinglePath ():
+	d = Drawing ()
+	d.Add (Grid ((0, 0), (2, 3), 10))
+
+	f = io.StringIO ()
+	d.SaveSvg (f)
+	grid = _Parse (f.getvalue ()) [1] [0]
+
+	assert (len (grid) == 1)
+	assert (grid [0].tag == _SVG + 'path')
+	assert (grid [0].get ('d').count ('M') == 3 + 4)
+	assert (d.GetSize () == (20.5, 30.5))
+
+def testSvgStyleClasses ():
+	d = Drawing ()
+	red = Stroke (Color (255, 0, 0))
+	for i in range (10):
+		d.Add (Line ((0, i), (10, i), stroke=red))
+		d.Add (Circle ((i, 0), 1, stroke=Stroke (Color (255, 0, 0))))
+	d.Add (Line ((0, 0), (1, 1)))
+
+	f = io.StringIO ()
+	d.SaveSvg (f, styleClasses=True)
+	root = _Parse (f.getvalue ())
+
+	style, defs, content = list (root)
+	assert (style.tag == _SVG + 'style')
+
+	lines = content.findall (_SVG + 'line')
+	circles = content.findall (_SVG + 'circle')
+	assert (all ([e.get ('stroke') is None for e in lines + circles]))
+	assert (len (set ([e.get ('class') for e in lines])) == 2)
+	assert (len (set ([e.get ('class') for e in circles])) == 1)
+	assert (style.text.count ('{') == 3)
+	assert ('stroke:rgb(255,0,0)' in style.text)
+
+def testSvgStyleClassesPrecedeContent ():
+	d = Drawing ()
+	s = d.AddShared (Polygon ([(0, 0), (1, 0), (0, 1)], fill=Fill (Color (0, 255, 0))))
+	d.Add (Array (s, 2, 2))
+	g = Group ()
+	g.Add (LineSet ([((0, 0), (1, 1))], stroke=Stroke (width=3)))
+	g.Add (PointCloud ([(0, 0)], fill=Fill (Color (0, 0, 255))))
+	g.Add (Rectangle ((0, 0), (1, 1), stroke=None))
+	d.Add (g)
+
+	f = io.StringIO ()
+	d.SaveSvg (f, styleClasses=True)
+	root = _Parse (f.getvalue ())
+
+	style = root [0]
+	assert (style.tag == _SVG + 'style')
+	classes = set ([e.get ('class') for e in root.iter () if e.get ('class')])
+	assert (len (classes) == 4)
+	assert (all (['.' + c + '{' in style.text for c in classes]))
+	assert (style.text.count ('{') == 4)
+
+def testSvgCompactEncoding ():
+	def Build ():
+		d = Drawing ()
+		d.Add (Line ((0.1 + 0.2, 0), (1 / 3, -0.0001)))
+		s = d.AddShared (Circle ((0, 0), 2))
+		d.Add (Instance (s, (1, 1)))
+		d.Add (Array (s, 2, 1))
+		return d
+
+	outputs = []
+	for i in range (2):
+		f = io.BytesIO ()
+		Build ().SaveSvg (f, precision=3, shortIds=True, styleClasses=True,
+			compress=True)
+		outputs.append (f.getvalue ())
+
+	assert (outputs [0] == outputs [1])
+
+	root = _Parse (gzip.decompress (outputs [0]))
+	style, defs, content = list (root)
+	assert (defs [0].get ('id') == 'i0')
+
+	line, instance, array = list (content)
+	assert (line.get ('x1') == '0.3')
+	assert (line.get ('x2') == '0.333')
+	assert (line.get ('y2') == '0')
+	assert (instance.get (_XLINK + 'href') == '#i0')
+	assert (array [1].get (_XLINK + 'href') == '#i0')
+
+def testSvgPrecisionAppliesToStylesAndText ():
+	d = Drawing ()
+	d.Add (Line ((0, 0), (1, 1), stroke=Stroke (dashPattern=[1 / 3, 2.0])))
+	d.Add (Text ('a', (0, 10), font=Font (size=10 / 3)))
+
+	root = _Parse (d.RenderSvg (precision=2))
+	assert (root.find ('.//' + _SVG + 'line').get ('stroke-dasharray') == '0.33,2')
+	assert ('font-size:3.33px;' in root.find ('.//' + _SVG + 'text').get ('style'))
+
+	style = _Parse (d.RenderSvg (precision=2, styleClasses=True)) [0]
+	assert ('stroke-dasharray:0.33,2' in style.text)
+
+def testSvgStylesDoNotDependOnCreationOrder ():
+	def Render (stroke):
+		d = Drawing ()
+		d.Add (Line ((0, 0), (1, 1), stroke=stroke))
+		d.Add (Text ('a', (0, 10), font=Font (size=10.0)))
+		return d.RenderSvg ()
+
+	first = Render (Stroke (width=2.0, dashPattern=[5.0, 5.0], opacity=0.5))
+	second = Render (Stroke (width=2, dashPattern=DashPattern.Dash, opacity=0.5))
+	assert (first == second)
+	assert (b'stroke-dasharray="5,5"' in first and b'font-size:10px;' in first)
+
+def testSvgCompressedFile (tmpdir):
+	filename = str (tmpdir.join ('test.svgz'))
+	_CreateDrawing ().SaveSvg (filename)
+
+	with gzip.open (filename) as f:
+		assert (_Parse (f.read ()).tag == _SVG + 'svg')
+
+def testRenderSvgMatchesSaveSvg (tmpdir):
+	filename = str (tmpdir.join ('test.svg'))
+	d = _CreateDrawing ()
+	d.SaveSvg (filename, shortIds=True)
+
+	with open (filename, 'rb') as f:
+		assert (d.RenderSvg (shortIds=True) == f.read ())
+
+def testSvgProfiling ():
+	from luna import profile
+	from luna.backends.svg import SvgVisitor
+
+	reports = []
+	d = _CreateDrawing ()
+	with profile.Profiling (reports.append) as p:
+		data = d.RenderSvg ()
+
+	assert (reports == [p.GetReport ()])
+	report = reports [0]
+	assert (set (report ['phases']) == {'bounds', 'traversal', 'serialization'})
+
+	elements = report ['elements']
+	assert (elements ['Circle'] ['count'] == 1)
+	assert (elements ['Group'] ['count'] == 1)
+	assert (elements ['Group'] ['cumulative'] >= elements ['Group'] ['self'])
+	assert (elements ['Line'] ['characters'] == len (b'<line x1="0" y1="0" x2="10" y2="10" '
+		b'stroke="rgb(0,0,0)" stroke-width="1" stroke-linejoin="round" stroke-linecap="round" />'))
+	assert (sum ([e ['characters'] for e in elements.values ()]) < len (data))
+
+	assert ('VisitGeneric' not in SvgVisitor ().__dict__)
+
+def testSvgProfilingCountsRenderedElements ():
+	from luna import profile
+
+	d = Drawing ()
+	for i in range (10):
+		d.Add (Line ((i, 0), (i, 10)))
+
+	with profile.Profiling () as p:
+		d.RenderSvg (styleClasses=True)
+		d.Simplify (1)
+		d.SaveScene (io.BytesIO ())
+
+	elements = p.GetReport () ['elements']
+	assert (list (elements) == ['Line'])
+	assert (elements ['Line'] ['count'] == 10)
+
+def testSvgEmptyDrawing ():
+	d = Drawing (margin=2)
+	assert (d.GetSize () == (0, 0))
+
+	for precision in (None, 2):
+		root = _Parse (d.RenderSvg (precision=precision))
+		assert (root.get ('width') == '4' and root.get ('height') == '4')
+
+	from luna.backends.svg import _MakeNumberFormat
+	assert (_MakeNumberFormat (2) (float ('inf')) == 'inf')
@@ -0,0 +1,35 @@
+from luna import *
+from luna.text import TextMeasurer, GetTextMeasurer
+
+def testEstimatedExtents ():
+	m = TextMeasurer (useCairo=False)
+	font = Font (size=10)
+
+	assert (not m.UsesCairo ())
+	assert (m.Measure ('abcd', font) == (0, -10, 20, 5))
+	# Lines are 1.5 times the font size apart, and empty lines are ignored
+	assert (m.Measure ('ab\n\nabcdef', font) == (0, -10, 30, 35))
+
+def testMeasurementCache ():
+	m = TextMeasurer (maxSize=2, useCairo=False)
+	font = Font (size=10)
+
+	extents = m.MeasureMany (['a', 'bb', 'a'], font)
+	assert (extents [0] == extents [2] == m.Measure ('a', font))
+	assert (m.Measure ('a', Font (size=20)) != extents [0])
+
+	statistics = m.GetStatistics ()
+	assert (statistics ['hits'] == 2)
+	assert (statistics ['misses'] == 3)
+	assert (statistics ['count'] == 2)
+
+	m.Clear ()
+	assert (m.GetStatistics () == {'count' : 0, 'hits' : 0, 'misses' : 0})
+
+def testTextBoundsStartAtBaseline ():
+	font = Font (size=12)
+	t = Text ('Label', (10, 20), font=font)
+	minX, minY, maxX, maxY = GetTextMeasurer ().Measure ('Label', font)
+
+	assert (t.GetBounds ().GetExtents () == (10 + minX, 20 + minY, 10 + maxX, 20 + maxY))
+	assert (minY < 0 and maxX > 0)
@@ -0,0 +1,173 @@
+'''Measurement of text.
+
+Text is measured with Cairo if it is available. Otherwise, the size is
+estimated from the number of characters, which is only a rough approximation.
+Results are cached, as drawings with many labels tend to repeat the same
+strings:
+
+    extents = text.GetTextMeasurer ().Measure ('Label', font)
+
+Extents are tuples (minX, minY, maxX, maxY) relative to the start of the
+baseline of the first line. As y grows downwards, minY is usually negative.'''
+
+import collections
+import threading
+
+# Distance between the baselines of consecutive lines, relative to the font size
+LINE_SPACING = 1.5
+
+def _EstimateLine (line, size):
+    '''Estimate the extents of a single line from its length.'''
+    return (0, -size, len (line) * size * 0.5, size * 0.5)
+
+class TextMeasurer:
+    '''Measures text and caches the results.
+
+    Up to maxSize results are kept, keyed by the font face, size, weight and
+    the string; the least recently used ones are evicted first. Lines are
+    separated by newlines and are LINE_SPACING times the font size apart. If
+    useCairo is not set, or Cairo cannot be loaded, the extents are
+    estimated.'''
+    def __init__ (self, maxSize=1 << 16, useCairo=True):
+        self._maxSize = maxSize
+        self._extents = collections.OrderedDict ()
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock ()
+        # The Cairo context used for measuring, False if Cairo is not used
+        self._context = None if useCairo else False
+        self._cairo = None
+        self._contextFont = None
+
+    def _GetContext (self):
+        if self._context is None:
+            try:
+                import cairocffi as cairo
+                self._cairo = cairo
+                self._context = cairo.Context (
+                    cairo.ImageSurface (cairo.FORMAT_ARGB32, 1, 1))
+            except (ImportError, OSError):
+                self._context = False
+        return self._context
+
+    def UsesCairo (self):
+        '''Check if text is measured with Cairo rather than estimated.'''
+        with self._lock:
+            return self._GetContext () is not False
+
+    def _SetFont (self, context, key):
+        if key == self._contextFont:
+            return
+
+        from . import FontWeight
+        fontFace, size, weight = key
+        cairo = self._cairo
+        context.select_font_face (fontFace or '', cairo.FONT_SLANT_NORMAL,
+            cairo.FONT_WEIGHT_BOLD if weight == FontWeight.Bold
+            else cairo.FONT_WEIGHT_NORMAL)
+        context.set_font_size (size)
+        self._contextFont = key
+
+    def _MeasureLine (self, context, line, size):
+        if context is False:
+            return _EstimateLine (line, size)
+
+        xBearing, yBearing, width, height, _, _ = context.text_extents (line)
+        return (xBearing, yBearing, xBearing + width, yBearing + height)
+
+    def _Measure (self, context, fontKey, text):
+        size = fontKey [1]
+        if '\n' not in text:
+            return self._MeasureLine (context, text, size)
+
+        minX = minY = float ('inf')
+        maxX = maxY = float ('-inf')
+        for i, line in enumerate (text.split ('\n')):
+            x0, y0, x1, y1 = self._MeasureLine (context, line, size)
+            if x0 == x1 and y0 == y1:
+                # Nothing is drawn for this line
+                continue
+            offset = i * size * LINE_SPACING
+            minX = min (minX, x0)
+            minY = min (minY, y0 + offset)
+            maxX = max (maxX, x1)
+            maxY = max (maxY, y1 + offset)
+
+        if minX > maxX:
+            return (0, 0, 0, 0)
+        return (minX, minY, maxX, maxY)
+
+    def Measure (self, text, font):
+        '''Get the extents of text set in font.'''
+        key = ((font.GetFontFace (), font.GetSize (), font.GetWeight ()), text)
+        with self._lock:
+            extents = self._extents.get (key)
+            if extents is not None:
+                self._extents.move_to_end (key)
+                self._hits += 1
+                return extents
+
+        return self.MeasureMany ((text,), font) [0]
+
+    def MeasureMany (self, texts, font):
+        '''Get the extents of each string of texts set in font.
+
+        This is faster than measuring the strings one by one, as the font is
+        only set up once.'''
+        fontKey = (font.GetFontFace (), font.GetSize (), font.GetWeight ())
+        result = []
+
+        with self._lock:
+            context = self._GetContext ()
+            if context is not False:
+                self._SetFont (context, fontKey)
+
+            cache = self._extents
+            for text in texts:
+                key = (fontKey, text)
+                extents = cache.get (key)
+                if extents is not None:
+                    cache.move_to_end (key)
+                    self._hits += 1
+                else:
+                    self._misses += 1
+                    extents = self._Measure (context, fontKey, text)
+                    if self._maxSize > 0:
+                        cache [key] = extents
+                        if len (cache) > self._maxSize:
+                            cache.popitem (last=False)
+                result.append (extents)
+
+        return result
+
+    def SetMaxSize (self, maxSize):
+        with self._lock:
+            self._maxSize = maxSize
+            while len (self._extents) > maxSize:
+                self._extents.popitem (last=False)
+
+    def GetMaxSize (self):
+        return self._maxSize
+
+    def Clear (self):
+        '''Remove all results from the cache and reset the statistics.'''
+        with self._lock:
+            self._extents.clear ()
+            self._hits = 0
+            self._misses = 0
+
+    def GetStatistics (self):
+        '''Get a dictionary with the number of cached results (count), and the
+        number of hits and misses.'''
+        with self._lock:
+            return {
+                'count'     : len (self._extents),
+                'hits'      : self._hits,
+                'misses'    : self._misses
+            }
+
+_textMeasurer = TextMeasurer ()
+
+def GetTextMeasurer ():
+    '''Get the text measurer used for the bounds of Text elements.'''
+    return _textMeasurer
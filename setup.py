@@ -24,7 +24,12 @@ setup(
     tests_require=['tox'],
     cmdclass = {'test' : Tox},
 
-    install_requires = ['cairocffi>=0.5.4', 'svgwrite>=1.1.6'],
+    python_requires = '>=3.7',
+    install_requires = ['cairocffi>=0.5.4'],
+
+    entry_points = {
+        'console_scripts' : ['luna = luna.cli:Main']
+    },
 
     author = "Matthäus G. Chajdas",
     author_email = "dev@anteru.net",
@@ -40,7 +45,12 @@ setup(
         'License :: OSI Approved :: BSD License',
         'Natural Language :: English',
         'Operating System :: OS Independent',
-        'Programming Language :: Python :: 3.4',
+        'Programming Language :: Python :: 3',
+        'Programming Language :: Python :: 3.7',
+        'Programming Language :: Python :: 3.8',
+        'Programming Language :: Python :: 3.9',
+        'Programming Language :: Python :: 3.10',
+        'Programming Language :: Python :: 3.11',
         'Topic :: Multimedia :: Graphics',
 
     ]